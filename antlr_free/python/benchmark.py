@@ -0,0 +1,557 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from queue import Empty
+
+from parser import (IdLexer, Lexer, NodePool, SemanticActions, SymbolPool, lex_file_mmap, load_encoded_tables,
+                    load_optimized_tables, load_parsing_tables, lr1_parse, lr1_parse_actions, lr1_parse_encoded,
+                    lr1_parse_flat, lr1_parse_hashconsed, lr1_parse_optimized, lr1_validate_encoded, save_ast_to_xml,
+                    save_ast_to_yaml)
+
+# 预设规模：functions 函数个数，expr_depth 表达式嵌套深度，switch_cases 每个 switch 的 case 数，typedefs typedef 个数
+SCALES = {
+    'small': {'functions': 20, 'expr_depth': 8, 'switch_cases': 16, 'typedefs': 8},
+    'medium': {'functions': 100, 'expr_depth': 16, 'switch_cases': 32, 'typedefs': 32},
+    'large': {'functions': 1000, 'expr_depth': 48, 'switch_cases': 256, 'typedefs': 128},
+}
+
+BINARY_OPERATORS = ['+', '-', '*', '/', '%', '<<', '>>', '<', '>', '<=', '>=', '==', '!=', '&', '^', '|', '&&', '||']
+
+def generate_expression(rng, depth, names):
+    """
+    生成嵌套深度为 depth 的表达式
+    """
+    if depth <= 0:
+        choice = rng.random()
+        if choice < 0.4:
+            return rng.choice(names)
+        elif choice < 0.7:
+            return str(rng.randint(0, 1000))
+        elif choice < 0.85:
+            return f"{rng.choice(names)}[{rng.randint(0, 9)}]"
+        else:
+            return f"f0({rng.choice(names)})"
+    choice = rng.random()
+    if choice < 0.6:
+        left = generate_expression(rng, depth - 1, names)
+        right = generate_expression(rng, rng.randint(0, depth - 1), names)
+        return f"{left} {rng.choice(BINARY_OPERATORS)} {right}"
+    elif choice < 0.8:
+        return f"({generate_expression(rng, depth - 1, names)})"
+    elif choice < 0.9:
+        return f"-{generate_expression(rng, depth - 1, names)}"
+    else:
+        cond = generate_expression(rng, depth - 1, names)
+        return f"{cond} ? {rng.choice(names)} : {rng.randint(0, 9)}"
+
+def generate_corpus(functions, expr_depth, switch_cases, typedefs, seed=0):
+    """
+    生成合成 C 程序，覆盖深表达式、大量函数、长 switch 与大量 typedef
+    """
+    rng = random.Random(seed)
+    lines = ["int printf(const char *format, ...);", ""]
+    type_names = []
+    for i in range(typedefs):
+        name = f"T{i}"
+        if i % 2 == 0:
+            lines.append(f"typedef struct {{ int a{i}; char b{i}[8]; }} {name};")
+        else:
+            base = type_names[-1] if type_names else 'int'
+            lines.append(f"typedef {base} *{name};")
+        type_names.append(name)
+    lines.append("")
+    lines.append("int f0(int x) {")
+    lines.append("    return x;")
+    lines.append("}")
+    lines.append("")
+    for i in range(1, functions + 1):
+        lines.append(f"int f{i}(int a, int b, int c[]) {{")
+        lines.append("    int i, j, k;")
+        if type_names:
+            lines.append(f"    {rng.choice(type_names)} t;")
+        names = ['a', 'b', 'i', 'j', 'k', 'c']
+        lines.append(f"    i = {generate_expression(rng, expr_depth, names)};")
+        lines.append(f"    for (j = 0; j < {rng.randint(1, 100)}; j++) {{")
+        lines.append(f"        k = {generate_expression(rng, expr_depth // 2, names)};")
+        lines.append("    }")
+        if switch_cases and i % 4 == 0:
+            lines.append("    switch (a) {")
+            for case in range(switch_cases):
+                lines.append(f"        case {case}: k = {generate_expression(rng, 1, names)}; break;")
+            lines.append("        default: k = 0;")
+            lines.append("    }")
+        lines.append(f"    return f{i - 1}(i + k);")
+        lines.append("}")
+        lines.append("")
+    return '\n'.join(lines)
+
+def count_nodes(ast):
+    """
+    迭代统计 AST 节点数（含叶子）
+    """
+    count = 0
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, tuple) and len(node) == 2 and isinstance(node[1], list):
+            stack.extend(node[1])
+    return count
+
+def time_stage(func, warmup, repeats):
+    """
+    预热 warmup 次后重复 repeats 次，返回每次耗时与最后一次结果
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def peak_rss_kb():
+    """
+    当前进程的峰值常驻内存（KB）
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 以字节为单位
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+def reference_tokens(source):
+    tokens = Lexer(source).tokenize()
+    tokens.append(('EOF', 'EOF'))
+    return tokens
+
+def setup_lex(source, table_dir, scratch_dir):
+    return lambda: Lexer(source).tokenize(), lambda tokens: {'tokens': len(tokens) + 1}
+
+def setup_lex_mmap(source, table_dir, scratch_dir):
+    input_path = os.path.join(scratch_dir, 'input.c')
+    with open(input_path, 'w', encoding='utf-8') as file:
+        file.write(source)
+    return lambda: lex_file_mmap(input_path), lambda spans: {'tokens': len(spans)}
+
+def setup_lex_ids(source, table_dir, scratch_dir):
+    return lambda: IdLexer(source, SymbolPool()).tokenize(), lambda tokens: {'tokens': len(tokens)}
+
+def setup_lex_dfa(source, table_dir, scratch_dir):
+    from dfalexer import DfaLexer, token_dfa
+    token_dfa()
+    return lambda: DfaLexer(source).tokenize(), lambda tokens: {'tokens': len(tokens)}
+
+def setup_parse(source, table_dir, scratch_dir):
+    tokens = reference_tokens(source)
+    action_table, goto_table = load_parsing_tables(table_dir)
+    return (lambda: lr1_parse(tokens, action_table, goto_table),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_parse_encoded(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+    return (lambda: lr1_parse_encoded(tokens, tables, SymbolPool()),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_validate(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+    return (lambda: lr1_validate_encoded(zip(tokens.types, tokens.lexemes), tables),
+            lambda count: {'tokens': count})
+
+def setup_validate_stream(source, table_dir, scratch_dir):
+    tables = load_encoded_tables(table_dir)
+    return lambda: lr1_validate_encoded(IdLexer(source).stream(), tables), lambda count: {'tokens': count}
+
+def setup_parse_deferred(source, table_dir, scratch_dir):
+    from outline import DeferredParser
+    tokens = IdLexer(source).tokenize()
+    parser = DeferredParser(load_encoded_tables(table_dir))
+    return lambda: parser.parse(tokens), lambda tree: {'tokens': len(tokens)}
+
+def setup_parse_glr(source, table_dir, scratch_dir):
+    from glr import GlrParser
+    tokens = IdLexer(source).tokenize()
+    parser = GlrParser(load_encoded_tables(table_dir), SymbolPool())
+    return (lambda: parser.parse(tokens),
+            lambda tree: {'tokens': len(tokens), 'glr_tokens': parser.glr_tokens, 'ambiguities': parser.ambiguities})
+
+def setup_outline(source, table_dir, scratch_dir):
+    from dfalexer import DfaLexer, token_dfa
+    from outline import DeferredParser, outline
+    token_dfa()
+    parser = DeferredParser(load_encoded_tables(table_dir))
+    return lambda: outline(parser.parse(DfaLexer(source).tokenize())), lambda entries: {'entries': len(entries)}
+
+def compact_ir_actions(tables):
+    """
+    示例中间表示：单元产生式直接取子结点的值，其余产生式为 (lhs, 子结点元组)，token 只保留词素
+    """
+    actions = SemanticActions()
+    for lhs, rhs in tables.production_rules[1:]:
+        if len(rhs) == 1 and tables.symbol_ids[rhs[0]] >= tables.n_terminals:
+            actions.reduce(lhs, rhs)(lambda child: child)
+        else:
+            actions.reduce(lhs, rhs)(lambda *children, lhs=lhs: (lhs, children))
+    actions.token(*tables.symbols[:tables.n_terminals])(lambda type_name, text: text)
+    return actions
+
+def compact_ir(ast, non_terminals):
+    """
+    从通用语法树得到与 compact_ir_actions 相同的中间表示（后序遍历）
+    """
+    results = []
+    stack = [(ast, False)]
+    while stack:
+        node, visited = stack.pop()
+        label, value = node
+        if not isinstance(value, list):
+            results.append(value)
+        elif visited:
+            if len(value) == 1 and value[0][0] in non_terminals:
+                continue
+            children = tuple(results[len(results) - len(value):])
+            del results[len(results) - len(value):]
+            results.append((label, children))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(value))
+    return results[-1]
+
+def setup_parse_actions(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+    actions = compact_ir_actions(tables)
+    actions.bind(tables)
+    return lambda: lr1_parse_actions(tokens, tables, actions), lambda ir: {'tokens': len(tokens)}
+
+def setup_parse_convert(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+    non_terminals = set(tables.symbols[tables.n_terminals:])
+    return (lambda: compact_ir(lr1_parse_encoded(tokens, tables, SymbolPool()), non_terminals),
+            lambda ir: {'tokens': len(tokens)})
+
+def setup_parse_optimized(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_optimized_tables(table_dir)
+    return (lambda: lr1_parse_optimized(tokens, tables, SymbolPool()),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_parse_hashconsed(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+
+    def parse_hashconsed():
+        nodes = NodePool()
+        return nodes, lr1_parse_hashconsed(tokens, tables, nodes)
+
+    def measure(output):
+        nodes, root = output
+        return {'tokens': len(tokens), 'nodes': nodes.sizes[root], 'unique_nodes': len(nodes)}
+    return parse_hashconsed, measure
+
+def setup_parse_flat(source, table_dir, scratch_dir):
+    from tablefile import FlatTables, flat_table_bytes
+    tokens = IdLexer(source).tokenize()
+    tables = FlatTables(flat_table_bytes(load_encoded_tables(table_dir)))
+    return (lambda: lr1_parse_flat(tokens, tables, SymbolPool()),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_startup_encoded(source, table_dir, scratch_dir):
+    tokens = IdLexer(source).tokenize()
+    return (lambda: lr1_parse_encoded(tokens, load_encoded_tables(table_dir)),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_startup_lazy(source, table_dir, scratch_dir):
+    from tablefile import TABLE_FILE, load_lazy_tables, write_table_file
+    tokens = IdLexer(source).tokenize()
+    table_path = os.path.join(scratch_dir, TABLE_FILE)
+    write_table_file(load_encoded_tables(table_dir), table_path)
+
+    def parse_lazy():
+        tables = load_lazy_tables(table_path)
+        return tables, lr1_parse_encoded(tokens, tables)
+
+    def measure(output):
+        tables, ast = output
+        return {'tokens': len(tokens), 'nodes': count_nodes(ast), 'touched_states': tables.touched_states,
+                'states': tables.n_states}
+    return parse_lazy, measure
+
+def setup_parse_codegen(source, table_dir, scratch_dir):
+    from codegen import load_parser_module, write_parser_module
+    tokens = IdLexer(source).tokenize()
+    module_path = os.path.join(scratch_dir, 'generated_parser.py')
+    write_parser_module(load_encoded_tables(table_dir), module_path)
+    generated_parser = load_parser_module(module_path)
+    return (lambda: generated_parser.parse_tokens(tokens),
+            lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_yaml(source, table_dir, scratch_dir):
+    action_table, goto_table = load_parsing_tables(table_dir)
+    ast = lr1_parse(reference_tokens(source), action_table, goto_table)
+    output_path = os.path.join(scratch_dir, 'ast.yaml')
+    return lambda: save_ast_to_yaml(ast, output_path), lambda _: {'nodes': count_nodes(ast)}
+
+def setup_xml(source, table_dir, scratch_dir):
+    action_table, goto_table = load_parsing_tables(table_dir)
+    ast = lr1_parse(reference_tokens(source), action_table, goto_table)
+    output_path = os.path.join(scratch_dir, 'output.xml')
+    return lambda: save_ast_to_xml(ast, output_path), lambda _: {'nodes': count_nodes(ast)}
+
+def setup_columnar(source, table_dir, scratch_dir):
+    from columnar import write_columnar
+    action_table, goto_table = load_parsing_tables(table_dir)
+    tokens = reference_tokens(source)
+    ast = lr1_parse(tokens, action_table, goto_table)
+    output_path = os.path.join(scratch_dir, 'ast.col')
+    return (lambda: write_columnar(output_path, tokens, ast),
+            lambda _: {'tokens': len(tokens), 'nodes': count_nodes(ast)})
+
+def setup_columnar_read(source, table_dir, scratch_dir):
+    from columnar import ColumnarFile, write_columnar
+    action_table, goto_table = load_parsing_tables(table_dir)
+    tokens = reference_tokens(source)
+    ast = lr1_parse(tokens, action_table, goto_table)
+    output_path = os.path.join(scratch_dir, 'ast.col')
+    write_columnar(output_path, tokens, ast)
+
+    def read_columnar():
+        with ColumnarFile.open(output_path) as columnar:
+            return columnar.tree()
+    return read_columnar, lambda ast: {'tokens': len(tokens), 'nodes': count_nodes(ast)}
+
+def setup_node_store(source, table_dir, scratch_dir):
+    from nodestore import build_node_store_from_file
+    input_path = os.path.join(scratch_dir, 'input.c')
+    with open(input_path, 'w', encoding='utf-8') as file:
+        file.write(source)
+    tables = load_encoded_tables(table_dir)
+    output_path = os.path.join(scratch_dir, 'ast.nodes')
+    return (lambda: build_node_store_from_file(input_path, tables, output_path),
+            lambda counts: {'tokens': counts[0], 'nodes': counts[1]})
+
+def setup_parse_indexed(source, table_dir, scratch_dir):
+    from nodeindex import lr1_parse_indexed
+    tokens = IdLexer(source).tokenize()
+    tables = load_encoded_tables(table_dir)
+    return (lambda: lr1_parse_indexed(tokens, tables, SymbolPool()),
+            lambda result: {'tokens': len(tokens), 'nodes': len(result[1])})
+
+def setup_query(source, table_dir, scratch_dir):
+    from nodeindex import lr1_parse_indexed
+    tokens = IdLexer(source).tokenize()
+    _, index = lr1_parse_indexed(tokens, load_encoded_tables(table_dir))
+    middle = len(tokens) // 2
+
+    def query():
+        # 典型的分析查询：函数内的跳转、含跳转的函数、某段 token 中的调用与赋值
+        return (index.inside('jumpStatement', 'functionDefinition')
+                + index.containing('functionDefinition', 'jumpStatement')
+                + index.within(middle, middle + 1000, 'postfixExpression')
+                + [node for node in index.of_kind('assignmentExpression')[:100]
+                   if index.enclosing(node, 'iterationStatement') is not None])
+    return query, lambda nodes: {'results': len(nodes)}
+
+def setup_build(source, table_dir, scratch_dir):
+    from builder import build_parsing_tables, grammar_rules
+    return lambda: build_parsing_tables(grammar_rules, scratch_dir), lambda _: {}
+
+# 阶段名 -> 准备函数；准备函数返回 (被计时的函数, 由其结果计算 token/节点数的函数)
+STAGE_SETUPS = {
+    'lex': setup_lex,
+    'lex_mmap': setup_lex_mmap,
+    'lex_ids': setup_lex_ids,
+    'lex_dfa': setup_lex_dfa,
+    'parse': setup_parse,
+    'parse_encoded': setup_parse_encoded,
+    'validate': setup_validate,
+    'validate_stream': setup_validate_stream,
+    'parse_deferred': setup_parse_deferred,
+    'parse_glr': setup_parse_glr,
+    'parse_actions': setup_parse_actions,
+    'parse_indexed': setup_parse_indexed,
+    'query': setup_query,
+    'parse_convert': setup_parse_convert,
+    'outline': setup_outline,
+    'parse_optimized': setup_parse_optimized,
+    'parse_hashconsed': setup_parse_hashconsed,
+    'parse_codegen': setup_parse_codegen,
+    'parse_flat': setup_parse_flat,
+    'startup_encoded': setup_startup_encoded,
+    'startup_lazy': setup_startup_lazy,
+    'yaml': setup_yaml,
+    'xml': setup_xml,
+    'columnar': setup_columnar,
+    'columnar_read': setup_columnar_read,
+    'node_store': setup_node_store,
+    'build': setup_build,
+}
+STAGES = list(STAGE_SETUPS)
+
+def run_stage(stage, source, table_dir, warmup, repeats):
+    """
+    在当前进程中运行单个阶段并返回度量结果
+    """
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        func, measure = STAGE_SETUPS[stage](source, table_dir, scratch_dir)
+        del source
+        if stage == 'build':
+            warmup = 0
+        timings, output = time_stage(func, warmup, repeats)
+        result = {'stage': stage}
+        result.update(measure(output))
+    best = min(timings)
+    result['best_s'] = best
+    result['median_s'] = statistics.median(timings)
+    if 'tokens' in result:
+        result['tokens_per_s'] = result['tokens'] / best
+    if 'nodes' in result:
+        result['nodes_per_s'] = result['nodes'] / best
+    result['peak_rss_kb'] = peak_rss_kb()
+    return result
+
+def _stage_worker(queue, stage, source, table_dir, warmup, repeats):
+    try:
+        queue.put(run_stage(stage, source, table_dir, warmup, repeats))
+    except BaseException as e:
+        queue.put({'stage': stage, 'error': f"{type(e).__name__}: {e}"})
+
+def run_stage_isolated(stage, source, table_dir, warmup, repeats):
+    """
+    在独立子进程中运行阶段，使峰值 RSS 只反映该阶段
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_stage_worker, args=(queue, stage, source, table_dir, warmup, repeats))
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            if process.is_alive():
+                continue
+            # 子进程已退出：结果可能恰好在超时之后写入
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                break
+    process.join()
+    if result is None or process.exitcode != 0:
+        raise RuntimeError(f"阶段 {stage} 的子进程异常退出，退出码 {process.exitcode}")
+    if 'error' in result:
+        raise RuntimeError(f"阶段 {stage} 运行失败：{result['error']}")
+    return result
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    与基线比较，返回退化描述列表。吞吐下降或峰值内存上升超过 tolerance 视为退化
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('tokens_per_s', 'nodes_per_s'):
+            if metric in result and metric in base and result[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{key}.{metric}: {result[metric]:.0f} < 基线 {base[metric]:.0f}")
+        if 'best_s' in base and result['best_s'] > base['best_s'] * (1 + tolerance):
+            regressions.append(f"{key}.best_s: {result['best_s']:.4f} > 基线 {base['best_s']:.4f}")
+        if 'peak_rss_kb' in base and result['peak_rss_kb'] > base['peak_rss_kb'] * (1 + tolerance):
+            regressions.append(f"{key}.peak_rss_kb: {result['peak_rss_kb']} > 基线 {base['peak_rss_kb']}")
+    return regressions
+
+def format_result(key, result):
+    parts = [f"{key:<16}", f"best {result['best_s'] * 1000:9.2f} ms", f"median {result['median_s'] * 1000:9.2f} ms"]
+    if 'tokens_per_s' in result:
+        parts.append(f"{result['tokens_per_s']:12.0f} tokens/s")
+    if 'nodes_per_s' in result:
+        parts.append(f"{result['nodes_per_s']:12.0f} nodes/s")
+    if 'unique_nodes' in result:
+        parts.append(f"unique {result['unique_nodes'] / result['nodes']:6.1%}")
+    if 'touched_states' in result:
+        parts.append(f"states {result['touched_states']}/{result['states']}")
+    parts.append(f"peak RSS {result['peak_rss_kb'] / 1024:8.1f} MB")
+    return '  '.join(parts)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="词法分析、语法分析与建表的性能基准")
+    arg_parser.add_argument('--scale', choices=SCALES.keys(), default='small', help="预设规模")
+    arg_parser.add_argument('--functions', type=int, help="覆盖预设的函数个数")
+    arg_parser.add_argument('--expr-depth', type=int, help="覆盖预设的表达式嵌套深度")
+    arg_parser.add_argument('--switch-cases', type=int, help="覆盖预设的 switch case 数")
+    arg_parser.add_argument('--typedefs', type=int, help="覆盖预设的 typedef 个数")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--stages', default='lex,lex_mmap,lex_ids,parse,parse_encoded,parse_codegen,yaml', help=f"逗号分隔，可选 {','.join(STAGES)}（build 较慢，默认不运行）")
+    arg_parser.add_argument('--warmup', type=int, default=1)
+    arg_parser.add_argument('--repeats', type=int, default=5)
+    arg_parser.add_argument('--table-dir', default='.', help="action_table.pkl / goto_table.pkl 所在目录")
+    arg_parser.add_argument('--baseline', default='bench_baseline.json', help="基线文件路径")
+    arg_parser.add_argument('--save-baseline', action='store_true', help="将本次结果写入基线")
+    arg_parser.add_argument('--check', action='store_true', help="与基线比较，退化时返回非零")
+    arg_parser.add_argument('--tolerance', type=float, default=0.2, help="允许的相对退化幅度")
+    arg_parser.add_argument('--emit-corpus', help="只将生成的 C 程序写入该路径")
+    args = arg_parser.parse_args(argv)
+
+    params = dict(SCALES[args.scale])
+    for name in params:
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    source = generate_corpus(seed=args.seed, **params)
+    if args.emit_corpus:
+        with open(args.emit_corpus, 'w', encoding='utf-8') as file:
+            file.write(source)
+        print(f"合成程序已保存到 {args.emit_corpus}（{len(source)} 字节）")
+        return 0
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            arg_parser.error(f"未知阶段 {stage}")
+
+    print(f"规模 {args.scale} {params}，源码 {len(source)} 字节")
+    results = {}
+    for stage in stages:
+        key = stage if stage == 'build' else f"{args.scale}/{stage}"
+        results[key] = run_stage_isolated(stage, source, args.table_dir, args.warmup, args.repeats)
+        print(format_result(key, results[key]))
+
+    status = 0
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"基线文件 {args.baseline} 不存在")
+            return 2
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("检测到性能退化：")
+            for regression in regressions:
+                print(f"  {regression}")
+            status = 1
+        else:
+            print("未检测到性能退化。")
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"基线已保存到 {args.baseline}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 import pickle  # 用于序列化解析表
 
 class Grammar:
@@ -52,7 +53,7 @@ class Item:
                 self.lookahead == other.lookahead)
 
     def __hash__(self):
-        return hash((self.lhs, tuple(self.rhs), self.dot_position, tuple(self.lookahead)))
+        return hash((self.lhs, tuple(self.rhs), self.dot_position, frozenset(self.lookahead)))
 
     def __repr__(self):
         rhs_with_dot = self.rhs.copy()
@@ -94,6 +95,7 @@ class Automaton:
     def __init__(self):
         self.states: list[ItemSet] = []  # 存储所有的ItemSet
         self.state_map = {}  # 从ItemSet到状态编号的映射
+        self.productions = None  # 构建时使用的增广文法，增量构建时与新文法比对
 
     def add_state(self, item_set: ItemSet):
         if item_set not in self.state_map:
@@ -166,12 +168,21 @@ class ActionTable:
     """
     def __init__(self):
         self.table = {}
+        self.conflicts = {}  # state_id -> {symbol: [按优先级被舍弃的动作]}
 
     def set(self, state_id, symbol, action, item):
         if state_id not in self.table:
             self.table[state_id] = {}
         self.table[state_id][symbol] = (action, item)
 
+    def add_conflict(self, state_id, symbol, action):
+        """
+        记录冲突中被舍弃的动作，供 GLR 分析（glr.py）在该处分叉
+        """
+        discarded = self.conflicts.setdefault(state_id, {}).setdefault(symbol, [])
+        if action not in discarded:
+            discarded.append(action)
+
     def get(self, state_id, symbol):
         entry = self.table.get(state_id, {}).get(symbol)
         if entry:
@@ -222,6 +233,26 @@ class ItemComparison:
             # LALR(1) 疑似会引入悬挂 else 二义性
             [{'lhs': 'selectionStatement', 'rhs': ['If', 'LeftParen', 'expression', 'RightParen', 'statement', '·', 'Else', 'statement']},
              {'lhs': 'selectionStatement', 'rhs': ['If', 'LeftParen', 'expression', 'RightParen', 'statement', '·']}],
+            # 存储类说明符之后必有类型（C99 起不再有隐式 int），如 typedef T *P;
+            [{'lhs': 'typedefName', 'rhs': ['·', 'Identifier']},
+             {'lhs': 'declarationSpecifiers', 'rhs': ['storageClassSpecifier', '·']}],
+            # 上述情况在限定符等说明符之后的情形，如 int const x = 1;
+            [{'lhs': 'declarationSpecifiers', 'rhs': ['typeQualifier', '·']},
+             {'lhs': 'typedefName', 'rhs': ['·', 'Identifier']}],
+            [{'lhs': 'declarationSpecifiers', 'rhs': ['functionSpecifier', '·']},
+             {'lhs': 'typedefName', 'rhs': ['·', 'Identifier']}],
+            [{'lhs': 'declarationSpecifiers', 'rhs': ['alignmentSpecifier', '·']},
+             {'lhs': 'typedefName', 'rhs': ['·', 'Identifier']}],
+            [{'lhs': 'specifierQualifierList', 'rhs': ['typeQualifier', '·']},
+             {'lhs': 'typedefName', 'rhs': ['·', 'Identifier']}],
+            # _Atomic(int) q; 中 _Atomic 后接 ( 时为原子类型说明符
+            [{'lhs': 'atomicTypeSpecifier', 'rhs': ['Atomic', '·', 'LeftParen', 'typeName', 'RightParen']},
+             {'lhs': 'typeQualifier', 'rhs': ['Atomic', '·']}],
+            # 以下冲突原先由项目集的迭代顺序决定，这里固定下来
+            [{'lhs': 'typedefName', 'rhs': ['Identifier', '·']},
+             {'lhs': 'identifierList', 'rhs': ['Identifier', '·']}],
+            [{'lhs': 'typedefName', 'rhs': ['Identifier', '·']},
+             {'lhs': 'directDeclarator', 'rhs': ['Identifier', '·']}],
         ]
 
     def compare_items(self, item1: Item, item2: Item):
@@ -323,11 +354,12 @@ def items(grammar: Grammar):
     start_state = closure(ItemSet({start_item}), grammar, first_sets)
     automaton.add_state(start_state)
 
+    symbols = sorted(grammar.terminals | grammar.non_terminals)
     added = True
     while added:
         added = False
         for state in automaton.states:
-            for symbol in grammar.terminals.union(grammar.non_terminals):
+            for symbol in symbols:
                 target_state = goto(state, symbol, grammar, first_sets)
                 if target_state:
                     existing_state_id = automaton.get_state_id(target_state)
@@ -352,6 +384,203 @@ def items(grammar: Grammar):
                     state.transitions[symbol] = existing_state_id
     return automaton, first_sets
 
+class ExpansionContext:
+    """
+    状态扩展所需的只读文法信息，每个工作进程各持一份
+    项目核心以 (产生式编号, 点的位置) 表示，内核为按核心排序的 ((产生式编号, 点的位置), 向前看集合) 元组
+    """
+    def __init__(self, grammar: Grammar, first_sets: FirstSets):
+        self.productions = []  # [(左部, 右部列表)]，右部沿用 grammar 中的列表对象
+        self.by_lhs = {}
+        for lhs, rhs_list in grammar.productions.items():
+            for rhs in rhs_list:
+                self.by_lhs.setdefault(lhs, []).append(len(self.productions))
+                self.productions.append((lhs, rhs))
+        self.ids = {(lhs, tuple(rhs)): production_id for production_id, (lhs, rhs) in enumerate(self.productions)}
+        self.non_terminals = grammar.non_terminals
+        self.first_sets = first_sets
+        self.follow_cache = {}
+
+    def production_id(self, lhs, rhs):
+        return self.ids[(lhs, tuple(rhs))]
+
+    def inherited(self, production_id, dot):
+        """
+        点后非终结符之后的串 β 的 First 集（不含 ε），以及 β 是否可空
+        """
+        key = (production_id, dot)
+        cached = self.follow_cache.get(key)
+        if cached is None:
+            first = self.first_sets.compute_string_first(self.productions[production_id][1][dot + 1:])
+            nullable = '' in first
+            first.discard('')
+            cached = self.follow_cache[key] = (frozenset(first), nullable)
+        return cached
+
+    def closure(self, kernel):
+        """
+        工作表法计算闭包，返回 {核心: 向前看集合}
+        """
+        items = {core: set(lookahead) for core, lookahead in kernel}
+        worklist = list(items)
+        while worklist:
+            core = worklist.pop()
+            production_id, dot = core
+            rhs = self.productions[production_id][1]
+            if dot >= len(rhs) or rhs[dot] not in self.non_terminals:
+                continue
+            first, nullable = self.inherited(production_id, dot)
+            lookahead = first | items[core] if nullable else first
+            for child in self.by_lhs[rhs[dot]]:
+                child_core = (child, 0)
+                existing = items.get(child_core)
+                if existing is None:
+                    items[child_core] = set(lookahead)
+                    worklist.append(child_core)
+                elif not lookahead <= existing:
+                    existing |= lookahead
+                    worklist.append(child_core)
+        return items
+
+    def successors(self, kernel):
+        """
+        返回按符号排序的 [(符号, 后继内核), ...]
+        """
+        return self.group_successors(self.closure(kernel).items())
+
+    def group_successors(self, closure_items):
+        by_symbol = {}
+        for (production_id, dot), lookahead in closure_items:
+            rhs = self.productions[production_id][1]
+            if dot < len(rhs):
+                by_symbol.setdefault(rhs[dot], []).append(((production_id, dot + 1), frozenset(lookahead)))
+        return [(symbol, tuple(sorted(by_symbol[symbol]))) for symbol in sorted(by_symbol)]
+
+# 工作进程内的扩展上下文，由 init_expansion_worker 创建
+_expansion_context = None
+
+def init_expansion_worker(grammar):
+    global _expansion_context
+    _expansion_context = ExpansionContext(grammar, FirstSets(grammar))
+
+def expand_state(kernel):
+    return _expansion_context.successors(kernel)
+
+def close_state(kernel):
+    return sorted((core, frozenset(lookahead)) for core, lookahead in _expansion_context.closure(kernel).items())
+
+def freeze_kernel(kernel):
+    return tuple(sorted((core, frozenset(lookahead)) for core, lookahead in kernel.items()))
+
+def affected_states(previous: Automaton, grammar: Grammar, first_sets: FirstSets):
+    """
+    文法修改后旧自动机中闭包可能改变的状态：
+    闭包中含有改动过的非终结符的项目，或点之后出现 First 集改变了的符号
+    其余状态的闭包只取决于内核，内核不变时可以直接沿用
+    """
+    old_grammar = Grammar(previous.productions)
+    old_first_sets = FirstSets(old_grammar)
+    changed = {lhs for lhs in set(old_grammar.productions) | set(grammar.productions)
+               if old_grammar.productions.get(lhs) != grammar.productions.get(lhs)}
+    first_changed = {symbol for symbol in set(old_first_sets.first_sets) | set(first_sets.first_sets)
+                     if old_first_sets.get(symbol) != first_sets.get(symbol)}
+    affected = set()
+    for state_id, state in enumerate(previous.states):
+        for item in state.items:
+            if item.lhs in changed or not first_changed.isdisjoint(item.rhs[item.dot_position + 1:]):
+                affected.add(state_id)
+                break
+    return affected
+
+def items_parallel(grammar: Grammar, jobs=None, previous: Automaton = None, affected=None):
+    """
+    并行计算 LALR(1) 项目集族，结果与 items 相同（状态编号不同）
+    - 状态由内核核心唯一确定，同芯状态直接合并向前看集合
+    - 每一轮把待扩展的状态（新状态或向前看集合有增长的状态）交给进程池计算后继内核，
+      空闲进程从共享队列中领取剩余任务
+    - 主进程按 (状态编号, 符号) 顺序合并结果并编号新状态，因此输出与进程数无关
+    jobs 为 1 时在当前进程内计算
+    给出 previous（旧文法构建的自动机）时，内核与旧状态完全相同且不在 affected 中的状态直接沿用旧闭包，
+    只有其余状态需要计算闭包，结果与从头构建相同
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    first_sets = FirstSets(grammar)
+    init_expansion_worker(grammar)
+    context = _expansion_context
+    start_core = (context.production_id(grammar.augmented_start_symbol, [grammar.start_symbol]), 0)
+    kernels = [{start_core: {'EOF'}}]
+    kernel_ids = {frozenset([start_core]): 0}
+    transitions = [{}]
+
+    # 旧状态的闭包，以内核为键
+    reusable = {}
+    if previous is not None:
+        if affected is None:
+            affected = affected_states(previous, grammar, first_sets)
+        for state_id, state in enumerate(previous.states):
+            if state_id not in affected:
+                closure_items = sorted(((context.production_id(item.lhs, item.rhs), item.dot_position),
+                                        frozenset(item.lookahead)) for item in state.items)
+                reusable[tuple(item for item in closure_items if item[0][1] > 0 or item[0] == start_core)] = closure_items
+
+    jobs = jobs or os.cpu_count()
+    executor = ProcessPoolExecutor(jobs, initializer=init_expansion_worker, initargs=(grammar,)) if jobs > 1 else None
+
+    def run(func, kernels):
+        """
+        对未命中旧闭包的内核调用 func，命中的直接由旧闭包得到结果
+        """
+        missed = [kernel for kernel in kernels if kernel not in reusable]
+        if executor:
+            results = executor.map(func, missed, chunksize=max(1, len(missed) // (jobs * 8)))
+        else:
+            results = map(func, missed)
+        results = dict(zip(missed, results))
+        for kernel in kernels:
+            if kernel in reusable:
+                closure_items = reusable[kernel]
+                yield context.group_successors(closure_items) if func is expand_state else closure_items
+            else:
+                yield results[kernel]
+
+    try:
+        frontier = [0]
+        while frontier:
+            results = run(expand_state, [freeze_kernel(kernels[state_id]) for state_id in frontier])
+            grown = set()
+            for state_id, successors in zip(frontier, results):
+                for symbol, kernel in successors:
+                    key = frozenset(core for core, _ in kernel)
+                    target = kernel_ids.get(key)
+                    if target is None:
+                        target = kernel_ids[key] = len(kernels)
+                        kernels.append({core: set(lookahead) for core, lookahead in kernel})
+                        transitions.append({})
+                        grown.add(target)
+                    else:
+                        existing = kernels[target]
+                        for core, lookahead in kernel:
+                            if not lookahead <= existing[core]:
+                                existing[core] |= lookahead
+                                grown.add(target)
+                    transitions[state_id][symbol] = target
+            frontier = sorted(grown)
+        closures = list(run(close_state, [freeze_kernel(kernel) for kernel in kernels]))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    automaton = Automaton()
+    automaton.productions = grammar.productions
+    for state_id, closure_items in enumerate(closures):
+        state = ItemSet(Item(context.productions[production_id][0], context.productions[production_id][1], dot,
+                             set(lookahead)) for (production_id, dot), lookahead in closure_items)
+        state.transitions = transitions[state_id]
+        automaton.states.append(state)
+        automaton.state_map[state] = state_id
+    return automaton, first_sets
+
 def construct_parsing_table(automaton: Automaton, grammar: Grammar, item_comparison: ItemComparison):
     """
     构建 Action 表和 Goto 表，并处理冲突
@@ -360,7 +589,8 @@ def construct_parsing_table(automaton: Automaton, grammar: Grammar, item_compari
     goto_table = GotoTable()
 
     for state_id, state in enumerate(automaton.states):
-        for item in state.items:
+        # 按核心排序遍历，未列入优先级表的冲突也有确定的结果
+        for item in sorted(state.items, key=Item.core):
             if item.dot_position < len(item.rhs):
                 symbol = item.rhs[item.dot_position]
                 if symbol in grammar.terminals:
@@ -373,10 +603,13 @@ def construct_parsing_table(automaton: Automaton, grammar: Grammar, item_compari
                             priority = item_comparison.compare_items(existing_item, item)
                             if priority == -1:
                                 # 保留已有的动作
-                                pass
+                                if existing_action != new_action:
+                                    action_table.add_conflict(state_id, symbol, new_action)
                             elif priority == 1:
                                 # 用新的动作替换
                                 action_table.set(state_id, symbol, new_action, item)
+                                if existing_action != new_action:
+                                    action_table.add_conflict(state_id, symbol, existing_action)
                             else:
                                 raise Exception(f"在状态 {state_id} 和符号 {symbol} 处发生无法解决的冲突")
                         else:
@@ -392,9 +625,12 @@ def construct_parsing_table(automaton: Automaton, grammar: Grammar, item_compari
                             existing_action, existing_item = existing_entry
                             priority = item_comparison.compare_items(existing_item, item)
                             if priority == -1:
-                                pass
+                                if existing_action != new_action:
+                                    action_table.add_conflict(state_id, lookahead, new_action)
                             elif priority == 1:
                                 action_table.set(state_id, lookahead, new_action, item)
+                                if existing_action != new_action:
+                                    action_table.add_conflict(state_id, lookahead, existing_action)
                             else:
                                 raise Exception(f"在状态 {state_id} 和符号 {lookahead} 处发生无法解决的冲突")
                         else:
@@ -405,462 +641,705 @@ def construct_parsing_table(automaton: Automaton, grammar: Grammar, item_compari
                 goto_table.set(state_id, symbol, next_state_id)
     return action_table, goto_table
 
-def build_parsing_tables(grammar_rules):
-    grammar = Grammar(grammar_rules)
+class EncodedTables:
+    """
+    整数编码的解析表
+    - symbols: 符号名列表，终结符在前（下标即编号），非终结符在后
+    - productions: 每个产生式的 (左部编号, 右部长度)；0 号为增广产生式，对其归约即接受
+    - action_rows[state]: 终结符编号 -> 动作；非负数表示移进到该状态，负数 ~p 表示按 p 号产生式归约
+    - goto_rows[state]: 非终结符编号 -> 目标状态
+    - conflict_rows[state]: 终结符编号 -> 冲突中被舍弃的动作元组（编码同 action_rows）；
+      表由不记录冲突的旧版 builder.py 生成时为 None
+    """
+    ACCEPT = ~0
+
+    def __init__(self, symbols, n_terminals, productions, production_rules, action_rows, goto_rows,
+                 conflict_rows=None):
+        self.symbols = symbols
+        self.symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(symbols)}
+        self.n_terminals = n_terminals
+        self.productions = productions
+        self.production_rules = production_rules  # 每个产生式的 (左部, 右部元组)
+        self.production_ids = {rule: production_id for production_id, rule in enumerate(production_rules)}
+        self.action_rows = action_rows
+        self.goto_rows = goto_rows
+        self.conflict_rows = conflict_rows
+
+    def production_id(self, lhs, rhs):
+        return self.production_ids[(lhs, tuple(rhs))]
+
+def encode_tables(action_table, goto_table, grammar_rules, terminal_order=()):
+    """
+    将 ActionTable / GotoTable 编码为 EncodedTables
+    terminal_order 指定终结符编号的顺序（如词法分析器的 token 编号），其余终结符依次排在后面
+    """
+    start_symbol = next(iter(grammar_rules))
+    production_rules = [(start_symbol + "'", (start_symbol,))]
+    for lhs, rhs_list in grammar_rules.items():
+        for rhs in rhs_list:
+            production_rules.append((lhs, tuple(rhs)))
+    production_ids = {rule: production_id for production_id, rule in enumerate(production_rules)}
+
+    terminals = list(terminal_order)
+    seen = set(terminals)
+    for _, row in sorted(action_table.table.items()):
+        for symbol in sorted(row):
+            if symbol not in seen:
+                terminals.append(symbol)
+                seen.add(symbol)
+    non_terminals = [start_symbol + "'"] + list(grammar_rules)
+    symbols = terminals + non_terminals
+    symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(symbols)}
+    productions = [(symbol_ids[lhs], len(rhs)) for lhs, rhs in production_rules]
+
+    def encode_action(action):
+        if action[0] == 'shift':
+            return action[1]
+        if action[0] == 'reduce':
+            lhs, rhs = action[1]
+            return ~production_ids[(lhs, tuple(rhs))]
+        return EncodedTables.ACCEPT
+
+    n_states = max(list(action_table.table) + list(goto_table.table)) + 1
+    action_rows = [{} for _ in range(n_states)]
+    goto_rows = [{} for _ in range(n_states)]
+    for state_id, row in action_table.table.items():
+        encoded_row = action_rows[state_id]
+        for symbol, (action, _) in row.items():
+            encoded_row[symbol_ids[symbol]] = encode_action(action)
+    for state_id, row in goto_table.table.items():
+        for symbol, next_state in row.items():
+            goto_rows[state_id][symbol_ids[symbol]] = next_state
+    conflicts = getattr(action_table, 'conflicts', None)
+    conflict_rows = None
+    if conflicts is not None:
+        conflict_rows = [{} for _ in range(n_states)]
+        for state_id, row in conflicts.items():
+            for symbol, discarded in row.items():
+                chosen = action_rows[state_id][symbol_ids[symbol]]
+                actions = tuple(action for action in map(encode_action, discarded) if action != chosen)
+                if actions:
+                    conflict_rows[state_id][symbol_ids[symbol]] = actions
+    return EncodedTables(symbols, len(terminals), productions, production_rules, action_rows, goto_rows,
+                         conflict_rows)
+
+class OptimizedTables:
+    """
+    经 optimize_tables 优化的解析表，与 EncodedTables 共用符号与产生式编号
+    - action_rows[state]: 去掉单元归约与默认归约项后的动作
+    - default_actions[state]: 行内查不到向前看符号时执行的默认归约（~p），没有则为 None
+    - unit_chains[state]: 以 非终结符编号 * n_terminals + 向前看编号 为键，
+      值为 (跳过整条单元归约链后的目标状态, 链上依次包裹的左部名元组)
+    - goto_rows[state]: 非终结符编号 -> 目标状态，不在单元链上时使用
+    """
+    def __init__(self, tables: EncodedTables, action_rows, default_actions, unit_chains, stats):
+        self.symbols = tables.symbols
+        self.n_terminals = tables.n_terminals
+        self.productions = tables.productions
+        self.production_rules = tables.production_rules
+        self.action_rows = action_rows
+        self.default_actions = default_actions
+        self.unit_chains = unit_chains
+        self.goto_rows = tables.goto_rows
+        self.stats = stats
+
+    def summary(self):
+        stats = self.stats
+        return (f"单元产生式 {stats['unit_productions']} 条，消除单元归约项 {stats['unit_entries']} 个，"
+                f"单元链 {stats['chains']} 条（平均长度 {stats['mean_chain']:.1f}），"
+                f"不再可达的状态 {stats['dead_states']} 个，"
+                f"默认归约状态 {stats['default_states']} 个，动作项 {stats['entries_before']} -> {stats['entries_after']}")
+
+def optimize_tables(tables: EncodedTables):
+    """
+    解析表优化：
+    1. 单元产生式消除：A -> B（B 为非终结符）的归约只会紧跟在 GOTO B 之后，且弹出的正是刚压入的状态，
+       因此整条归约链只取决于 (露出的状态, B, 向前看)，可在建表时预先走完。
+       语法树中的单元结点仍按原样包裹，输出与 lr1_parse 相同
+    2. 默认归约：每个状态出现最多的归约成为默认动作，查不到向前看时直接归约。
+       错误只会推迟到后续状态发现，报错的 token 不变
+    """
+    n_terminals = tables.n_terminals
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    # 右部只有一个非终结符的产生式
+    unit_productions = {
+        production_id for production_id, (lhs, rhs) in enumerate(tables.production_rules)
+        if production_id and len(rhs) == 1 and tables.symbol_ids[rhs[0]] >= n_terminals
+    }
+
+    def is_unit_reduce(action):
+        return action is not None and action < 0 and action != EncodedTables.ACCEPT and ~action in unit_productions
+
+    unit_chains = [{} for _ in goto_rows]
+    chain_lengths = []
+    for state_id, goto_row in enumerate(goto_rows):
+        for symbol_id, first_target in goto_row.items():
+            for token_id, action in action_rows[first_target].items():
+                if not is_unit_reduce(action):
+                    continue
+                wrappers = []
+                while is_unit_reduce(action):
+                    current = tables.productions[~action][0]
+                    wrappers.append(tables.symbols[current])
+                    if len(wrappers) > len(unit_productions):
+                        raise ValueError(f"文法存在单元产生式环：{' -> '.join(wrappers)}")
+                    target = goto_row[current]
+                    action = action_rows[target].get(token_id)
+                unit_chains[state_id][symbol_id * n_terminals + token_id] = (target, tuple(wrappers))
+                chain_lengths.append(len(wrappers))
+
+    # 单元归约项已被链覆盖，从动作表中删去；只剩单元归约的状态不再可达
+    optimized_rows = []
+    dead_states = 0
+    unit_entries = 0
+    for row in action_rows:
+        kept = {token_id: action for token_id, action in row.items() if not is_unit_reduce(action)}
+        unit_entries += len(row) - len(kept)
+        if row and not kept:
+            dead_states += 1
+        optimized_rows.append(kept)
+
+    default_actions = []
+    for row in optimized_rows:
+        counts = {}
+        for action in row.values():
+            if action < 0 and action != EncodedTables.ACCEPT:
+                counts[action] = counts.get(action, 0) + 1
+        if not counts:
+            default_actions.append(None)
+            continue
+        default = max(counts, key=lambda action: (counts[action], action))
+        for token_id in [token_id for token_id, action in row.items() if action == default]:
+            del row[token_id]
+        default_actions.append(default)
+
+    stats = {
+        'unit_productions': len(unit_productions),
+        'unit_entries': unit_entries,
+        'chains': len(chain_lengths),
+        'mean_chain': sum(chain_lengths) / len(chain_lengths) if chain_lengths else 0.0,
+        'dead_states': dead_states,
+        'default_states': sum(default is not None for default in default_actions),
+        'entries_before': sum(map(len, action_rows)),
+        'entries_after': sum(map(len, optimized_rows)),
+    }
+    return OptimizedTables(tables, optimized_rows, default_actions, unit_chains, stats)
+
+class AutomatonUnpickler(pickle.Unpickler):
+    """
+    builder.py 以脚本方式运行时保存的类记录在 __main__ 下，这里统一映射到本模块
+    """
+    def find_class(self, module, name):
+        if module in ('__main__', 'builder'):
+            return globals()[name]
+        return super().find_class(module, name)
+
+def load_previous_automaton(output_dir):
+    """
+    读取 output_dir 中上一次构建保存的自动机；文件不存在或不含文法快照时返回 None
+    """
+    path = os.path.join(output_dir, 'automaton.pkl')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        automaton = AutomatonUnpickler(f).load()
+    return automaton if getattr(automaton, 'productions', None) else None
+
+def build_parsing_tables(grammar_rules, output_dir='.', backend='pickle', jobs=None, incremental=False):
+    """
+    构建解析表并保存到 output_dir
+    backend 为 'python' 时另外生成独立的分析器模块 generated_parser.py（见 codegen.py），
+    为 'binary' 时另外生成按状态懒加载的表文件 parse_tables.bin（见 tablefile.py）
+    jobs 为计算项目集族的进程数，默认使用全部 CPU；结果与 jobs 无关
+    incremental 为 True 时复用 output_dir 中的 automaton.pkl，只重新计算受文法改动影响的状态
+    """
+    # 拷贝一份产生式，避免增广文法时修改调用者传入的 grammar_rules
+    grammar = Grammar({lhs: [list(rhs) for rhs in rhs_list] for lhs, rhs_list in grammar_rules.items()})
     grammar.augment_grammar()
-    automaton, first_sets = items(grammar)
+    previous = load_previous_automaton(output_dir) if incremental else None
+    if previous is not None:
+        affected = affected_states(previous, grammar, FirstSets(grammar))
+        print(f"增量构建：{len(affected)} / {len(previous.states)} 个状态的闭包受文法改动影响。")
+        automaton, first_sets = items_parallel(grammar, jobs, previous, affected)
+    else:
+        automaton, first_sets = items_parallel(grammar, jobs)
     item_comparison = ItemComparison()
     action_table, goto_table = construct_parsing_table(automaton, grammar, item_comparison)
 
     # 将解析表保存到文件
-    with open('action_table.pkl', 'wb') as f:
+    with open(os.path.join(output_dir, 'action_table.pkl'), 'wb') as f:
         pickle.dump(action_table, f)
 
-    with open('goto_table.pkl', 'wb') as f:
+    with open(os.path.join(output_dir, 'goto_table.pkl'), 'wb') as f:
         pickle.dump(goto_table, f)
 
-    with open('automaton.pkl', 'wb') as f:
+    with open(os.path.join(output_dir, 'automaton.pkl'), 'wb') as f:
         pickle.dump(automaton, f)
 
     print("解析表已生成并保存到 'action_table.pkl' 和 'goto_table.pkl' 文件中。")
 
-if __name__ == "__main__":
-    grammar_rules = {
-        'compilationUnit': [
-            ['translationUnit', 'EOF'],
-            ['EOF']
-        ],
-        'translationUnit': [
-            ['externalDeclaration'],
-            ['translationUnit', 'externalDeclaration']
-        ],
-        'externalDeclaration': [
-            ['functionDefinition'],
-            ['declaration']
-        ],
-        'functionDefinition': [
-            ['declarationSpecifiers', 'declarator', 'declarationList', 'compoundStatement'],
-            ['declarationSpecifiers', 'declarator', 'compoundStatement']
-        ],
-        'declarationList': [
-            ['declaration'],
-            ['declarationList', 'declaration']
-        ],
-        'primaryExpression': [
-            ['Identifier'],
-            ['Constant'],
-            ['StringLiteral'],
-            ['LeftParen', 'expression', 'RightParen'],
-            ['genericSelection']
-        ],
-        'genericSelection': [
-            ['Generic', 'LeftParen', 'assignmentExpression', 'Comma', 'genericAssocList', 'RightParen']
-        ],
-        'genericAssocList': [
-            ['genericAssociation'],
-            ['genericAssocList', 'Comma', 'genericAssociation']
-        ],
-        'genericAssociation': [
-            ['typeName', 'Colon', 'assignmentExpression'],
-            ['Default', 'Colon', 'assignmentExpression']
-        ],
-        'postfixExpression': [
-            ['primaryExpression'],
-            ['postfixExpression', 'LeftBracket', 'expression', 'RightBracket'],
-            ['postfixExpression', 'LeftParen', 'argumentExpressionList', 'RightParen'],
-            ['postfixExpression', 'LeftParen', 'RightParen'],
-            ['postfixExpression', 'Dot', 'Identifier'],
-            ['postfixExpression', 'Arrow', 'Identifier'],
-            ['postfixExpression', 'PlusPlus'],
-            ['postfixExpression', 'MinusMinus'],
-            ['LeftParen', 'typeName', 'RightParen', 'LeftBrace', 'initializerList', 'RightBrace'],
-            ['LeftParen', 'typeName', 'RightParen', 'LeftBrace', 'initializerList', 'Comma', 'RightBrace']
-        ],
-        'argumentExpressionList': [
-            ['assignmentExpression'],
-            ['argumentExpressionList', 'Comma', 'assignmentExpression']
-        ],
-        'unaryExpression': [
-            ['postfixExpression'],
-            ['PlusPlus', 'unaryExpression'],
-            ['MinusMinus', 'unaryExpression'],
-            ['unaryOperator', 'castExpression'],
-            ['Sizeof', 'unaryExpression'],
-            ['Sizeof', 'LeftParen', 'typeName', 'RightParen'],
-            ['Alignof', 'LeftParen', 'typeName', 'RightParen']
-        ],
-        'unaryOperator': [
-            ['Ampersand'],
-            ['Asterisk'],
-            ['Plus'],
-            ['Minus'],
-            ['Tilde'],
-            ['Exclamation']
-        ],
-        'castExpression': [
-            ['unaryExpression'],
-            ['LeftParen', 'typeName', 'RightParen', 'castExpression']
-        ],
-        'multiplicativeExpression': [
-            ['castExpression'],
-            ['multiplicativeExpression', 'Asterisk', 'castExpression'],
-            ['multiplicativeExpression', 'Slash', 'castExpression'],
-            ['multiplicativeExpression', 'Percent', 'castExpression']
-        ],
-        'additiveExpression': [
-            ['multiplicativeExpression'],
-            ['additiveExpression', 'Plus', 'multiplicativeExpression'],
-            ['additiveExpression', 'Minus', 'multiplicativeExpression']
-        ],
-        'shiftExpression': [
-            ['additiveExpression'],
-            ['shiftExpression', 'LeftShift', 'additiveExpression'],
-            ['shiftExpression', 'RightShift', 'additiveExpression']
-        ],
-        'relationalExpression': [
-            ['shiftExpression'],
-            ['relationalExpression', 'LessThan', 'shiftExpression'],
-            ['relationalExpression', 'GreaterThan', 'shiftExpression'],
-            ['relationalExpression', 'LessThanOrEqual', 'shiftExpression'],
-            ['relationalExpression', 'GreaterThanOrEqual', 'shiftExpression']
-        ],
-        'equalityExpression': [
-            ['relationalExpression'],
-            ['equalityExpression', 'EqualEqual', 'relationalExpression'],
-            ['equalityExpression', 'NotEqual', 'relationalExpression']
-        ],
-        'andExpression': [
-            ['equalityExpression'],
-            ['andExpression', 'Ampersand', 'equalityExpression']
-        ],
-        'exclusiveOrExpression': [
-            ['andExpression'],
-            ['exclusiveOrExpression', 'Caret', 'andExpression']
-        ],
-        'inclusiveOrExpression': [
-            ['exclusiveOrExpression'],
-            ['inclusiveOrExpression', 'VerticalBar', 'exclusiveOrExpression']
-        ],
-        'logicalAndExpression': [
-            ['inclusiveOrExpression'],
-            ['logicalAndExpression', 'AndAnd', 'inclusiveOrExpression']
-        ],
-        'logicalOrExpression': [
-            ['logicalAndExpression'],
-            ['logicalOrExpression', 'OrOr', 'logicalAndExpression']
-        ],
-        'conditionalExpression': [
-            ['logicalOrExpression'],
-            ['logicalOrExpression', 'Question', 'expression', 'Colon', 'conditionalExpression']
-        ],
-        'assignmentExpression': [
-            ['conditionalExpression'],
-            ['unaryExpression', 'assignmentOperator', 'assignmentExpression']
-        ],
-        'assignmentOperator': [
-            ['Assign'],
-            ['StarAssign'],
-            ['SlashAssign'],
-            ['PercentAssign'],
-            ['PlusAssign'],
-            ['MinusAssign'],
-            ['LeftShiftAssign'],
-            ['RightShiftAssign'],
-            ['AndAssign'],
-            ['XorAssign'],
-            ['OrAssign']
-        ],
-        'expression': [
-            ['assignmentExpression'],
-            ['expression', 'Comma', 'assignmentExpression']
-        ],
-        'constantExpression': [
-            ['conditionalExpression']
-        ],
-        'declaration': [
-            ['declarationSpecifiers', 'initDeclaratorList', 'SemiColon'],
-            ['declarationSpecifiers', 'SemiColon'],
-            ['staticAssertDeclaration']
-        ],
-        'declarationSpecifiers': [
-            ['storageClassSpecifier'],
-            ['storageClassSpecifier', 'declarationSpecifiers'],
-            ['typeSpecifier'],
-            ['typeSpecifier', 'declarationSpecifiers'],
-            ['typeQualifier'],
-            ['typeQualifier', 'declarationSpecifiers'],
-            ['functionSpecifier'],
-            ['functionSpecifier', 'declarationSpecifiers'],
-            ['alignmentSpecifier'],
-            ['alignmentSpecifier', 'declarationSpecifiers']
-        ],
-        'initDeclaratorList': [
-            ['initDeclarator'],
-            ['initDeclaratorList', 'Comma', 'initDeclarator']
-        ],
-        'initDeclarator': [
-            ['declarator'],
-            ['declarator', 'Assign', 'initializer']
-        ],
-        'storageClassSpecifier': [
-            ['Typedef'],
-            ['Extern'],
-            ['Static'],
-            ['ThreadLocal'],
-            ['Auto'],
-            ['Register']
-        ],
-        'typeSpecifier': [
-            ['Void'],
-            ['Char'],
-            ['Short'],
-            ['Int'],
-            ['Long'],
-            ['Float'],
-            ['Double'],
-            ['Signed'],
-            ['Unsigned'],
-            ['Bool'],
-            ['Complex'],
-            ['atomicTypeSpecifier'],
-            ['structOrUnionSpecifier'],
-            ['enumSpecifier'],
-            ['typedefName']
-        ],
-        'structOrUnionSpecifier': [
-            ['structOrUnion', 'Identifier', 'LeftBrace', 'structDeclarationList', 'RightBrace'],
-            ['structOrUnion', 'LeftBrace', 'structDeclarationList', 'RightBrace'],
-            ['structOrUnion', 'Identifier']
-        ],
-        'structOrUnion': [
-            ['Struct'],
-            ['Union']
-        ],
-        'structDeclarationList': [
-            ['structDeclaration'],
-            ['structDeclarationList', 'structDeclaration']
-        ],
-        'structDeclaration': [
-            ['specifierQualifierList', 'structDeclaratorList', 'SemiColon'],
-            ['specifierQualifierList', 'SemiColon'],
-            ['staticAssertDeclaration']
-        ],
-        'specifierQualifierList': [
-            ['typeSpecifier'],
-            ['typeSpecifier', 'specifierQualifierList'],
-            ['typeQualifier'],
-            ['typeQualifier', 'specifierQualifierList']
-        ],
-        'structDeclaratorList': [
-            ['structDeclarator'],
-            ['structDeclaratorList', 'Comma', 'structDeclarator']
-        ],
-        'structDeclarator': [
-            ['declarator'],
-            ['declarator', 'Colon', 'constantExpression'],
-            ['Colon', 'constantExpression']
-        ],
-        'enumSpecifier': [
-            ['Enum', 'Identifier', 'LeftBrace', 'enumeratorList', 'RightBrace'],
-            ['Enum', 'Identifier', 'LeftBrace', 'enumeratorList', 'Comma', 'RightBrace'],
-            ['Enum', 'LeftBrace', 'enumeratorList', 'RightBrace'],
-            ['Enum', 'LeftBrace', 'enumeratorList', 'Comma', 'RightBrace'],
-            ['Enum', 'Identifier']
-        ],
-        'enumeratorList': [
-            ['enumerator'],
-            ['enumeratorList', 'Comma', 'enumerator']
-        ],
-        'enumerator': [
-            ['Identifier'],
-            ['Identifier', 'Assign', 'constantExpression'] # EnumerationConstant 改成 Identifier
-        ],
-        'atomicTypeSpecifier': [
-            ['Atomic', 'LeftParen', 'typeName', 'RightParen']
-        ],
-        'typeQualifier': [
-            ['Const'],
-            ['Restrict'],
-            ['Volatile'],
-            ['Atomic']
-        ],
-        'functionSpecifier': [
-            ['Inline'],
-            ['Noreturn']
-        ],
-        'alignmentSpecifier': [
-            ['Alignas', 'LeftParen', 'typeName', 'RightParen'],
-            ['Alignas', 'LeftParen', 'constantExpression', 'RightParen']
-        ],
-        'declarator': [
-            ['pointer', 'directDeclarator'],
-            ['directDeclarator']
-        ],
-        'directDeclarator': [
-            ['Identifier'],
-            ['LeftParen', 'declarator', 'RightParen'],
-            ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'assignmentExpression', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'Asterisk', 'RightBracket'],
-            ['directDeclarator', 'LeftBracket', 'Asterisk', 'RightBracket'],
-            ['directDeclarator', 'LeftParen', 'parameterTypeList', 'RightParen'],
-            ['directDeclarator', 'LeftParen', 'identifierList', 'RightParen'],
-            ['directDeclarator', 'LeftParen', 'RightParen']
-        ],
-        'pointer': [
-            ['Asterisk', 'typeQualifierList'],
-            ['Asterisk', 'typeQualifierList', 'pointer'],
-            ['Asterisk', 'pointer'],
-            ['Asterisk'],
-        ],
-        'typeQualifierList': [
-            ['typeQualifier'],
-            ['typeQualifierList', 'typeQualifier']
-        ],
-        'parameterTypeList': [
-            ['parameterList'],
-            ['parameterList', 'Comma', 'Ellipsis']
-        ],
-        'parameterList': [
-            ['parameterDeclaration'],
-            ['parameterList', 'Comma', 'parameterDeclaration']
-        ],
-        'parameterDeclaration': [
-            ['declarationSpecifiers', 'declarator'],
-            ['declarationSpecifiers', 'abstractDeclarator'],
-            ['declarationSpecifiers']
-        ],
-        'identifierList': [
-            ['Identifier'],
-            ['identifierList', 'Comma', 'Identifier']
-        ],
-        'typeName': [
-            ['specifierQualifierList', 'abstractDeclarator'],
-            ['specifierQualifierList']
-        ],
-        'abstractDeclarator': [
-            ['pointer'],
-            ['pointer', 'directAbstractDeclarator'],
-            ['directAbstractDeclarator']
-        ],
-        'directAbstractDeclarator': [
-            ['LeftParen', 'abstractDeclarator', 'RightParen'],
-            ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'RightBracket'],
-            ['directAbstractDeclarator', 'LeftBracket', 'assignmentExpression', 'RightBracket'],
-            ['LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['directAbstractDeclarator', 'LeftBracket', 'RightBracket'],
-            ['LeftBracket', 'typeQualifierList', 'RightBracket'],
-            ['LeftBracket', 'assignmentExpression', 'RightBracket'],
-            ['LeftBracket', 'RightBracket'],
-
-            ['directAbstractDeclarator', 'LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['directAbstractDeclarator', 'LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
-            ['LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
-            ['LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
-
-            ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
-            ['LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
-
-            ['directAbstractDeclarator', 'LeftBracket', 'Asterisk', 'RightBracket'],
-            ['LeftBracket', 'Asterisk', 'RightBracket'],
-
-            ['directAbstractDeclarator', 'LeftParen', 'parameterTypeList', 'RightParen'],
-            ['directAbstractDeclarator', 'LeftParen', 'RightParen'],
-            ['LeftParen', 'parameterTypeList', 'RightParen'],
-            ['LeftParen', 'RightParen'],
-        ],
-        'typedefName': [
-            ['Identifier']
-        ],
-        'initializer': [
-            ['assignmentExpression'],
-            ['LeftBrace', 'initializerList', 'RightBrace'],
-            ['LeftBrace', 'initializerList', 'Comma', 'RightBrace']
-        ],
-        'initializerList': [
-            ['designation', 'initializer'],
-            ['initializer'],
-            ['initializerList', 'Comma', 'designation', 'initializer'],
-            ['initializerList', 'Comma', 'initializer']
-        ],
-        'designation': [
-            ['designatorList', 'Assign']
-        ],
-        'designatorList': [
-            ['designator'],
-            ['designatorList', 'designator']
-        ],
-        'designator': [
-            ['LeftBracket', 'constantExpression', 'RightBracket'],
-            ['Dot', 'Identifier']
-        ],
-        'staticAssertDeclaration': [
-            ['StaticAssert', 'LeftParen', 'constantExpression', 'Comma', 'StringLiteral', 'RightParen', 'SemiColon']
-        ],
-        'statement': [
-            ['labeledStatement'],
-            ['compoundStatement'],
-            ['expressionStatement'],
-            ['selectionStatement'],
-            ['iterationStatement'],
-            ['jumpStatement']
-        ],
-        'labeledStatement': [
-            ['Identifier', 'Colon', 'statement'],
-            ['Case', 'constantExpression', 'Colon', 'statement'],
-            ['Default', 'Colon', 'statement']
-        ],
-        'compoundStatement': [
-            ['LeftBrace', 'blockItemList', 'RightBrace'],
-            ['LeftBrace', 'RightBrace']
-        ],
-        'blockItemList': [
-            ['blockItem'],
-            ['blockItemList', 'blockItem']
-        ],
-        'blockItem': [
-            ['declaration'],
-            ['statement']
-        ],
-        'expressionStatement': [
-            ['expression', 'SemiColon'],
-            ['SemiColon']
-        ],
-        'selectionStatement': [
-            ['If', 'LeftParen', 'expression', 'RightParen', 'statement'],
-            ['If', 'LeftParen', 'expression', 'RightParen', 'statement', 'Else', 'statement'],
-            ['Switch', 'LeftParen', 'expression', 'RightParen', 'statement']
-        ],
-        'iterationStatement': [
-            ['While', 'LeftParen', 'expression', 'RightParen', 'statement'],
-            ['Do', 'statement', 'While', 'LeftParen', 'expression', 'RightParen', 'SemiColon'],
-            ['For', 'LeftParen', 'expression', 'SemiColon', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'expression', 'SemiColon', 'expression', 'SemiColon', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'expression', 'SemiColon', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'SemiColon', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'expression', 'SemiColon', 'SemiColon', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'SemiColon', 'expression', 'SemiColon', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'SemiColon', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'SemiColon', 'SemiColon', 'RightParen', 'statement'],
-
-            ['For', 'LeftParen', 'declaration', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'declaration', 'expression', 'SemiColon', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'declaration', 'SemiColon', 'expression', 'RightParen', 'statement'],
-            ['For', 'LeftParen', 'declaration', 'SemiColon', 'RightParen', 'statement']
-        ],
-        'jumpStatement': [
-            ['Goto', 'Identifier', 'SemiColon'],
-            ['Continue', 'SemiColon'],
-            ['Break', 'SemiColon'],
-            ['Return', 'expression', 'SemiColon'],
-            ['Return', 'SemiColon']
-        ]
-    }
+    if backend in ('python', 'binary'):
+        # 终结符按词法分析器的 token 编号排列，生成的模块与表文件可直接接收 IdLexer / SpanLexer 的输出
+        from parser import TOKEN_NAMES
+        encoded = encode_tables(action_table, goto_table, grammar_rules, TOKEN_NAMES + ['EOF'])
+    if backend == 'python':
+        from codegen import write_parser_module
+        write_parser_module(encoded, os.path.join(output_dir, 'generated_parser.py'))
+        print("分析器模块已生成到 'generated_parser.py' 文件中。")
+    elif backend == 'binary':
+        from tablefile import TABLE_FILE, write_table_file
+        write_table_file(encoded, os.path.join(output_dir, TABLE_FILE))
+        print(f"按状态懒加载的表文件已生成到 '{TABLE_FILE}' 文件中。")
+    return action_table, goto_table
+
+# C11 文法（不含预处理部分）
+grammar_rules = {
+    'compilationUnit': [
+        ['translationUnit', 'EOF'],
+        ['EOF']
+    ],
+    'translationUnit': [
+        ['externalDeclaration'],
+        ['translationUnit', 'externalDeclaration']
+    ],
+    'externalDeclaration': [
+        ['functionDefinition'],
+        ['declaration']
+    ],
+    'functionDefinition': [
+        ['declarationSpecifiers', 'declarator', 'declarationList', 'compoundStatement'],
+        ['declarationSpecifiers', 'declarator', 'compoundStatement']
+    ],
+    'declarationList': [
+        ['declaration'],
+        ['declarationList', 'declaration']
+    ],
+    'primaryExpression': [
+        ['Identifier'],
+        ['Constant'],
+        ['StringLiteral'],
+        ['LeftParen', 'expression', 'RightParen'],
+        ['genericSelection']
+    ],
+    'genericSelection': [
+        ['Generic', 'LeftParen', 'assignmentExpression', 'Comma', 'genericAssocList', 'RightParen']
+    ],
+    'genericAssocList': [
+        ['genericAssociation'],
+        ['genericAssocList', 'Comma', 'genericAssociation']
+    ],
+    'genericAssociation': [
+        ['typeName', 'Colon', 'assignmentExpression'],
+        ['Default', 'Colon', 'assignmentExpression']
+    ],
+    'postfixExpression': [
+        ['primaryExpression'],
+        ['postfixExpression', 'LeftBracket', 'expression', 'RightBracket'],
+        ['postfixExpression', 'LeftParen', 'argumentExpressionList', 'RightParen'],
+        ['postfixExpression', 'LeftParen', 'RightParen'],
+        ['postfixExpression', 'Dot', 'Identifier'],
+        ['postfixExpression', 'Arrow', 'Identifier'],
+        ['postfixExpression', 'PlusPlus'],
+        ['postfixExpression', 'MinusMinus'],
+        ['LeftParen', 'typeName', 'RightParen', 'LeftBrace', 'initializerList', 'RightBrace'],
+        ['LeftParen', 'typeName', 'RightParen', 'LeftBrace', 'initializerList', 'Comma', 'RightBrace']
+    ],
+    'argumentExpressionList': [
+        ['assignmentExpression'],
+        ['argumentExpressionList', 'Comma', 'assignmentExpression']
+    ],
+    'unaryExpression': [
+        ['postfixExpression'],
+        ['PlusPlus', 'unaryExpression'],
+        ['MinusMinus', 'unaryExpression'],
+        ['unaryOperator', 'castExpression'],
+        ['Sizeof', 'unaryExpression'],
+        ['Sizeof', 'LeftParen', 'typeName', 'RightParen'],
+        ['Alignof', 'LeftParen', 'typeName', 'RightParen']
+    ],
+    'unaryOperator': [
+        ['Ampersand'],
+        ['Asterisk'],
+        ['Plus'],
+        ['Minus'],
+        ['Tilde'],
+        ['Exclamation']
+    ],
+    'castExpression': [
+        ['unaryExpression'],
+        ['LeftParen', 'typeName', 'RightParen', 'castExpression']
+    ],
+    'multiplicativeExpression': [
+        ['castExpression'],
+        ['multiplicativeExpression', 'Asterisk', 'castExpression'],
+        ['multiplicativeExpression', 'Slash', 'castExpression'],
+        ['multiplicativeExpression', 'Percent', 'castExpression']
+    ],
+    'additiveExpression': [
+        ['multiplicativeExpression'],
+        ['additiveExpression', 'Plus', 'multiplicativeExpression'],
+        ['additiveExpression', 'Minus', 'multiplicativeExpression']
+    ],
+    'shiftExpression': [
+        ['additiveExpression'],
+        ['shiftExpression', 'LeftShift', 'additiveExpression'],
+        ['shiftExpression', 'RightShift', 'additiveExpression']
+    ],
+    'relationalExpression': [
+        ['shiftExpression'],
+        ['relationalExpression', 'LessThan', 'shiftExpression'],
+        ['relationalExpression', 'GreaterThan', 'shiftExpression'],
+        ['relationalExpression', 'LessThanOrEqual', 'shiftExpression'],
+        ['relationalExpression', 'GreaterThanOrEqual', 'shiftExpression']
+    ],
+    'equalityExpression': [
+        ['relationalExpression'],
+        ['equalityExpression', 'EqualEqual', 'relationalExpression'],
+        ['equalityExpression', 'NotEqual', 'relationalExpression']
+    ],
+    'andExpression': [
+        ['equalityExpression'],
+        ['andExpression', 'Ampersand', 'equalityExpression']
+    ],
+    'exclusiveOrExpression': [
+        ['andExpression'],
+        ['exclusiveOrExpression', 'Caret', 'andExpression']
+    ],
+    'inclusiveOrExpression': [
+        ['exclusiveOrExpression'],
+        ['inclusiveOrExpression', 'VerticalBar', 'exclusiveOrExpression']
+    ],
+    'logicalAndExpression': [
+        ['inclusiveOrExpression'],
+        ['logicalAndExpression', 'AndAnd', 'inclusiveOrExpression']
+    ],
+    'logicalOrExpression': [
+        ['logicalAndExpression'],
+        ['logicalOrExpression', 'OrOr', 'logicalAndExpression']
+    ],
+    'conditionalExpression': [
+        ['logicalOrExpression'],
+        ['logicalOrExpression', 'Question', 'expression', 'Colon', 'conditionalExpression']
+    ],
+    'assignmentExpression': [
+        ['conditionalExpression'],
+        ['unaryExpression', 'assignmentOperator', 'assignmentExpression']
+    ],
+    'assignmentOperator': [
+        ['Assign'],
+        ['StarAssign'],
+        ['SlashAssign'],
+        ['PercentAssign'],
+        ['PlusAssign'],
+        ['MinusAssign'],
+        ['LeftShiftAssign'],
+        ['RightShiftAssign'],
+        ['AndAssign'],
+        ['XorAssign'],
+        ['OrAssign']
+    ],
+    'expression': [
+        ['assignmentExpression'],
+        ['expression', 'Comma', 'assignmentExpression']
+    ],
+    'constantExpression': [
+        ['conditionalExpression']
+    ],
+    'declaration': [
+        ['declarationSpecifiers', 'initDeclaratorList', 'SemiColon'],
+        ['declarationSpecifiers', 'SemiColon'],
+        ['staticAssertDeclaration']
+    ],
+    'declarationSpecifiers': [
+        ['storageClassSpecifier'],
+        ['storageClassSpecifier', 'declarationSpecifiers'],
+        ['typeSpecifier'],
+        ['typeSpecifier', 'declarationSpecifiers'],
+        ['typeQualifier'],
+        ['typeQualifier', 'declarationSpecifiers'],
+        ['functionSpecifier'],
+        ['functionSpecifier', 'declarationSpecifiers'],
+        ['alignmentSpecifier'],
+        ['alignmentSpecifier', 'declarationSpecifiers']
+    ],
+    'initDeclaratorList': [
+        ['initDeclarator'],
+        ['initDeclaratorList', 'Comma', 'initDeclarator']
+    ],
+    'initDeclarator': [
+        ['declarator'],
+        ['declarator', 'Assign', 'initializer']
+    ],
+    'storageClassSpecifier': [
+        ['Typedef'],
+        ['Extern'],
+        ['Static'],
+        ['ThreadLocal'],
+        ['Auto'],
+        ['Register']
+    ],
+    'typeSpecifier': [
+        ['Void'],
+        ['Char'],
+        ['Short'],
+        ['Int'],
+        ['Long'],
+        ['Float'],
+        ['Double'],
+        ['Signed'],
+        ['Unsigned'],
+        ['Bool'],
+        ['Complex'],
+        ['atomicTypeSpecifier'],
+        ['structOrUnionSpecifier'],
+        ['enumSpecifier'],
+        ['typedefName']
+    ],
+    'structOrUnionSpecifier': [
+        ['structOrUnion', 'Identifier', 'LeftBrace', 'structDeclarationList', 'RightBrace'],
+        ['structOrUnion', 'LeftBrace', 'structDeclarationList', 'RightBrace'],
+        ['structOrUnion', 'Identifier']
+    ],
+    'structOrUnion': [
+        ['Struct'],
+        ['Union']
+    ],
+    'structDeclarationList': [
+        ['structDeclaration'],
+        ['structDeclarationList', 'structDeclaration']
+    ],
+    'structDeclaration': [
+        ['specifierQualifierList', 'structDeclaratorList', 'SemiColon'],
+        ['specifierQualifierList', 'SemiColon'],
+        ['staticAssertDeclaration']
+    ],
+    'specifierQualifierList': [
+        ['typeSpecifier'],
+        ['typeSpecifier', 'specifierQualifierList'],
+        ['typeQualifier'],
+        ['typeQualifier', 'specifierQualifierList']
+    ],
+    'structDeclaratorList': [
+        ['structDeclarator'],
+        ['structDeclaratorList', 'Comma', 'structDeclarator']
+    ],
+    'structDeclarator': [
+        ['declarator'],
+        ['declarator', 'Colon', 'constantExpression'],
+        ['Colon', 'constantExpression']
+    ],
+    'enumSpecifier': [
+        ['Enum', 'Identifier', 'LeftBrace', 'enumeratorList', 'RightBrace'],
+        ['Enum', 'Identifier', 'LeftBrace', 'enumeratorList', 'Comma', 'RightBrace'],
+        ['Enum', 'LeftBrace', 'enumeratorList', 'RightBrace'],
+        ['Enum', 'LeftBrace', 'enumeratorList', 'Comma', 'RightBrace'],
+        ['Enum', 'Identifier']
+    ],
+    'enumeratorList': [
+        ['enumerator'],
+        ['enumeratorList', 'Comma', 'enumerator']
+    ],
+    'enumerator': [
+        ['Identifier'],
+        ['Identifier', 'Assign', 'constantExpression'] # EnumerationConstant 改成 Identifier
+    ],
+    'atomicTypeSpecifier': [
+        ['Atomic', 'LeftParen', 'typeName', 'RightParen']
+    ],
+    'typeQualifier': [
+        ['Const'],
+        ['Restrict'],
+        ['Volatile'],
+        ['Atomic']
+    ],
+    'functionSpecifier': [
+        ['Inline'],
+        ['Noreturn']
+    ],
+    'alignmentSpecifier': [
+        ['Alignas', 'LeftParen', 'typeName', 'RightParen'],
+        ['Alignas', 'LeftParen', 'constantExpression', 'RightParen']
+    ],
+    'declarator': [
+        ['pointer', 'directDeclarator'],
+        ['directDeclarator']
+    ],
+    'directDeclarator': [
+        ['Identifier'],
+        ['LeftParen', 'declarator', 'RightParen'],
+        ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'assignmentExpression', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'typeQualifierList', 'Asterisk', 'RightBracket'],
+        ['directDeclarator', 'LeftBracket', 'Asterisk', 'RightBracket'],
+        ['directDeclarator', 'LeftParen', 'parameterTypeList', 'RightParen'],
+        ['directDeclarator', 'LeftParen', 'identifierList', 'RightParen'],
+        ['directDeclarator', 'LeftParen', 'RightParen']
+    ],
+    'pointer': [
+        ['Asterisk', 'typeQualifierList'],
+        ['Asterisk', 'typeQualifierList', 'pointer'],
+        ['Asterisk', 'pointer'],
+        ['Asterisk'],
+    ],
+    'typeQualifierList': [
+        ['typeQualifier'],
+        ['typeQualifierList', 'typeQualifier']
+    ],
+    'parameterTypeList': [
+        ['parameterList'],
+        ['parameterList', 'Comma', 'Ellipsis']
+    ],
+    'parameterList': [
+        ['parameterDeclaration'],
+        ['parameterList', 'Comma', 'parameterDeclaration']
+    ],
+    'parameterDeclaration': [
+        ['declarationSpecifiers', 'declarator'],
+        ['declarationSpecifiers', 'abstractDeclarator'],
+        ['declarationSpecifiers']
+    ],
+    'identifierList': [
+        ['Identifier'],
+        ['identifierList', 'Comma', 'Identifier']
+    ],
+    'typeName': [
+        ['specifierQualifierList', 'abstractDeclarator'],
+        ['specifierQualifierList']
+    ],
+    'abstractDeclarator': [
+        ['pointer'],
+        ['pointer', 'directAbstractDeclarator'],
+        ['directAbstractDeclarator']
+    ],
+    'directAbstractDeclarator': [
+        ['LeftParen', 'abstractDeclarator', 'RightParen'],
+        ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'RightBracket'],
+        ['directAbstractDeclarator', 'LeftBracket', 'assignmentExpression', 'RightBracket'],
+        ['LeftBracket', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['directAbstractDeclarator', 'LeftBracket', 'RightBracket'],
+        ['LeftBracket', 'typeQualifierList', 'RightBracket'],
+        ['LeftBracket', 'assignmentExpression', 'RightBracket'],
+        ['LeftBracket', 'RightBracket'],
 
-    build_parsing_tables(grammar_rules)
\ No newline at end of file
+        ['directAbstractDeclarator', 'LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['directAbstractDeclarator', 'LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
+        ['LeftBracket', 'Static', 'typeQualifierList', 'assignmentExpression', 'RightBracket'],
+        ['LeftBracket', 'Static', 'assignmentExpression', 'RightBracket'],
+
+        ['directAbstractDeclarator', 'LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
+        ['LeftBracket', 'typeQualifierList', 'Static', 'assignmentExpression', 'RightBracket'],
+
+        ['directAbstractDeclarator', 'LeftBracket', 'Asterisk', 'RightBracket'],
+        ['LeftBracket', 'Asterisk', 'RightBracket'],
+
+        ['directAbstractDeclarator', 'LeftParen', 'parameterTypeList', 'RightParen'],
+        ['directAbstractDeclarator', 'LeftParen', 'RightParen'],
+        ['LeftParen', 'parameterTypeList', 'RightParen'],
+        ['LeftParen', 'RightParen'],
+    ],
+    'typedefName': [
+        ['Identifier']
+    ],
+    'initializer': [
+        ['assignmentExpression'],
+        ['LeftBrace', 'initializerList', 'RightBrace'],
+        ['LeftBrace', 'initializerList', 'Comma', 'RightBrace']
+    ],
+    'initializerList': [
+        ['designation', 'initializer'],
+        ['initializer'],
+        ['initializerList', 'Comma', 'designation', 'initializer'],
+        ['initializerList', 'Comma', 'initializer']
+    ],
+    'designation': [
+        ['designatorList', 'Assign']
+    ],
+    'designatorList': [
+        ['designator'],
+        ['designatorList', 'designator']
+    ],
+    'designator': [
+        ['LeftBracket', 'constantExpression', 'RightBracket'],
+        ['Dot', 'Identifier']
+    ],
+    'staticAssertDeclaration': [
+        ['StaticAssert', 'LeftParen', 'constantExpression', 'Comma', 'StringLiteral', 'RightParen', 'SemiColon']
+    ],
+    'statement': [
+        ['labeledStatement'],
+        ['compoundStatement'],
+        ['expressionStatement'],
+        ['selectionStatement'],
+        ['iterationStatement'],
+        ['jumpStatement']
+    ],
+    'labeledStatement': [
+        ['Identifier', 'Colon', 'statement'],
+        ['Case', 'constantExpression', 'Colon', 'statement'],
+        ['Default', 'Colon', 'statement']
+    ],
+    'compoundStatement': [
+        ['LeftBrace', 'blockItemList', 'RightBrace'],
+        ['LeftBrace', 'RightBrace']
+    ],
+    'blockItemList': [
+        ['blockItem'],
+        ['blockItemList', 'blockItem']
+    ],
+    'blockItem': [
+        ['declaration'],
+        ['statement']
+    ],
+    'expressionStatement': [
+        ['expression', 'SemiColon'],
+        ['SemiColon']
+    ],
+    'selectionStatement': [
+        ['If', 'LeftParen', 'expression', 'RightParen', 'statement'],
+        ['If', 'LeftParen', 'expression', 'RightParen', 'statement', 'Else', 'statement'],
+        ['Switch', 'LeftParen', 'expression', 'RightParen', 'statement']
+    ],
+    'iterationStatement': [
+        ['While', 'LeftParen', 'expression', 'RightParen', 'statement'],
+        ['Do', 'statement', 'While', 'LeftParen', 'expression', 'RightParen', 'SemiColon'],
+        ['For', 'LeftParen', 'expression', 'SemiColon', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'expression', 'SemiColon', 'expression', 'SemiColon', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'expression', 'SemiColon', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'SemiColon', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'expression', 'SemiColon', 'SemiColon', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'SemiColon', 'expression', 'SemiColon', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'SemiColon', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'SemiColon', 'SemiColon', 'RightParen', 'statement'],
+
+        ['For', 'LeftParen', 'declaration', 'expression', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'declaration', 'expression', 'SemiColon', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'declaration', 'SemiColon', 'expression', 'RightParen', 'statement'],
+        ['For', 'LeftParen', 'declaration', 'SemiColon', 'RightParen', 'statement']
+    ],
+    'jumpStatement': [
+        ['Goto', 'Identifier', 'SemiColon'],
+        ['Continue', 'SemiColon'],
+        ['Break', 'SemiColon'],
+        ['Return', 'expression', 'SemiColon'],
+        ['Return', 'SemiColon']
+    ]
+}
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="构建 LALR(1) 解析表")
+    arg_parser.add_argument('--backend', choices=['pickle', 'python', 'binary'], default='pickle',
+                            help="python：另外生成独立的分析器模块；binary：另外生成按状态懒加载的表文件")
+    arg_parser.add_argument('--output-dir', default='.')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help="进程数，默认使用全部 CPU")
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help="复用 output-dir 中的 automaton.pkl，只重新计算受文法改动影响的状态")
+    args = arg_parser.parse_args()
+    build_parsing_tables(grammar_rules, args.output_dir, args.backend, args.jobs, args.incremental)
@@ -0,0 +1,165 @@
+import argparse
+import importlib.util
+import sys
+
+from builder import EncodedTables
+
+HEADER = '''"""
+由 codegen.py 根据解析表生成的独立语法分析器，请勿手工修改
+每个状态编译为一个函数，归约按产生式展开；运行时不依赖 builder 与解析表文件
+"""
+import gc
+
+# 终结符名，下标即类型编号
+TERMINALS = {terminals!r}
+TERMINAL_IDS = {{name: token_id for token_id, name in enumerate(TERMINALS)}}
+EOF_ID = {eof_id}
+N_STATES = {n_states}
+
+def _unexpected(token_id, lexeme, index):
+    raise SyntaxError(f"Unexpected token {{(TERMINALS[token_id], lexeme)}} at position {{index}}")
+
+'''
+
+FOOTER = '''
+def parse_tokens(tokens):
+    """
+    分析提供 types 与 lexeme(i) 的 token 序列（如 parser.TokenIds / parser.TokenSpans）
+    """
+    return parse_ids(tokens.types, tokens.lexeme)
+
+def parse(tokens):
+    """
+    分析 (类型, 词素) 列表，列表须以 ('EOF', 'EOF') 结尾
+    """
+    types = [TERMINAL_IDS[token_type] for token_type, _ in tokens]
+    lexemes = [lexeme for _, lexeme in tokens]
+    return parse_ids(types, lexemes.__getitem__)
+'''
+
+def group_actions(row):
+    """
+    按动作把终结符分组，返回 [(动作, [终结符编号, ...]), ...]，大组在前
+    """
+    groups = {}
+    for token_id, action in sorted(row.items()):
+        groups.setdefault(action, []).append(token_id)
+    return sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+
+def condition(token_ids):
+    if len(token_ids) == 1:
+        return f"t == {token_ids[0]}"
+    # 常量集合字面量会被编译为 frozenset 常量
+    return f"t in {{{', '.join(map(str, token_ids))}}}"
+
+def emit_reduce(lines, tables: EncodedTables, production_id, indent):
+    """
+    生成按 production_id 号产生式归约的代码；长度为 1 的产生式直接替换栈顶
+    """
+    lhs_id, length = tables.productions[production_id]
+    lhs, rhs = tables.production_rules[production_id]
+    pad = ' ' * indent
+    lines.append(f"{pad}# {lhs} -> {' '.join(rhs) or 'ε'}")
+    goto = f"_G{lhs_id}"
+    if length == 0:
+        lines.append(f"{pad}values.append(({lhs!r}, []))")
+        lines.append(f"{pad}states.append({goto}[states[-1]])")
+    elif length == 1:
+        lines.append(f"{pad}values[-1] = ({lhs!r}, [values[-1]])")
+        lines.append(f"{pad}states[-1] = {goto}[states[-2]]")
+    else:
+        lines.append(f"{pad}children = values[-{length}:]")
+        lines.append(f"{pad}del values[-{length - 1}:]")
+        lines.append(f"{pad}values[-1] = ({lhs!r}, children)")
+        lines.append(f"{pad}del states[-{length - 1}:]")
+        lines.append(f"{pad}states[-1] = {goto}[states[-2]]")
+    lines.append(f"{pad}return False")
+
+def emit_state(lines, tables: EncodedTables, state_id):
+    row = tables.action_rows[state_id]
+    lines.append(f"    def s{state_id}():")
+    lines.append("        nonlocal index, t")
+    for action, token_ids in group_actions(row):
+        lines.append(f"        if {condition(token_ids)}:")
+        if action == EncodedTables.ACCEPT:
+            lines.append("            return True")
+        elif action >= 0:
+            lines.append(f"            states.append({action})")
+            lines.append("            values.append((TERMINALS[t], lexeme(index)))")
+            lines.append("            if index < last:")
+            lines.append("                index += 1")
+            lines.append("                t = types[index]")
+            lines.append("            return False")
+        else:
+            emit_reduce(lines, tables, ~action, 12)
+    lines.append("        _unexpected(t, lexeme(index), index)")
+
+def generate_parser_source(tables: EncodedTables):
+    """
+    根据整数编码的解析表生成独立分析器模块的源码
+    """
+    terminals = tables.symbols[:tables.n_terminals]
+    n_states = len(tables.action_rows)
+    lines = [HEADER.format(terminals=terminals, eof_id=terminals.index('EOF'), n_states=n_states)]
+
+    # 每个非终结符一张稠密 GOTO 数组，下标为归约后露出的状态
+    lines.append("# GOTO：_G<非终结符编号>[露出的状态] -> 目标状态")
+    for symbol_id in range(tables.n_terminals, len(tables.symbols)):
+        targets = [tables.goto_rows[state_id].get(symbol_id) for state_id in range(n_states)]
+        if any(target is not None for target in targets):
+            lines.append(f"_G{symbol_id} = {tuple(targets)!r}  # {tables.symbols[symbol_id]}")
+    lines.append("")
+    lines.append("def parse_ids(types, lexeme):")
+    lines.append('    """')
+    lines.append("    types 为以 EOF_ID 结尾的类型编号序列，lexeme(i) 返回第 i 个 token 的词素")
+    lines.append('    """')
+    lines.append("    states = [0]")
+    lines.append("    values = []")
+    lines.append("    index = 0")
+    lines.append("    last = len(types) - 1")
+    lines.append("    t = types[0]")
+    lines.append("")
+    for state_id in range(n_states):
+        emit_state(lines, tables, state_id)
+        lines.append("")
+    lines.append(f"    dispatch = ({', '.join(f's{state_id}' for state_id in range(n_states))},)")
+    lines.append("    # 语法树无环，分析期间暂停循环垃圾回收")
+    lines.append("    enabled = gc.isenabled()")
+    lines.append("    gc.disable()")
+    lines.append("    try:")
+    lines.append("        while not dispatch[states[-1]]():")
+    lines.append("            pass")
+    lines.append("    finally:")
+    lines.append("        if enabled:")
+    lines.append("            gc.enable()")
+    lines.append("    return values[-1]")
+    lines.append(FOOTER)
+    return '\n'.join(lines)
+
+def write_parser_module(tables: EncodedTables, output_path):
+    with open(output_path, 'w', encoding='utf-8') as file:
+        file.write(generate_parser_source(tables))
+
+def load_parser_module(path, name='generated_parser'):
+    """
+    从文件路径导入生成的分析器模块
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main(argv=None):
+    from parser import load_encoded_tables
+
+    arg_parser = argparse.ArgumentParser(description="把解析表编译为独立的 Python 分析器模块")
+    arg_parser.add_argument('-o', '--output', default='generated_parser.py')
+    arg_parser.add_argument('--table-dir', default='.')
+    args = arg_parser.parse_args(argv)
+    # 终结符编号与词法分析器一致，生成的 parse_ids 可直接接收 IdLexer / SpanLexer 的输出
+    write_parser_module(load_encoded_tables(args.table_dir), args.output)
+    print(f"分析器模块已生成：{args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
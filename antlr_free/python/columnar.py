@@ -0,0 +1,209 @@
+"""
+token 流与语法树的列式二进制格式
+
+文件由本机字节序的 int32 组成：
+- 文件头：MAGIC, VERSION, 名字数, 名字表字节数, token 数, 词素字节数, 结点数
+- 名字表：token 类型名与语法树结点名共用，UTF-8，以换行分隔，补齐到 4 字节
+- token 类型：token 数个名字编号
+- 词素偏移：token 数 + 1 个字节偏移，第 i 个词素位于词素区 [偏移 i, 偏移 i+1)
+- 词素区：所有词素依次拼接的 UTF-8，补齐到 4 字节
+- 结点名：按先序排列的结点名字编号
+- 子结点数：按先序排列，叶子（token）为 LEAF；先序中第 k 个叶子对应第 k 个 token
+"""
+import argparse
+import mmap
+import sys
+from array import array
+from itertools import accumulate
+
+from parser import gc_paused
+
+MAGIC = 0x41434353  # b'SCCA'
+VERSION = 1
+HEADER_SIZE = 7
+LEAF = -1
+
+def padded(data):
+    return data + b'\0' * (-len(data) % 4)
+
+def columnar_bytes(tokens, ast):
+    """
+    把 token 流（(类型, 词素) 序列，如 token 列表、TokenIds、TokenSpans）与 (lhs, children) 语法树编码为字节串
+    """
+    names = {}
+    token_types = array('i')
+    lexemes = []
+    for token_type, lexeme in tokens:
+        token_types.append(names.setdefault(token_type, len(names)))
+        lexemes.append(lexeme)
+
+    text = ''.join(lexemes)
+    lexeme_data = text.encode('utf-8')
+    # 全为 ASCII 时字符偏移即字节偏移，不必逐个编码
+    lengths = map(len, lexemes) if len(lexeme_data) == len(text) else (len(lexeme.encode('utf-8')) for lexeme in lexemes)
+    lexeme_offsets = array('i', [0])
+    lexeme_offsets.extend(accumulate(lengths))
+
+    node_symbols = array('i')
+    node_children = array('i')
+    stack = [ast]
+    while stack:
+        label, value = stack.pop()
+        node_symbols.append(names.setdefault(label, len(names)))
+        if isinstance(value, list):
+            node_children.append(len(value))
+            stack.extend(reversed(value))
+        else:
+            node_children.append(LEAF)
+
+    name_data = padded('\n'.join(names).encode('utf-8'))
+    header = array('i', [MAGIC, VERSION, len(names), len(name_data), len(token_types), len(lexeme_data),
+                         len(node_symbols)])
+    return b''.join((header.tobytes(), name_data, token_types.tobytes(), lexeme_offsets.tobytes(),
+                     padded(lexeme_data), node_symbols.tobytes(), node_children.tobytes()))
+
+def write_columnar(path, tokens, ast):
+    with open(path, 'wb') as file:
+        file.write(columnar_bytes(tokens, ast))
+
+class ColumnarFile:
+    """
+    列式文件的读取器：除名字表外不预先解码任何内容
+    token_types / lexeme_offsets / node_symbols / node_children 是直接指向 buffer 的 memoryview
+    """
+    def __init__(self, buffer):
+        ints = memoryview(buffer).cast('i')
+        magic, version, n_names, name_size, self.n_tokens, lexeme_size, self.n_nodes = ints[:HEADER_SIZE].tolist()
+        if magic != MAGIC:
+            raise ValueError("不是列式语法树文件，或文件的字节序与本机不同")
+        if version != VERSION:
+            raise ValueError(f"列式文件版本 {version} 与当前版本 {VERSION} 不符")
+        position = HEADER_SIZE
+        self.names = bytes(ints[position:position + name_size // 4]).rstrip(b'\0').decode('utf-8').split('\n')
+        position += name_size // 4
+        self.token_types = ints[position:position + self.n_tokens]
+        position += self.n_tokens
+        self.lexeme_offsets = ints[position:position + self.n_tokens + 1]
+        position += self.n_tokens + 1
+        self.lexeme_data = memoryview(buffer)[position * 4:position * 4 + lexeme_size]
+        position += (lexeme_size + 3) // 4
+        self.node_symbols = ints[position:position + self.n_nodes]
+        position += self.n_nodes
+        self.node_children = ints[position:position + self.n_nodes]
+        self.buffer = buffer
+        self.ints = ints
+        self._subtree_sizes = None
+
+    @classmethod
+    def open(cls, path):
+        """
+        以只读 mmap 映射文件
+        """
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def lexeme(self, index):
+        offsets = self.lexeme_offsets
+        return str(self.lexeme_data[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def token(self, index):
+        return (self.names[self.token_types[index]], self.lexeme(index))
+
+    def tokens(self):
+        """
+        依次解码全部 token，返回 (类型, 词素) 列表
+        """
+        names = self.names
+        offsets = self.lexeme_offsets.tolist()
+        data = bytes(self.lexeme_data)
+        text = data.decode('utf-8')
+        if len(text) != len(data):
+            return [self.token(index) for index in range(self.n_tokens)]
+        return [(names[token_type], text[start:end])
+                for token_type, start, end in zip(self.token_types.tolist(), offsets, offsets[1:])]
+
+    def tree(self):
+        """
+        重建 (lhs, children) 形式的语法树，与分析器输出的结构相同
+        """
+        names = self.names
+        tokens = self.tokens()
+        leaf_index = sum(1 for count in self.node_children.tolist() if count == LEAF)
+        stack = []
+        # 逆先序处理：子结点先于父结点出栈，栈顶依次是第一个、第二个……子结点
+        with gc_paused():
+            for symbol, count in zip(reversed(self.node_symbols.tolist()), reversed(self.node_children.tolist())):
+                if count == LEAF:
+                    leaf_index -= 1
+                    stack.append(tokens[leaf_index])
+                else:
+                    children = stack[len(stack) - count:][::-1] if count else []
+                    del stack[len(stack) - count:]
+                    stack.append((names[symbol], children))
+        return stack[-1]
+
+    def subtree_sizes(self):
+        """
+        每个结点（先序编号）为根的子树结点数，首次调用时计算
+        """
+        if self._subtree_sizes is None:
+            counts = self.node_children.tolist()
+            sizes = [1] * len(counts)
+            stack = []
+            for node in range(len(counts) - 1, -1, -1):
+                count = counts[node]
+                if count > 0:
+                    sizes[node] += sum(stack[-count:])
+                    del stack[-count:]
+                stack.append(sizes[node])
+            self._subtree_sizes = sizes
+        return self._subtree_sizes
+
+    def children(self, node):
+        """
+        结点 node 的子结点先序编号列表
+        """
+        count = self.node_children[node]
+        sizes = self.subtree_sizes()
+        result = []
+        child = node + 1
+        for _ in range(max(count, 0)):
+            result.append(child)
+            child += sizes[child]
+        return result
+
+    def close(self):
+        for view in (self.token_types, self.lexeme_offsets, self.lexeme_data, self.node_symbols,
+                     self.node_children, self.ints):
+            view.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="查看列式语法树文件")
+    arg_parser.add_argument('file')
+    arg_parser.add_argument('--tokens', action='store_true', help="按 tokens.txt 的格式输出 token 流")
+    arg_parser.add_argument('--yaml', action='store_true', help="按 ast.yaml 的格式输出语法树")
+    args = arg_parser.parse_args(argv)
+    with ColumnarFile.open(args.file) as columnar:
+        if args.tokens:
+            sys.stdout.writelines(f"{token}\n" for token in columnar.tokens())
+        elif args.yaml:
+            from parser import dump_ast_yaml
+            try:
+                dump_ast_yaml(columnar.tree(), sys.stdout)
+            except ValueError as e:
+                print(f"{args.file}: {e}")
+                return 1
+        else:
+            print(f"{columnar.n_tokens} 个 token，{columnar.n_nodes} 个结点，{len(columnar.names)} 个名字")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
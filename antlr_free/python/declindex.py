@@ -0,0 +1,382 @@
+"""
+持久化的声明索引
+
+分析时用 lr1_parse_tracked 只在声明相关的归约上回调 DeclarationCollector，收集各文件中的声明名、种类、作用域与位置，
+写入 SQLite。每个文件记下分析前的修改时间与大小，再次更新时只重新分析有变化的文件；查询按 (name, kind) 上的索引进行，
+无需重新分析。
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from parser import load_encoded_tables, lex_file_mmap, lr1_parse_tracked
+
+DEFAULT_DATABASE = 'declarations.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS declarations (
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    line INTEGER NOT NULL,
+    column INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS declarations_by_name ON declarations(name, kind);
+CREATE INDEX IF NOT EXISTS declarations_by_file ON declarations(file_id);
+'''
+
+# 声明种类
+KINDS = ('function', 'prototype', 'variable', 'typedef', 'struct', 'union', 'enum', 'enumerator', 'typedef_use')
+
+def is_leaf(node):
+    return not isinstance(node[1], list)
+
+class DeclarationCollector:
+    """
+    在归约 functionDefinition、declaration、typedefName 等结点时收集声明，作为 lr1_parse_tracked 的回调
+    declarations 为 [(名称, 种类, 作用域, token 下标), ...]
+    """
+    WATCHED = ('functionDefinition', 'declaration', 'typedefName', 'directDeclarator',
+               'structOrUnionSpecifier', 'enumSpecifier', 'enumerator')
+
+    def __init__(self):
+        self.declarations = []
+        # directDeclarator -> Identifier 结点到其 token 下标，供外层声明定位名称
+        self.identifier_starts = {}
+
+    def watched_ids(self, tables):
+        return {tables.symbol_ids[name] for name in self.WATCHED}
+
+    def on_reduce(self, lhs, node, start):
+        children = node[1]
+        if lhs == 'directDeclarator':
+            if len(children) == 1:
+                self.identifier_starts[id(node)] = start
+        elif lhs == 'declaration':
+            self.add_declaration(children)
+        elif lhs == 'functionDefinition':
+            # 函数体内已收集的声明改为局部作用域
+            for i in range(len(self.declarations) - 1, -1, -1):
+                name, kind, scope, index = self.declarations[i]
+                if index < start:
+                    break
+                if scope == 'file':
+                    self.declarations[i] = (name, kind, 'local', index)
+            name_node, is_function = self.declarator_name(children[1])
+            if name_node is not None:
+                self.add(name_node, 'function' if is_function else 'variable')
+            # 形参等未被外层声明取走的名称到此不再需要
+            self.identifier_starts.clear()
+        elif lhs == 'typedefName':
+            self.declarations.append((children[0][1], 'typedef_use', 'file', start))
+        elif lhs in ('structOrUnionSpecifier', 'enumSpecifier'):
+            # 只记录带定义体的具名 struct / union / enum
+            if len(children) >= 4 and is_leaf(children[1]) and children[1][0] == 'Identifier':
+                kind = children[0][1][0][1] if lhs == 'structOrUnionSpecifier' else 'enum'
+                self.declarations.append((children[1][1], kind, 'file', start + 1))
+        elif lhs == 'enumerator':
+            self.declarations.append((children[0][1], 'enumerator', 'file', start))
+
+    def add(self, name_node, kind):
+        self.declarations.append((name_node[1][0][1], kind, 'file', self.identifier_starts.pop(id(name_node))))
+
+    def add_declaration(self, children):
+        if len(children) < 3:
+            return
+        specifiers, init_declarators = children[0], children[1]
+        is_typedef = self.has_typedef(specifiers)
+        stack = [init_declarators]
+        found = []
+        while stack:
+            node = stack.pop()
+            if node[0] == 'initDeclaratorList':
+                stack.extend(child for child in node[1] if not is_leaf(child))
+            else:
+                found.append(node[1][0])
+        for declarator in reversed(found):
+            name_node, is_function = self.declarator_name(declarator)
+            if name_node is None:
+                continue
+            if is_typedef:
+                kind = 'typedef'
+            else:
+                kind = 'prototype' if is_function else 'variable'
+            self.add(name_node, kind)
+
+    @staticmethod
+    def has_typedef(specifiers):
+        while True:
+            first = specifiers[1][0]
+            if first[0] == 'storageClassSpecifier' and first[1][0][0] == 'Typedef':
+                return True
+            if len(specifiers[1]) < 2:
+                return False
+            specifiers = specifiers[1][1]
+
+    @staticmethod
+    def declarator_name(declarator):
+        """
+        返回 (directDeclarator -> Identifier 结点, 该名称是否直接声明为函数)
+        由外向内依次经过指针、数组/函数后缀与括号，离名称最近的一层决定它是不是函数：
+        int *f(int) 是函数，int (*f)(int) 是函数指针变量
+        """
+        is_function = False
+        node = declarator
+        while True:
+            if node[0] == 'declarator':
+                if len(node[1]) == 2:
+                    is_function = False
+                node = node[1][-1]
+                continue
+            children = node[1]
+            if len(children) == 1:
+                return node, is_function
+            if is_leaf(children[0]):
+                # ( declarator )
+                node = children[1]
+                continue
+            is_function = children[1][0] == 'LeftParen'
+            node = children[0]
+
+def line_starts(buffer):
+    starts = [0]
+    position = buffer.find(b'\n')
+    while position != -1:
+        starts.append(position + 1)
+        position = buffer.find(b'\n', position + 1)
+    return starts
+
+def collect_declarations(path, tables):
+    """
+    分析一个文件并返回 [(名称, 种类, 作用域, 行, 列), ...]，行列均从 1 开始
+    """
+    tokens = lex_file_mmap(path)
+    try:
+        collector = DeclarationCollector()
+        lr1_parse_tracked(tokens, tables, collector.watched_ids(tables), collector.on_reduce)
+        starts = line_starts(tokens.buffer)
+        result = []
+        for name, kind, scope, index in collector.declarations:
+            offset = tokens.starts[index]
+            line = bisect_right(starts, offset)
+            result.append((name, kind, scope, line, offset - starts[line - 1] + 1))
+        return result
+    finally:
+        tokens.close()
+
+# 工作进程内常驻的解析表，由 init_worker 加载
+_worker_tables = None
+
+def init_worker(table_dir):
+    global _worker_tables
+    _worker_tables = load_encoded_tables(table_dir)
+
+def collect_job(path):
+    """
+    工作进程中分析一个文件，返回 (path, (修改时间, 大小), 声明列表, 错误信息)
+    先取 stat 再读取：分析期间文件被改动时记下的是改动前的 stat，下次更新仍会重新分析
+    文件已不存在时 stat 为 None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        return path, None, [], f"{type(e).__name__}: {e}"
+    signature = (stat.st_mtime_ns, stat.st_size)
+    try:
+        return path, signature, collect_declarations(path, _worker_tables), None
+    except (RuntimeError, SyntaxError, OSError, ValueError) as e:
+        return path, signature, [], f"{type(e).__name__}: {e}"
+
+def collect_isolated(path, table_dir):
+    """
+    在单独的工作进程中分析一个文件；该进程也异常退出时，记为这个文件的错误
+    """
+    with ProcessPoolExecutor(1, initializer=init_worker, initargs=(table_dir,)) as executor:
+        try:
+            return executor.submit(collect_job, path).result()
+        except BrokenProcessPool as e:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return path, None, [], f"{type(e).__name__}: {e}"
+            return path, (stat.st_mtime_ns, stat.st_size), [], f"{type(e).__name__}: {e}"
+
+class DeclarationIndex:
+    """
+    SQLite 声明索引：按文件增量更新，(name, kind) 上建有索引，查询无需重新分析
+    """
+    def __init__(self, database=DEFAULT_DATABASE):
+        self.connection = sqlite3.connect(database)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def stale_paths(self, paths):
+        """
+        返回未索引或自上次索引后大小、修改时间发生变化的文件
+        """
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 self.connection.execute('SELECT path, mtime_ns, size FROM files')}
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # 交给工作进程报告错误
+                stale.append(path)
+                continue
+            if known.get(path) != (stat.st_mtime_ns, stat.st_size):
+                stale.append(path)
+        return stale
+
+    def update_file(self, path, signature, declarations, error=None):
+        """
+        替换一个文件的全部声明；signature 为读取前的 (修改时间, 大小)，调用方负责提交事务
+        """
+        mtime_ns, size = signature
+        cursor = self.connection.execute('SELECT id FROM files WHERE path = ?', (path,))
+        row = cursor.fetchone()
+        if row is None:
+            file_id = self.connection.execute('INSERT INTO files (path, mtime_ns, size, error) VALUES (?, ?, ?, ?)',
+                                              (path, mtime_ns, size, error)).lastrowid
+        else:
+            file_id = row[0]
+            self.connection.execute('UPDATE files SET mtime_ns = ?, size = ?, error = ? WHERE id = ?',
+                                    (mtime_ns, size, error, file_id))
+            self.connection.execute('DELETE FROM declarations WHERE file_id = ?', (file_id,))
+        self.connection.executemany(
+            'INSERT INTO declarations (name, kind, scope, file_id, line, column) VALUES (?, ?, ?, ?, ?, ?)',
+            [(name, kind, scope, file_id, line, column) for name, kind, scope, line, column in declarations])
+
+    def remove_missing(self, paths):
+        """
+        删除已不在 paths 中的文件及其声明，返回删除的文件数
+        """
+        present = set(paths)
+        missing = [(path,) for (path,) in self.connection.execute('SELECT path FROM files') if path not in present]
+        self.connection.executemany('DELETE FROM files WHERE path = ?', missing)
+        return len(missing)
+
+    def lookup(self, name, kind=None, scope='file'):
+        """
+        返回 [(路径, 行, 列, 种类, 作用域), ...]；kind 为 None 时不限种类，scope 为 None 时包括局部声明
+        """
+        query = ('SELECT files.path, line, column, kind, scope FROM declarations '
+                 'JOIN files ON files.id = declarations.file_id WHERE name = ?')
+        params = [name]
+        if kind is not None:
+            query += ' AND kind = ?'
+            params.append(kind)
+        if scope is not None:
+            query += ' AND scope = ?'
+            params.append(scope)
+        return self.connection.execute(query + ' ORDER BY files.path, line', params).fetchall()
+
+    def stats(self):
+        files, errors = self.connection.execute('SELECT COUNT(*), COUNT(error) FROM files').fetchone()
+        by_kind = dict(self.connection.execute('SELECT kind, COUNT(*) FROM declarations GROUP BY kind'))
+        return {'files': files, 'errors': errors, 'declarations': by_kind}
+
+def collect_sources(locations):
+    """
+    展开命令行给出的目录与文件，目录递归收集 .c 与 .h 文件
+    """
+    paths = []
+    for location in locations:
+        if os.path.isdir(location):
+            for root, _, files in os.walk(location):
+                paths.extend(os.path.join(root, file_name) for file_name in sorted(files)
+                             if file_name.endswith(('.c', '.h')))
+        else:
+            paths.append(location)
+    return [os.path.abspath(path) for path in paths]
+
+def update_index(index: DeclarationIndex, paths, table_dir='.', jobs=None, prune=False, batch_size=256):
+    """
+    只重新分析有变化的文件，每 batch_size 个文件提交一次；返回 (分析的文件数, 出错的文件数, 删除的文件数)
+    """
+    stale = index.stale_paths(paths)
+    removed = index.remove_missing(paths) if prune else 0
+    errors = 0
+    done = 0
+
+    def record(path, signature, declarations, error):
+        nonlocal errors, done
+        errors += error is not None
+        # 已被删除的文件没有可记录的内容，由 --prune 清理
+        if signature is not None:
+            index.update_file(path, signature, declarations, error)
+        done += 1
+        if done % batch_size == 0:
+            index.connection.commit()
+
+    while done < len(stale):
+        with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(table_dir,)) as executor:
+            try:
+                for result in executor.map(collect_job, stale[done:], chunksize=16):
+                    record(*result)
+            except BrokenProcessPool:
+                # 工作进程异常退出，无从得知是哪个文件导致的：第一个未完成的文件单独重新分析，其余的换新进程池继续
+                record(*collect_isolated(stale[done], table_dir))
+    index.connection.commit()
+    return len(stale), errors, removed
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="持久化的声明索引：分析时收集声明，查询无需重新分析")
+    arg_parser.add_argument('--db', default=DEFAULT_DATABASE, help="索引文件")
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+    update_parser = sub_parsers.add_parser('update', help="增量更新索引")
+    update_parser.add_argument('sources', nargs='+', help="目录或文件")
+    update_parser.add_argument('-j', '--jobs', type=int, default=None)
+    update_parser.add_argument('--prune', action='store_true', help="删除已不存在的文件的记录")
+    update_parser.add_argument('--table-dir', default='.')
+    lookup_parser = sub_parsers.add_parser('lookup', help="查询名称")
+    lookup_parser.add_argument('name')
+    lookup_parser.add_argument('--kind', choices=KINDS)
+    lookup_parser.add_argument('--local', action='store_true', help="包括函数内的局部声明")
+    sub_parsers.add_parser('stats', help="索引统计")
+    args = arg_parser.parse_args(argv)
+
+    index = DeclarationIndex(args.db)
+    try:
+        if args.command == 'update':
+            start = time.perf_counter()
+            paths = collect_sources(args.sources)
+            parsed, errors, removed = update_index(index, paths, args.table_dir, args.jobs, args.prune)
+            print(f"{len(paths)} 个文件，重新分析 {parsed} 个（出错 {errors} 个），删除 {removed} 个，"
+                  f"用时 {time.perf_counter() - start:.2f} s")
+        elif args.command == 'lookup':
+            start = time.perf_counter()
+            rows = index.lookup(args.name, args.kind, None if args.local else 'file')
+            elapsed = time.perf_counter() - start
+            for path, line, column, kind, scope in rows:
+                print(f"{path}:{line}:{column}: {kind}" + (" (local)" if scope == 'local' else ""))
+            print(f"{len(rows)} 条结果，查询用时 {elapsed * 1000:.3f} ms")
+        else:
+            stats = index.stats()
+            print(f"{stats['files']} 个文件（出错 {stats['errors']} 个）")
+            for kind, count in sorted(stats['declarations'].items()):
+                print(f"  {kind}: {count}")
+    finally:
+        index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""
+线性时间的 DFA 词法分析器
+
+TOKEN_TYPES 中的正则经 re 自带的解析器解析后编译为带优先级的 NFA，再做有序子集构造得到 DFA：
+DFA 状态是按优先级排列的 NFA 线程序列，某个线程到达接受结点时丢弃优先级更低的线程，
+因此每个 token 的长度与种类与 re 的最左优先（从左到右尝试分支）语义完全一致，\\b 由前后字符是否为单词字符决定。
+
+逐 token 的最长匹配本身在最坏情况下是平方的（如反复出现的未闭合 /*），
+DfaLexer 记录已证明不会再遇到接受的 (DFA 状态, 位置)，再次到达时立即停止（Reps 的线性时间最长匹配），
+总步数不超过 (状态数 + 2) * (字符数 + 1)。work_budget 进一步限制每个文件的总步数。
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from array import array
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from parser import EOF_ID, INVALID_ID, SKIPPED_TOKEN_IDS, TOKEN_TYPES, IdLexer, TokenIds
+
+# 每个字符允许的平均步数；正常源码约为 1 ~ 2，反复出现的未闭合注释约为 7
+DEFAULT_WORK_FACTOR = 16
+DEAD = -1
+
+def is_word(char):
+    """
+    与 re 对 str 模式的 \\w 一致
+    """
+    return char == '_' or char.isalnum()
+
+class CharSet:
+    """
+    NFA 中的字符集：negated 为真时表示 chars 之外的所有字符
+    模式中只出现 ASCII 字符，非 ASCII 字符是否属于字符集只由 negated 决定
+    """
+    def __init__(self, chars, negated=False):
+        self.chars = frozenset(chars)
+        self.negated = negated
+
+    def __contains__(self, char):
+        return (char in self.chars) != self.negated
+
+class TokenNfa:
+    """
+    带优先级的 NFA，结点为：
+    ('char', CharSet, 下一结点)、('split', [按优先级排列的后继])、('boundary', 下一结点)、('match', token 编号)
+    """
+    def __init__(self, token_types):
+        self.nodes = []
+        branches = []
+        for token_id, (_, pattern) in enumerate(token_types):
+            match = self.add(('match', token_id))
+            branches.append(self.compile_sequence(sre_parse.parse(pattern, re.VERBOSE), match))
+        self.start = self.add(('split', branches))
+
+    def add(self, node):
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def compile_sequence(self, items, next_node):
+        for op, av in reversed(list(items)):
+            next_node = self.compile_item(str(op), av, next_node)
+        return next_node
+
+    def compile_item(self, op, av, next_node):
+        if op == 'LITERAL':
+            return self.add(('char', CharSet({chr(av)}), next_node))
+        if op == 'NOT_LITERAL':
+            return self.add(('char', CharSet({chr(av)}, negated=True), next_node))
+        if op == 'ANY':
+            return self.add(('char', CharSet({'\n'}, negated=True), next_node))
+        if op == 'IN':
+            chars = set()
+            negated = False
+            for item_op, item_av in av:
+                item_op = str(item_op)
+                if item_op == 'NEGATE':
+                    negated = True
+                elif item_op == 'LITERAL':
+                    chars.add(chr(item_av))
+                elif item_op == 'RANGE':
+                    chars.update(map(chr, range(item_av[0], item_av[1] + 1)))
+                else:
+                    raise ValueError(f"Unsupported character set item {item_op}")
+            return self.add(('char', CharSet(chars, negated), next_node))
+        if op == 'BRANCH':
+            return self.add(('split', [self.compile_sequence(branch, next_node) for branch in av[1]]))
+        if op == 'SUBPATTERN':
+            return self.compile_sequence(av[-1], next_node)
+        if op == 'MAX_REPEAT':
+            low, high, body = av
+            if high == sre_parse.MAXREPEAT:
+                loop = self.add(None)
+                self.nodes[loop] = ('split', [self.compile_sequence(body, loop), next_node])
+                tail = loop
+            else:
+                # x{0,2} 展开为 (x(x)?)?
+                tail = next_node
+                for _ in range(high - low):
+                    tail = self.add(('split', [self.compile_sequence(body, tail), next_node]))
+            for _ in range(low):
+                tail = self.compile_sequence(body, tail)
+            return tail
+        if op == 'AT' and str(av) == 'AT_BOUNDARY':
+            return self.add(('boundary', next_node))
+        raise ValueError(f"Unsupported regular expression construct {op} {av}")
+
+    def char_sets(self):
+        return [node[1] for node in self.nodes if node[0] == 'char']
+
+    def closure(self, threads, prev_word, next_word):
+        """
+        按优先级展开空转移，返回 (停在 char 结点上的线程, 匹配到的 token 编号或 DEAD)
+        遇到接受结点时，优先级更低的线程全部丢弃
+        """
+        result = []
+        seen = set()
+        stack = list(reversed(threads))
+        while stack:
+            node_id = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            node = self.nodes[node_id]
+            kind = node[0]
+            if kind == 'char':
+                result.append(node_id)
+            elif kind == 'split':
+                stack.extend(reversed(node[1]))
+            elif kind == 'boundary':
+                if prev_word != next_word:
+                    stack.append(node[1])
+            else:
+                return result, node[1]
+        return result, DEAD
+
+class TokenDfa:
+    """
+    由 TokenNfa 构造的 DFA，字符先映射为等价类：
+    transitions[状态][类] 为下一状态或 DEAD；accepts[状态][类] 为读入该类字符之前已确定的匹配（DEAD 表示没有）；
+    eof_accepts[状态] 为输入结束时的匹配；starts[前一字符是否为单词字符] 为初始状态
+    """
+    def __init__(self, token_types=TOKEN_TYPES):
+        nfa = TokenNfa(token_types)
+        char_sets = nfa.char_sets()
+
+        # 按 (是否为单词字符, 属于哪些字符集) 给字符分类；非 ASCII 字符只分单词与非单词两类
+        samples = [chr(code) for code in range(128)] + ['é', '·']
+        signatures = {}
+        sample_classes = []
+        for char in samples:
+            signature = (is_word(char),) + tuple(char in char_set for char_set in char_sets)
+            sample_classes.append(signatures.setdefault(signature, len(signatures)))
+        self.n_classes = len(signatures)
+        self.class_map = {code: chr(char_class) for code, char_class in enumerate(sample_classes[:128])}
+        self.word_class, self.non_word_class = sample_classes[128:]
+        representatives = {}
+        for char, char_class in zip(samples, sample_classes):
+            representatives.setdefault(char_class, char)
+        self.word = [is_word(representatives[char_class]) for char_class in range(self.n_classes)]
+
+        states = {}
+        self.transitions = []
+        self.accepts = []
+        self.eof_accepts = []
+        pending = []
+
+        def state_id(threads, prev_word):
+            key = (threads, prev_word)
+            if key not in states:
+                states[key] = len(states)
+                pending.append(key)
+            return states[key]
+
+        self.starts = [state_id((nfa.start,), False), state_id((nfa.start,), True)]
+        while pending:
+            threads, prev_word = pending.pop(0)
+            transition_row = []
+            accept_row = []
+            for char_class in range(self.n_classes):
+                char = representatives[char_class]
+                active, token_id = nfa.closure(threads, prev_word, self.word[char_class])
+                accept_row.append(token_id)
+                next_threads = []
+                for node_id in active:
+                    _, char_set, next_node = nfa.nodes[node_id]
+                    if char in char_set and next_node not in next_threads:
+                        next_threads.append(next_node)
+                transition_row.append(state_id(tuple(next_threads), self.word[char_class]) if next_threads else DEAD)
+            self.transitions.append(transition_row)
+            self.accepts.append(accept_row)
+            self.eof_accepts.append(nfa.closure(threads, prev_word, False)[1])
+        self.n_states = len(states)
+
+    def classify(self, code):
+        """
+        把源码映射为等价类编号的字节串
+        """
+        return code.translate(ClassMap(self)).encode('latin-1')
+
+class ClassMap(dict):
+    """
+    str.translate 用的映射：ASCII 预先填好，非 ASCII 字符在第一次出现时按是否为单词字符归类
+    """
+    def __init__(self, dfa: TokenDfa):
+        super().__init__(dfa.class_map)
+        self.dfa = dfa
+
+    def __missing__(self, code):
+        char_class = self.dfa.word_class if is_word(chr(code)) else self.dfa.non_word_class
+        self[code] = chr(char_class)
+        return self[code]
+
+@lru_cache(maxsize=None)
+def token_dfa():
+    """
+    TOKEN_TYPES 对应的 DFA，每个进程只构造一次
+    """
+    return TokenDfa(TOKEN_TYPES)
+
+class DfaLexer:
+    """
+    用 token_dfa 做线性时间最长匹配的词法分析器，输出与 IdLexer 相同的 TokenIds
+    work_budget 为整个文件允许的 DFA 步数，缺省为 DEFAULT_WORK_FACTOR * (字符数 + 1)，超出时报错
+    """
+    def __init__(self, input_code, pool=None, work_budget=None):
+        self.code = input_code
+        self.pool = pool
+        self.work_budget = work_budget if work_budget is not None else DEFAULT_WORK_FACTOR * (len(input_code) + 1)
+        self.steps = 0
+
+    def tokenize(self):
+        code = self.code
+        dfa = token_dfa()
+        classes = dfa.classify(code)
+        transitions = dfa.transitions
+        accepts = dfa.accepts
+        eof_accepts = dfa.eof_accepts
+        starts = dfa.starts
+        word = dfa.word
+        intern = self.pool.intern if self.pool is not None else lambda lexeme: lexeme
+        length = len(code)
+        stride = length + 1
+        # (状态, 位置) 出发不会再遇到接受；marked[位置] 表示该位置有这样的记录
+        failed = set()
+        marked = bytearray(stride)
+        budget = self.work_budget
+        steps = 0
+        types = array('B')
+        lexemes = []
+        position = 0
+        while position < length:
+            state = starts[position > 0 and word[classes[position - 1]]]
+            index = position
+            token_id = DEAD
+            end = match_state = None
+            while True:
+                if index == length:
+                    if eof_accepts[state] != DEAD:
+                        token_id, end, match_state = eof_accepts[state], index, state
+                    break
+                if marked[index] and state * stride + index in failed:
+                    break
+                char_class = classes[index]
+                accept = accepts[state][char_class]
+                if accept != DEAD:
+                    token_id, end, match_state = accept, index, state
+                state = transitions[state][char_class]
+                if state == DEAD:
+                    break
+                index += 1
+            steps += index - position + 1
+            if token_id == DEAD:
+                raise RuntimeError(f'Unexpected character: {code[position]} at position {position}')
+            # 最后一次接受之后经过的 (状态, 位置) 都不会再遇到接受，沿原路重放并记录
+            state = match_state
+            for failed_index in range(end, index):
+                state = transitions[state][classes[failed_index]]
+                if state == DEAD:
+                    break
+                failed.add(state * stride + failed_index + 1)
+                marked[failed_index + 1] = 1
+            steps += index - end
+            if steps > budget:
+                self.steps = steps
+                raise RuntimeError(f'Lexing work budget of {budget} steps exceeded at position {position}')
+            if token_id not in SKIPPED_TOKEN_IDS:
+                if token_id == INVALID_ID:
+                    raise RuntimeError(f'Unexpected character: {code[position:end]} at position {position}')
+                types.append(token_id)
+                lexemes.append(intern(code[position:end]))
+            position = end
+        self.steps = steps
+        types.append(EOF_ID)
+        lexemes.append('EOF')
+        return TokenIds(types, lexemes)
+
+def lex_file_dfa(file_path, pool=None, work_budget=None):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return DfaLexer(file.read(), pool, work_budget).tokenize()
+
+# 模糊测试用的片段：覆盖注释、字符串、字符常量、数字后缀、关键字边界与非 ASCII 字符
+FUZZ_FRAGMENTS = ['/*', '*/', '*', '/', '//', '"', "'", '\\', '\n', ' ', '\t', '#', 'x', '0x', '0', '1', '7', '9',
+                  'u', 'U', 'l', 'L', 'll', 'u8', 'e', 'E', 'p', 'f', '.', '...', '+', '-', '<', '<<=', '>', '%:',
+                  'auto', 'do', 'double', '_Bool', 'int', 'a', '_', 'é', '·', '$', '@', '`']
+
+def random_source(rng, size):
+    return ''.join(rng.choice(FUZZ_FRAGMENTS) for _ in range(size))
+
+def lex_outcome(lexer):
+    try:
+        tokens = lexer.tokenize()
+    except RuntimeError as e:
+        return 'error', str(e)
+    return 'ok', list(tokens)
+
+def fuzz(cases, seed, max_size):
+    """
+    在随机片段拼成的输入上比较 DfaLexer 与 IdLexer 的 token 流与错误信息，返回第一个不一致的输入或 None
+    """
+    rng = random.Random(seed)
+    for _ in range(cases):
+        source = random_source(rng, rng.randint(1, max_size))
+        expected = lex_outcome(IdLexer(source))
+        # 预算按理论上界给出，只比较语义
+        actual = lex_outcome(DfaLexer(source, work_budget=(token_dfa().n_states + 2) * (len(source) + 1)))
+        if expected != actual:
+            return source, expected, actual
+    return None
+
+# 病态输入：名字 -> 由重复次数生成源码的函数
+PATHOLOGICAL_INPUTS = {
+    'unterminated_comments': lambda n: '/*a' * n,
+    'comment_stars': lambda n: '/*' + '*a' * n,
+    'long_string': lambda n: 'char *s = "' + 'a\\"' * n + '";\n',
+    'number_suffixes': lambda n: '1ul0x1fLL07u ' * n,
+    'keyword_prefixes': lambda n: 'autox do_ doublex ' * n,
+}
+
+def bench(sizes, time_limit):
+    """
+    在病态输入上比较两种词法分析器的耗时；IdLexer 超过 time_limit 秒后不再测更大的规模
+    """
+    for name, generate in PATHOLOGICAL_INPUTS.items():
+        reference_alive = True
+        for size in sizes:
+            source = generate(size)
+            row = [f"{name:<22}", f"{len(source):>9} 字符"]
+            for label, lexer in (('dfa', DfaLexer), ('re', IdLexer)):
+                if label == 're' and not reference_alive:
+                    row.append(f"{label} {'-':>9}")
+                    continue
+                start = time.perf_counter()
+                instance = lexer(source)
+                lex_outcome(instance)
+                elapsed = time.perf_counter() - start
+                row.append(f"{label} {elapsed * 1000:9.1f} ms")
+                if label == 'dfa':
+                    row.append(f"{instance.steps / (len(source) + 1):5.2f} 步/字符")
+                elif elapsed > time_limit:
+                    reference_alive = False
+            print('  '.join(row))
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="线性时间 DFA 词法分析器的模糊测试与病态输入基准")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    fuzz_parser = subparsers.add_parser('fuzz', help="与 IdLexer 比较随机输入上的结果")
+    fuzz_parser.add_argument('--cases', type=int, default=2000)
+    fuzz_parser.add_argument('--seed', type=int, default=0)
+    fuzz_parser.add_argument('--max-size', type=int, default=40, help="每个输入最多的片段数")
+    bench_parser = subparsers.add_parser('bench', help="病态输入上的耗时")
+    bench_parser.add_argument('--sizes', default='1000,4000,16000,64000', help="逗号分隔的重复次数")
+    bench_parser.add_argument('--time-limit', type=float, default=5.0, help="IdLexer 单次超过该秒数后不再测更大的规模")
+    args = arg_parser.parse_args(argv)
+
+    dfa = token_dfa()
+    print(f"DFA 共 {dfa.n_states} 个状态，{dfa.n_classes} 个字符类")
+    if args.command == 'fuzz':
+        mismatch = fuzz(args.cases, args.seed, args.max_size)
+        if mismatch is not None:
+            source, expected, actual = mismatch
+            print(f"不一致的输入：{source!r}\n  IdLexer:  {expected}\n  DfaLexer: {actual}")
+            return 1
+        print(f"{args.cases} 个随机输入全部一致")
+    else:
+        bench([int(size) for size in args.sizes.split(',')], args.time_limit)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
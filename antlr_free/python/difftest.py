@@ -0,0 +1,487 @@
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from builder import grammar_rules, optimize_tables
+from codegen import load_parser_module, write_parser_module
+from tablefile import TABLE_FILE, FlatTables, LazyTables, flat_table_bytes, write_table_file
+from parser import (TOKEN_TYPES, IdLexer, Lexer, NodePool, SemanticActions, SpanLexer, SymbolPool, error_position,
+                    load_encoded_tables, load_parsing_tables, lr1_parse, lr1_parse_actions, lr1_parse_encoded,
+                    lr1_parse_flat, lr1_parse_hashconsed, lr1_parse_optimized)
+
+sys.setrecursionlimit(100000)
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'example')
+
+# 必须能通过参考流水线的输入，覆盖由 ItemComparison 裁决的冲突
+# 所有流水线共用同一份解析表，表中选错冲突的一侧时差分比较发现不了，因此单独检查
+MUST_PARSE = [
+    'int const x = 1;',
+    'typedef int T; typedef T *P; static T s; extern T e;',
+    'inline int f(void) { return 0; }',
+    '_Alignas(8) int a;',
+    'struct s { const int a; volatile long b; };',
+    '_Atomic(int) q;',
+    'struct s { _Atomic(int) a; };',
+    '_Atomic int r;',
+    'typedef int T; T a;',
+    'int f(a, b) int a; int b; { return a; }',
+    'int f(void) { if (1) if (0) return 1; else return 2; return 0; }',
+]
+
+class Outcome:
+    """
+    一条流水线对某个输入的运行结果
+    status 为 'ok'、'lex_error' 或 'parse_error'；position 为出错位置（字符或 token 下标）
+    """
+    def __init__(self, status, tokens=None, tree=None, position=None, message=None):
+        self.status = status
+        self.tokens = tokens
+        self.tree = tree
+        self.position = position
+        self.message = message
+
+    def __repr__(self):
+        if self.status == 'ok':
+            return f"Outcome(ok, {len(self.tokens)} tokens)"
+        return f"Outcome({self.status} at {self.position}: {self.message})"
+
+class PipelineContext:
+    """
+    流水线共享的上下文，解析表只加载一次
+    """
+    def __init__(self, table_dir='.'):
+        self.table_dir = table_dir
+        self._tables = None
+        self._encoded_tables = None
+        self._optimized_tables = None
+        self._generated_parser = None
+        self._generated_dir = None
+        self._table_file = None
+        self._flat_tables = None
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            self._tables = load_parsing_tables(self.table_dir)
+        return self._tables
+
+    @property
+    def encoded_tables(self):
+        if self._encoded_tables is None:
+            self._encoded_tables = load_encoded_tables(self.table_dir)
+        return self._encoded_tables
+
+    @property
+    def optimized_tables(self):
+        if self._optimized_tables is None:
+            self._optimized_tables = optimize_tables(self.encoded_tables)
+        return self._optimized_tables
+
+    @property
+    def generated_parser(self):
+        if self._generated_parser is None:
+            self._generated_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(self._generated_dir.name, 'generated_parser.py')
+            write_parser_module(self.encoded_tables, path)
+            self._generated_parser = load_parser_module(path)
+        return self._generated_parser
+
+    @property
+    def table_file(self):
+        """
+        tablefile.py 格式的表文件内容
+        """
+        if self._table_file is None:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, TABLE_FILE)
+                write_table_file(self.encoded_tables, path)
+                with open(path, 'rb') as f:
+                    self._table_file = f.read()
+        return self._table_file
+
+    @property
+    def flat_tables(self):
+        if self._flat_tables is None:
+            self._flat_tables = FlatTables(flat_table_bytes(self.encoded_tables))
+        return self._flat_tables
+
+PIPELINES = {}
+
+def register_pipeline(name):
+    """
+    注册一条流水线：函数接收 (source, context)，返回 Outcome
+    """
+    def decorator(func):
+        PIPELINES[name] = func
+        return func
+    return decorator
+
+def run_pipeline(lex, parse):
+    """
+    依次运行词法与语法分析，把异常统一转换为 Outcome
+    """
+    try:
+        tokens = lex()
+    except RuntimeError as e:
+        return Outcome('lex_error', position=error_position(e), message=str(e))
+    try:
+        tree = parse(tokens)
+    except SyntaxError as e:
+        return Outcome('parse_error', tokens=tokens, position=error_position(e), message=str(e))
+    return Outcome('ok', tokens=tokens, tree=tree)
+
+@register_pipeline('reference')
+def reference_pipeline(source, context):
+    def lex():
+        tokens = Lexer(source).tokenize()
+        tokens.append(('EOF', 'EOF'))
+        return tokens
+    action_table, goto_table = context.tables
+    return run_pipeline(lex, lambda tokens: lr1_parse(tokens, action_table, goto_table))
+
+@register_pipeline('mmap')
+def span_pipeline(source, context):
+    action_table, goto_table = context.tables
+    lex = lambda: SpanLexer(source.encode('utf-8')).tokenize()
+    return run_pipeline(lex, lambda tokens: lr1_parse(tokens, action_table, goto_table))
+
+@register_pipeline('encoded')
+def encoded_pipeline(source, context):
+    tables = context.encoded_tables
+    pool = SymbolPool()
+    return run_pipeline(lambda: IdLexer(source, pool).tokenize(), lambda tokens: lr1_parse_encoded(tokens, tables, pool))
+
+@register_pipeline('encoded-mmap')
+def encoded_span_pipeline(source, context):
+    tables = context.encoded_tables
+    lex = lambda: SpanLexer(source.encode('utf-8')).tokenize()
+    return run_pipeline(lex, lambda tokens: lr1_parse_encoded(tokens, tables))
+
+@register_pipeline('optimized')
+def optimized_pipeline(source, context):
+    tables = context.optimized_tables
+    pool = SymbolPool()
+    return run_pipeline(lambda: IdLexer(source, pool).tokenize(), lambda tokens: lr1_parse_optimized(tokens, tables, pool))
+
+@register_pipeline('hashcons')
+def hashconsed_pipeline(source, context):
+    tables = context.encoded_tables
+    nodes = NodePool()
+    parse = lambda tokens: nodes.nodes[lr1_parse_hashconsed(tokens, tables, nodes)]
+    return run_pipeline(lambda: IdLexer(source).tokenize(), parse)
+
+@register_pipeline('lazy')
+def lazy_pipeline(source, context):
+    # 每个输入都从表文件重新开始懒加载
+    tables = LazyTables(context.table_file)
+    return run_pipeline(lambda: IdLexer(source).tokenize(), lambda tokens: lr1_parse_encoded(tokens, tables))
+
+@register_pipeline('flat')
+def flat_pipeline(source, context):
+    tables = context.flat_tables
+    return run_pipeline(lambda: IdLexer(source).tokenize(), lambda tokens: lr1_parse_flat(tokens, tables))
+
+@register_pipeline('dfa')
+def dfa_pipeline(source, context):
+    from dfalexer import DfaLexer
+    tables = context.encoded_tables
+    return run_pipeline(lambda: DfaLexer(source).tokenize(), lambda tokens: lr1_parse_encoded(tokens, tables))
+
+@register_pipeline('deferred')
+def deferred_pipeline(source, context):
+    from outline import DeferredParser, expand
+    parser = DeferredParser(context.encoded_tables)
+    # 跳过函数体后再全部展开，应与完整分析得到相同的树与第一个错误
+    return run_pipeline(lambda: IdLexer(source).tokenize(), lambda tokens: expand(parser.parse(tokens)))
+
+@register_pipeline('actions')
+def actions_pipeline(source, context):
+    # 每个产生式与 token 都注册处理函数，经分派数组重建通用语法树
+    actions = SemanticActions()
+    for lhs in grammar_rules:
+        actions.reduce(lhs)(lambda *children, lhs=lhs: (lhs, list(children)))
+    actions.token(*(name for name, _ in TOKEN_TYPES), 'EOF')(lambda type_name, text: (type_name, text))
+    tables = context.encoded_tables
+    return run_pipeline(lambda: IdLexer(source).tokenize(), lambda tokens: lr1_parse_actions(tokens, tables, actions))
+
+@register_pipeline('node-store')
+def node_store_pipeline(source, context):
+    from nodestore import NodeStore, build_node_store
+    tables = context.encoded_tables
+    buffer = source.encode('utf-8')
+    def parse(tokens):
+        # 结点随归约写入临时结点库，再从磁盘重建语法树
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            path = os.path.join(scratch_dir, 'ast.nodes')
+            build_node_store(SpanLexer(buffer).stream(), buffer, tables, path)
+            with NodeStore.open(path) as store:
+                return store.tree()
+    return run_pipeline(lambda: SpanLexer(buffer).tokenize(), parse)
+
+@register_pipeline('indexed')
+def indexed_pipeline(source, context):
+    from nodeindex import lr1_parse_indexed
+    tables = context.encoded_tables
+    return run_pipeline(lambda: IdLexer(source).tokenize(), lambda tokens: lr1_parse_indexed(tokens, tables)[0])
+
+@register_pipeline('codegen')
+def generated_pipeline(source, context):
+    parse_tokens = context.generated_parser.parse_tokens
+    return run_pipeline(lambda: IdLexer(source).tokenize(), parse_tokens)
+
+def first_tree_difference(a, b):
+    """
+    迭代比较两棵 (lhs, children) 树，返回首个差异的路径描述；相同时返回 None
+    """
+    stack = [(a, b, ())]
+    while stack:
+        x, y, path = stack.pop()
+        x_inner = isinstance(x, tuple) and len(x) == 2 and isinstance(x[1], list)
+        y_inner = isinstance(y, tuple) and len(y) == 2 and isinstance(y[1], list)
+        if x_inner != y_inner:
+            return path, x, y
+        if not x_inner:
+            if tuple(x) != tuple(y):
+                return path, x, y
+            continue
+        if x[0] != y[0] or len(x[1]) != len(y[1]):
+            return path, x[0], y[0]
+        for i in range(len(x[1]) - 1, -1, -1):
+            stack.append((x[1][i], y[1][i], path + (f"{x[0]}[{i}]",)))
+    return None
+
+def compare_outcomes(expected: Outcome, actual: Outcome):
+    """
+    比较两个结果，返回差异描述；一致时返回 None
+    """
+    if expected.status != actual.status:
+        return f"状态不同：{expected} != {actual}"
+    if expected.status == 'lex_error':
+        if expected.position != actual.position:
+            return f"词法错误位置不同：{expected.position} != {actual.position}"
+        return None
+    expected_tokens = [tuple(token) for token in expected.tokens]
+    actual_tokens = [tuple(token) for token in actual.tokens]
+    if expected_tokens != actual_tokens:
+        for i, (x, y) in enumerate(zip(expected_tokens, actual_tokens)):
+            if x != y:
+                return f"第 {i} 个 token 不同：{x} != {y}"
+        return f"token 数不同：{len(expected_tokens)} != {len(actual_tokens)}"
+    if expected.status == 'parse_error':
+        if expected.position != actual.position:
+            return f"语法错误位置不同：{expected.position} != {actual.position}"
+        return None
+    difference = first_tree_difference(expected.tree, actual.tree)
+    if difference:
+        path, x, y = difference
+        return f"语法树在 {'/'.join(path) or '根'} 处不同：{x!r} != {y!r}"
+    return None
+
+def literal_lexeme(pattern):
+    """
+    若 TOKEN_TYPES 中的模式只匹配一个固定串，返回该串
+    """
+    candidate = pattern.replace(r'\b', '').replace('\\', '')
+    if re.fullmatch(pattern, candidate, re.VERBOSE):
+        return candidate
+    return None
+
+class ProgramGenerator:
+    """
+    按 grammar_rules 随机展开产生式，生成符合文法的 C 程序
+    """
+    IDENTIFIERS = ['a', 'b', 'i', 'n', 'x', 'foo', 'printf']
+    CONSTANTS = ['0', '1', '42', '0x1f', '3.14', "'c'", '10UL']
+    STRINGS = ['"s"', '"hello\\n"', '""']
+
+    def __init__(self, rules, seed=0, max_depth=12):
+        self.rules = rules
+        self.rng = random.Random(seed)
+        self.max_depth = max_depth
+        self.start_symbol = next(iter(rules))
+        self.lexemes = {}
+        for name, pattern in TOKEN_TYPES:
+            lexeme = literal_lexeme(pattern)
+            if lexeme is not None:
+                self.lexemes[name] = lexeme
+        self.min_heights = self.compute_min_heights()
+
+    def compute_min_heights(self):
+        """
+        计算每个非终结符推导出终结符串所需的最小高度
+        """
+        heights = {}
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs_list in self.rules.items():
+                for rhs in rhs_list:
+                    if all(symbol not in self.rules or symbol in heights for symbol in rhs):
+                        height = 1 + max([heights.get(symbol, 0) for symbol in rhs], default=0)
+                        if height < heights.get(lhs, float('inf')):
+                            heights[lhs] = height
+                            changed = True
+        return heights
+
+    def production_height(self, rhs):
+        return 1 + max([self.min_heights.get(symbol, 0) for symbol in rhs], default=0)
+
+    def terminal_lexeme(self, terminal):
+        if terminal == 'Identifier':
+            return self.rng.choice(self.IDENTIFIERS)
+        if terminal == 'Constant':
+            return self.rng.choice(self.CONSTANTS)
+        if terminal == 'StringLiteral':
+            return self.rng.choice(self.STRINGS)
+        if terminal == 'EOF':
+            return None
+        return self.lexemes[terminal]
+
+    def generate_lexemes(self):
+        """
+        迭代展开，返回词素列表；超过深度预算后只选能最快终止的产生式
+        """
+        output = []
+        stack = [(self.start_symbol, 0)]
+        while stack:
+            symbol, depth = stack.pop()
+            if symbol not in self.rules:
+                lexeme = self.terminal_lexeme(symbol)
+                if lexeme is not None:
+                    output.append(lexeme)
+                continue
+            candidates = self.rules[symbol]
+            budget = self.max_depth - depth
+            fitting = [rhs for rhs in candidates if self.production_height(rhs) <= budget]
+            if fitting:
+                rhs = self.rng.choice(fitting)
+            else:
+                rhs = min(candidates, key=self.production_height)
+            for child in reversed(rhs):
+                stack.append((child, depth + 1))
+        return output
+
+    def generate(self, min_lexemes=8, max_attempts=20, mutate=0.0):
+        """
+        生成一个程序；过短的推导（如空翻译单元）会重新生成
+        mutate 为对结果做一次随机变异（删除、重复或交换词素）的概率，用于覆盖语法错误路径
+        """
+        lexemes = []
+        for _ in range(max_attempts):
+            lexemes = self.generate_lexemes()
+            if len(lexemes) >= min_lexemes:
+                break
+        if lexemes and self.rng.random() < mutate:
+            i = self.rng.randrange(len(lexemes))
+            j = self.rng.randrange(len(lexemes))
+            operation = self.rng.choice(('delete', 'duplicate', 'swap'))
+            if operation == 'delete':
+                del lexemes[i]
+            elif operation == 'duplicate':
+                lexemes.insert(j, lexemes[i])
+            else:
+                lexemes[i], lexemes[j] = lexemes[j], lexemes[i]
+        return ' '.join(lexemes)
+
+def ddmin(units, still_fails):
+    """
+    Delta debugging：在保持 still_fails 为真的前提下把 units 缩到局部最小
+    """
+    granularity = 2
+    while len(units) >= 2:
+        chunk = max(len(units) // granularity, 1)
+        reduced = False
+        for start in range(0, len(units), chunk):
+            complement = units[:start] + units[start + chunk:]
+            if complement and still_fails(complement):
+                units = complement
+                granularity = max(granularity - 1, 2)
+                reduced = True
+                break
+        if not reduced:
+            if chunk == 1:
+                break
+            granularity = min(granularity * 2, len(units))
+    return units
+
+class DifferentialTester:
+    """
+    在同一输入上运行参考流水线与候选流水线并比较结果
+    """
+    def __init__(self, candidate, context, reference='reference'):
+        self.reference = PIPELINES[reference]
+        self.candidate = PIPELINES[candidate]
+        self.context = context
+
+    def check(self, source):
+        expected = self.reference(source, self.context)
+        actual = self.candidate(source, self.context)
+        return compare_outcomes(expected, actual)
+
+    def shrink(self, source):
+        """
+        把出现差异的输入缩减为最小复现；先按 token 缩减，不可行时按行缩减
+        """
+        try:
+            units = [lexeme for _, lexeme in Lexer(source).tokenize()]
+            separator = ' '
+            if not units or not self.check(separator.join(units)):
+                raise RuntimeError
+        except RuntimeError:
+            units = source.split('\n')
+            separator = '\n'
+        minimal = ddmin(units, lambda candidate: self.check(separator.join(candidate)) is not None)
+        return separator.join(minimal)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="对比参考流水线与候选流水线的 token 流和语法树")
+    arg_parser.add_argument('corpus', nargs='*', help="C 源文件，缺省使用 example/*.c")
+    arg_parser.add_argument('--pipeline', default='reference', help=f"候选流水线，可选 {', '.join(PIPELINES)}")
+    arg_parser.add_argument('--cases', type=int, default=1000, help="随机生成的程序数")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--max-depth', type=int, default=12, help="随机展开的深度预算")
+    arg_parser.add_argument('--mutate', type=float, default=0.0, help="随机程序被变异为（通常）非法输入的概率")
+    arg_parser.add_argument('--table-dir', default='.')
+    arg_parser.add_argument('--output', default='difftest_repro.c', help="最小复现的保存路径")
+    args = arg_parser.parse_args(argv)
+    if args.pipeline not in PIPELINES:
+        arg_parser.error(f"未知流水线 {args.pipeline}")
+
+    context = PipelineContext(args.table_dir)
+    for source in MUST_PARSE:
+        outcome = PIPELINES['reference'](source, context)
+        if outcome.status != 'ok':
+            print(f"固定用例未通过参考流水线：{source!r}: {outcome}")
+            return 1
+
+    tester = DifferentialTester(args.pipeline, context)
+    corpus = args.corpus or sorted(glob.glob(os.path.join(EXAMPLE_DIR, '*.c')))
+    cases = []
+    for path in corpus:
+        with open(path, 'r', encoding='utf-8') as file:
+            cases.append((path, file.read()))
+    generator = ProgramGenerator(grammar_rules, seed=args.seed, max_depth=args.max_depth)
+    start = time.perf_counter()
+    for i in range(len(cases) + args.cases):
+        name, source = cases[i] if i < len(cases) else (f"random#{i - len(cases)}", generator.generate(mutate=args.mutate))
+        difference = tester.check(source)
+        if difference:
+            print(f"{name}: {difference}")
+            minimal = tester.shrink(source)
+            with open(args.output, 'w', encoding='utf-8') as file:
+                file.write(minimal + '\n')
+            print(f"最小复现（{len(minimal)} 字节）已保存到 {args.output}：\n{minimal}")
+            return 1
+    elapsed = time.perf_counter() - start
+    total = len(cases) + args.cases
+    print(f"{args.pipeline} 与 reference 在 {total} 个输入上一致，用时 {elapsed:.1f} s（{total / elapsed * 60:.0f} 个/分钟）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+"""
+只在冲突处分叉的 GLR 分析
+
+ItemComparison 为每个冲突固定一个动作，文法本身有歧义的构造（typedef 名与标识符、悬挂 else 等）因此只能得到其中一种分析。
+builder.py 把冲突中被舍弃的动作记录在 EncodedTables.conflict_rows 中。GlrParser 平时与 lr1_parse_encoded 相同，
+按确定性的 LALR 循环分析；在有冲突的 (状态, 向前看) 处转为图结构栈（GSS），对所有动作并行分析，
+各分支重新汇合为一条线性栈时回到确定性循环。只有一个动作能走过之后几个 token 时直接执行它，不建 GSS。
+同一位置、同一底端归约出的结点合并为一个，其值为 Ambiguity，列出各候选的子结点列表，候选之间共用相同的子树；
+没有歧义的部分仍是普通的 (lhs, children)。
+"""
+import argparse
+import sys
+
+from builder import EncodedTables
+from parser import dump_ast_yaml, gc_paused, load_encoded_tables
+
+class Ambiguity(tuple):
+    """
+    有歧义结点的值：各候选的子结点列表，结点形如 (lhs, Ambiguity((children1, children2, ...)))
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"Ambiguity({tuple.__repr__(self)})"
+
+class ForestNode:
+    """
+    GLR 分析期间的非终结符结点，之后还可能追加候选；回到确定性分析或接受时由 finish_forest 转为元组
+    """
+    __slots__ = ('symbol', 'alternatives')
+
+    def __init__(self, symbol, children):
+        self.symbol = symbol
+        self.alternatives = [children]
+
+    def add(self, children):
+        for alternative in self.alternatives:
+            if len(alternative) == len(children) and all(a is b for a, b in zip(alternative, children)):
+                return
+        self.alternatives.append(children)
+
+class GssNode:
+    """
+    图结构栈的结点：links 为 (值, 下方结点) 列表；下方为整数 h 时表示确定性栈 states[:h + 1]
+    """
+    __slots__ = ('state', 'links')
+
+    def __init__(self, state, links):
+        self.state = state
+        self.links = links
+
+def finish_forest(value, counter=None):
+    """
+    把 ForestNode 转为 (lhs, children) 元组，结构相同的候选只保留一个，仍有多个候选时值为 Ambiguity
+    不是 ForestNode 的值（确定性分析得到的子树、叶子）原样保留；counter 非空时对每个歧义结点加一
+    """
+    if not isinstance(value, ForestNode):
+        return value
+    done = {}
+    stack = [value]
+    while stack:
+        node = stack[-1]
+        if id(node) in done:
+            stack.pop()
+            continue
+        pending = [child for alternative in node.alternatives for child in alternative
+                   if isinstance(child, ForestNode) and id(child) not in done]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        alternatives = []
+        for alternative in node.alternatives:
+            children = [done[id(child)] if isinstance(child, ForestNode) else child for child in alternative]
+            if children not in alternatives:
+                alternatives.append(children)
+        if len(alternatives) == 1:
+            done[id(node)] = (node.symbol, alternatives[0])
+        else:
+            done[id(node)] = (node.symbol, Ambiguity(alternatives))
+            if counter is not None:
+                counter[0] += 1
+    return done[id(value)]
+
+class GlrParser:
+    """
+    在冲突处局部分叉的分析器；没有冲突的部分与 lr1_parse_encoded 相同，每次移进只多一次整数比较
+    冲突处先只用状态栈试探 lookahead 个 token，仍有多个动作存活时才建 GSS
+    """
+    def __init__(self, tables: EncodedTables, pool=None, lookahead=4):
+        if tables.conflict_rows is None:
+            raise ValueError("解析表中没有冲突记录，请用 builder.py 重新生成解析表")
+        self.tables = tables
+        self.pool = pool
+        self.lookahead = lookahead
+        # 有冲突的表项换成 fork（大于任何状态编号），确定性循环只在移进分支中检查
+        self.fork = len(tables.action_rows)
+        self.action_rows = []
+        for action_row, conflict_row in zip(tables.action_rows, tables.conflict_rows):
+            if conflict_row:
+                action_row = dict(action_row)
+                for token_id in conflict_row:
+                    action_row[token_id] = self.fork
+            self.action_rows.append(action_row)
+        self.action_cache = {}
+        self.forks = 0
+        self.glr_tokens = 0
+        self.ambiguities = 0
+
+    def parse(self, tokens):
+        """
+        分析 tokens（TokenIds 或 TokenSpans），返回语法树；有歧义的结点的值为 Ambiguity
+        forks / glr_tokens / ambiguities 记录本次分叉次数、在 GSS 上分析的 token 数与歧义结点数
+        """
+        action_rows = self.action_rows
+        goto_rows = self.tables.goto_rows
+        productions = self.tables.productions
+        symbols = self.tables.symbols
+        fork = self.fork
+        types = tokens.types
+        lexeme = tokens.lexeme
+        leaf = self.pool.leaf if self.pool is not None else lambda type_name, text: (type_name, text)
+        last = len(types) - 1
+        self.forks = self.glr_tokens = 0
+        counter = [0]
+        states = [0]
+        values = []
+        index = 0
+        token_id = types[0]
+        with gc_paused():
+            while True:
+                action = action_rows[states[-1]].get(token_id)
+                if action is None:
+                    raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+                if action >= 0:
+                    if action == fork:
+                        action = self.viable_action(states, types, index)
+                        if action is None:
+                            index, tree = self.parse_forked(tokens, states, values, index, leaf, counter)
+                            if tree is not None:
+                                self.ambiguities = counter[0]
+                                return tree
+                            token_id = types[index]
+                            continue
+                        if action < 0:
+                            self.reduce(states, values, action)
+                            continue
+                    states.append(action)
+                    values.append(leaf(symbols[token_id], lexeme(index)))
+                    if index < last:
+                        index += 1
+                        token_id = types[index]
+                elif action == EncodedTables.ACCEPT:
+                    self.ambiguities = counter[0]
+                    return values[-1]
+                else:
+                    lhs, length = productions[~action]
+                    if length:
+                        children = values[-length:]
+                        del values[-length:]
+                        del states[-length:]
+                    else:
+                        children = []
+                    goto_state = goto_rows[states[-1]].get(lhs)
+                    if goto_state is None:
+                        raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                    states.append(goto_state)
+                    values.append((symbols[lhs], children))
+
+    def actions(self, state, token_id):
+        """
+        (状态, 向前看) 处的全部动作：表中选定的动作在前，其后是冲突中被舍弃的动作；按需计算并缓存
+        """
+        key = state * self.tables.n_terminals + token_id
+        result = self.action_cache.get(key)
+        if result is None:
+            chosen = self.tables.action_rows[state].get(token_id)
+            discarded = self.tables.conflict_rows[state].get(token_id, ())
+            result = self.action_cache[key] = discarded if chosen is None else (chosen,) + discarded
+        return result
+
+    def viable_action(self, states, types, index):
+        """
+        冲突处只在状态栈上试探各动作，向后移进 lookahead 个 token 后仍存活的动作恰有一个时返回它，否则返回 None
+        多数冲突（如 int x = 中把 x 当作 typedef 名）的其余分支几个 token 内就会失败，不必建 GSS
+        """
+        actions = self.actions
+        goto_rows = self.tables.goto_rows
+        productions = self.tables.productions
+        horizon = min(index + self.lookahead, len(types) - 1)
+        viable = None
+        for first in actions(states[-1], types[index]):
+            # 试探中的栈为 states[:height] + pushed；只在同一处有多个动作时复制 pushed
+            pending = [(len(states), [], first, index)]
+            while pending:
+                height, pushed, action, position = pending.pop()
+                while True:
+                    if action >= 0:
+                        if position == horizon:
+                            break
+                        pushed.append(action)
+                        position += 1
+                    elif action == EncodedTables.ACCEPT:
+                        break
+                    else:
+                        lhs, length = productions[~action]
+                        if length <= len(pushed):
+                            del pushed[len(pushed) - length:]
+                        else:
+                            height -= length - len(pushed)
+                            pushed.clear()
+                        goto_state = goto_rows[pushed[-1] if pushed else states[height - 1]].get(lhs)
+                        if goto_state is None:
+                            action = None
+                            break
+                        pushed.append(goto_state)
+                    following = actions(pushed[-1], types[position])
+                    if not following:
+                        action = None
+                        break
+                    for other in following[1:]:
+                        pending.append((height, pushed[:], other, position))
+                    action = following[0]
+                if action is not None:
+                    break
+            else:
+                continue
+            if viable is not None:
+                return None
+            viable = first
+        return viable
+
+    def reduce(self, states, values, action):
+        """
+        在确定性栈上按 ~action 号产生式归约，用于冲突处试探后唯一可行的归约
+        """
+        lhs, length = self.tables.productions[~action]
+        children = values[-length:]
+        del values[-length:]
+        del states[-length:]
+        states.append(self.tables.goto_rows[states[-1]][lhs])
+        values.append((self.tables.symbols[lhs], children))
+
+    def parse_forked(self, tokens, states, values, index, leaf, counter):
+        """
+        从确定性栈 states / values 的栈顶开始在 GSS 上分析，直到各分支汇合成一条线性栈或接受
+        汇合时就地改写 states / values 并返回 (下一个 token 的下标, None)；接受时返回 (index, 语法树)
+        """
+        tables = self.tables
+        actions = self.actions
+        goto_rows = tables.goto_rows
+        productions = tables.productions
+        symbols = tables.symbols
+        types = tokens.types
+        lexeme = tokens.lexeme
+        last = len(types) - 1
+        self.forks += 1
+        height = len(states) - 1
+        top = GssNode(states[-1], [(values[-1], height - 1)] if height else [])
+        active = {top.state: top}
+        while True:
+            self.glr_tokens += 1
+            token_id = types[index]
+
+            # 归约：每个 (结点, 出边) 处理一次，新增的出边再作为新的工作项
+            pending = [(node, link) for node in active.values() for link in node.links]
+            while pending:
+                node, link = pending.pop()
+                for action in actions(node.state, token_id):
+                    if action >= EncodedTables.ACCEPT:
+                        continue
+                    lhs, length = productions[~action]
+                    value, below = link
+                    if length == 1:
+                        paths = (([value], below),)
+                    elif below.__class__ is int:
+                        paths = ((values[below - length + 1:below] + [value], below - length + 1),)
+                    else:
+                        paths = self.reduction_paths(link, length, values)
+                    for children, below in paths:
+                        below_state = states[below] if below.__class__ is int else below.state
+                        goto_state = goto_rows[below_state].get(lhs)
+                        if goto_state is None:
+                            continue
+                        target = active.get(goto_state)
+                        if target is None:
+                            new_link = (ForestNode(symbols[lhs], children), below)
+                            target = active[goto_state] = GssNode(goto_state, [new_link])
+                            pending.append((target, new_link))
+                            continue
+                        for value, other in target.links:
+                            if other is below or (below.__class__ is int and other == below):
+                                value.add(children)
+                                break
+                        else:
+                            new_link = (ForestNode(symbols[lhs], children), below)
+                            target.links.append(new_link)
+                            pending.append((target, new_link))
+
+            # 移进：各分支共用同一个叶子
+            shifted = {}
+            token = leaf(symbols[token_id], lexeme(index))
+            for node in active.values():
+                for action in actions(node.state, token_id):
+                    if action == EncodedTables.ACCEPT:
+                        return index, finish_forest(node.links[0][0], counter)
+                    if action >= 0:
+                        target = shifted.get(action)
+                        if target is None:
+                            shifted[action] = GssNode(action, [(token, node)])
+                        else:
+                            target.links.append((token, node))
+            if not shifted:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if index < last:
+                index += 1
+            active = shifted
+
+            # 只剩一个栈顶且到确定性栈之间没有分叉时汇合
+            if len(active) == 1:
+                chain = []
+                node = next(iter(active.values()))
+                while node.__class__ is GssNode and len(node.links) == 1:
+                    value, below = node.links[0]
+                    chain.append((node.state, value))
+                    node = below
+                if node.__class__ is int:
+                    del states[node + 1:]
+                    del values[node:]
+                    for state, value in reversed(chain):
+                        states.append(state)
+                        values.append(finish_forest(value, counter))
+                    return index, None
+
+    @staticmethod
+    def reduction_paths(link, length, values):
+        """
+        以 link 为第一条边、长度为 length 的全部路径，返回 [(子结点列表, 底端), ...]
+        路径进入确定性栈后唯一，直接从 values 中切片
+        """
+        paths = []
+        pending = [(link, length, [])]
+        while pending:
+            (value, below), remaining, collected = pending.pop()
+            collected = [value] + collected
+            remaining -= 1
+            if remaining == 0:
+                paths.append((collected, below))
+            elif below.__class__ is int:
+                paths.append((values[below - remaining:below] + collected, below - remaining))
+            else:
+                pending.extend((next_link, remaining, collected) for next_link in below.links)
+        return paths
+
+def ambiguous_nodes(tree):
+    """
+    先序产出树中全部歧义结点；各候选只进入一次共用的子树
+    """
+    seen = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        label, value = node
+        if isinstance(value, str) or id(value) in seen:
+            continue
+        seen.add(id(value))
+        if isinstance(value, Ambiguity):
+            yield node
+            for alternative in reversed(value):
+                stack.extend(reversed(alternative))
+        else:
+            stack.extend(reversed(value))
+
+def resolve(tree, choose=None):
+    """
+    在每个歧义结点处选一个候选，得到普通的语法树；choose(lhs, alternatives) 返回候选下标，缺省取第一个
+    """
+    root = []
+    stack = [(tree, root)]
+    while stack:
+        node, parent = stack.pop()
+        label, value = node
+        if isinstance(value, Ambiguity):
+            value = value[choose(label, value) if choose is not None else 0]
+        if isinstance(value, list):
+            children = []
+            parent.append((label, children))
+            stack.extend((child, children) for child in reversed(value))
+        else:
+            parent.append(node)
+    return root[0]
+
+def leaf_text(node):
+    """
+    结点覆盖的 token 文本，歧义结点取第一个候选
+    """
+    texts = []
+    stack = [node]
+    while stack:
+        label, value = stack.pop()
+        if isinstance(value, Ambiguity):
+            value = value[0]
+        if isinstance(value, list):
+            stack.extend(reversed(value))
+        else:
+            texts.append(value)
+    return ' '.join(texts)
+
+def forest_to_yaml(node):
+    """
+    与 ast_to_yaml 相同，歧义结点输出为 {lhs: {'alternatives': [候选1, 候选2, ...]}}
+    """
+    lhs, value = node
+    if isinstance(value, Ambiguity):
+        return {lhs: {'alternatives': [[forest_to_yaml(child) for child in alternative] for alternative in value]}}
+    if isinstance(value, list):
+        return {lhs: [forest_to_yaml(child) for child in value]}
+    return {lhs: value}
+
+def forest_depth(node):
+    """
+    迭代计算 forest_to_yaml 输出的嵌套层数；歧义结点的 alternatives 多占两层
+    """
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        (_, value), level = stack.pop()
+        depth = max(depth, level)
+        if isinstance(value, Ambiguity):
+            stack.extend((child, level + 3) for alternative in value for child in alternative)
+        elif isinstance(value, list):
+            stack.extend((child, level + 1) for child in value)
+    return depth
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="在冲突处分叉的 GLR 分析，列出文法上有歧义的结点")
+    arg_parser.add_argument('files', nargs='+')
+    arg_parser.add_argument('--yaml', action='store_true', help="以 YAML 输出语法树，歧义结点列出全部候选")
+    arg_parser.add_argument('--table-dir', default='.')
+    args = arg_parser.parse_args(argv)
+    from dfalexer import DfaLexer
+    parser = GlrParser(load_encoded_tables(args.table_dir))
+    status = 0
+    for file_path in args.files:
+        try:
+            with open(file_path, 'r') as file:
+                tree = parser.parse(DfaLexer(file.read()).tokenize())
+        except (RuntimeError, SyntaxError) as e:
+            print(f"{file_path}: {e}")
+            status = 1
+            continue
+        if args.yaml:
+            try:
+                dump_ast_yaml(tree, sys.stdout, forest_depth(tree), forest_to_yaml)
+            except ValueError as e:
+                print(f"{file_path}: {e}")
+                status = 1
+            continue
+        print(f"{file_path}: 分叉 {parser.forks} 次，{parser.glr_tokens} 个 token 在 GSS 上分析，"
+              f"{parser.ambiguities} 个歧义结点")
+        for label, value in ambiguous_nodes(tree):
+            print(f"  {label}（{len(value)} 种分析）: {leaf_text((label, value))}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
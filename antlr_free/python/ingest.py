@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import os
+import posixpath
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import unquote, urlsplit
+
+from columnar import columnar_bytes
+from parser import (IdLexer, SymbolPool, dump_ast_yaml, encode_tokens, load_encoded_tables,
+                    lr1_parse_encoded, lr1_parse_flat)
+from preprocessor import Preprocessor, parse_defines
+from tablefile import FlatTables, SharedTables
+
+# 工作进程内常驻的解析表与预处理器，由 init_worker 创建
+_worker_tables = None
+_worker_shared_tables = None
+_worker_preprocessor = None
+
+def init_worker(table_dir, preprocess_options=None, shared_name=None):
+    """
+    工作进程初始化：给出 shared_name 时映射主进程放在共享内存中的扁平解析表，否则在本进程内加载一份
+    preprocess_options 为 (头文件目录, 预定义宏) 时启用预处理，头文件缓存在该进程处理的所有文件间共享
+    """
+    global _worker_tables, _worker_shared_tables, _worker_preprocessor
+    if shared_name is not None:
+        _worker_shared_tables = SharedTables.attach(shared_name)
+        _worker_tables = _worker_shared_tables.tables
+    else:
+        _worker_tables = load_encoded_tables(table_dir)
+    if preprocess_options is not None:
+        include_dirs, defines = preprocess_options
+        _worker_preprocessor = Preprocessor(include_dirs, defines)
+
+def parse_source_job(name, data, path=None, columnar=False):
+    """
+    在工作进程中完成词法、语法分析与序列化，返回 (name, yaml 文本, token 文本, 错误信息)
+    path 为本地源文件路径，预处理时用于查找 #include "..."
+    columnar 为真时序列化为列式二进制，返回 (name, 列式字节串, None, 错误信息)
+    """
+    try:
+        if _worker_preprocessor is not None:
+            token_list = _worker_preprocessor.preprocess_source(data.decode('utf-8'), path or name)
+            token_list.append(('EOF', 'EOF'))
+            tokens = encode_tokens(token_list, SymbolPool())
+        else:
+            tokens = IdLexer(data.decode('utf-8'), SymbolPool()).tokenize()
+        parse_tokens = lr1_parse_flat if isinstance(_worker_tables, FlatTables) else lr1_parse_encoded
+        ast = parse_tokens(tokens, _worker_tables)
+        if columnar:
+            return name, columnar_bytes(tokens, ast), None, None
+        try:
+            ast_text = dump_ast_yaml(ast)
+        except ValueError as e:
+            return name, None, None, f"{e}，可改用 --columnar"
+        tokens_text = ''.join(f"{token}\n" for token in tokens)
+        return name, ast_text, tokens_text, None
+    except Exception as e:
+        return name, None, None, f"{type(e).__name__}: {e}"
+
+class Source:
+    """
+    待读取的输入：本地文件或 HTTP 地址，name 为输出时使用的相对路径
+    """
+    def __init__(self, location, name):
+        self.location = location
+        self.name = name
+
+    @property
+    def is_http(self):
+        return self.location.startswith(('http://', 'https://'))
+
+def url_output_name(url):
+    """
+    由 URL 的路径得到输出用的相对路径；含 .. 的路径会写到输出目录之外，直接拒绝
+    """
+    path = unquote(urlsplit(url).path)
+    if '..' in path.split('/'):
+        raise ValueError(f"{url}: 路径中不能含有 ..")
+    return posixpath.normpath('/' + path).lstrip('/') or 'index.c'
+
+def collect_sources(locations):
+    """
+    展开命令行给出的输入：目录递归收集 .c 文件，文件与 URL 原样保留
+    单独给出的文件以它们共同的上级目录为基准命名，不同目录下的同名文件不会写到同一个输出；
+    仍然重名时抛出 ValueError
+    """
+    sources = []
+    plain_files = [location for location in locations
+                   if not location.startswith(('http://', 'https://')) and not os.path.isdir(location)]
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in plain_files]) if plain_files else None
+    for location in locations:
+        if location.startswith(('http://', 'https://')):
+            sources.append(Source(location, url_output_name(location)))
+        elif os.path.isdir(location):
+            for root, _, files in os.walk(location):
+                for file_name in sorted(files):
+                    if file_name.endswith('.c'):
+                        path = os.path.join(root, file_name)
+                        sources.append(Source(path, os.path.relpath(path, location)))
+        else:
+            sources.append(Source(location, os.path.relpath(os.path.abspath(location), base)))
+    seen = {}
+    for source in sources:
+        other = seen.setdefault(os.path.normcase(source.name), source)
+        if other is not source:
+            raise ValueError(f"{other.location} 与 {source.location} 的输出文件名都是 {source.name}")
+    return sources
+
+def read_local(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+async def fetch_http(url):
+    """
+    最小的 HTTP/1.0 GET 客户端，足以对接本地制品库或其替身
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=parts.scheme == 'https')
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+    writer.write(f"GET {target} HTTP/1.0\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    head, _, body = response.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+    fields = status_line.split()
+    if len(fields) < 2 or not fields[1].isdigit():
+        raise OSError(f"{url}: 无法识别的响应 {status_line[:80]!r}")
+    status = int(fields[1])
+    if status != 200:
+        raise OSError(f"{url}: {status_line}")
+    return body
+
+class IngestStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.errors = []
+        self.read_time = 0.0
+        self.start = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        return (f"{self.files} 个文件，{self.bytes / 1e6:.1f} MB，错误 {len(self.errors)} 个，"
+                f"用时 {elapsed:.2f} s（读取累计 {self.read_time:.2f} s）")
+
+class IngestPipeline:
+    """
+    异步摄取流水线：
+    读取（有界并发） -> 待分析队列 -> 进程池分析 -> 待写回队列 -> 异步写回
+    两个队列均有容量上限，下游变慢时上游自动等待（背压）
+    """
+    def __init__(self, output_dir, table_dir='.', jobs=None, read_concurrency=16, write_concurrency=4, queue_size=64,
+                 preprocess_options=None, columnar=False):
+        self.output_dir = output_dir
+        self.columnar = columnar
+        self.preprocess_options = preprocess_options
+        self.table_dir = table_dir
+        self.jobs = jobs or os.cpu_count()
+        self.read_concurrency = read_concurrency
+        self.write_concurrency = write_concurrency
+        self.queue_size = queue_size
+        self.stats = IngestStats()
+        self.shared_tables = None
+        self.executor = None
+
+    def create_process_pool(self):
+        return ProcessPoolExecutor(self.jobs, initializer=init_worker,
+                                   initargs=(self.table_dir, self.preprocess_options, self.shared_tables.name))
+
+    async def read(self, source, semaphore, parse_queue):
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if source.is_http:
+                    data = await fetch_http(source.location)
+                else:
+                    data = await loop.run_in_executor(None, read_local, source.location)
+            except Exception as e:
+                # 逐个文件报告错误，不影响同批的其他输入
+                self.stats.errors.append((source.name, f"{type(e).__name__}: {e}"))
+                return
+            self.stats.read_time += time.perf_counter() - start
+            self.stats.bytes += len(data)
+        await parse_queue.put((source.name, data, None if source.is_http else source.location))
+
+    async def produce(self, sources, parse_queue):
+        semaphore = asyncio.Semaphore(self.read_concurrency)
+        pending = set()
+        for source in sources:
+            # 同时在途的读取数有上限，避免一次性为所有输入创建任务
+            if len(pending) >= self.read_concurrency * 2:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.add(asyncio.create_task(self.read(source, semaphore, parse_queue)))
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def parse_worker(self, parse_queue, write_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await parse_queue.get()
+            if item is None:
+                parse_queue.task_done()
+                return
+            name, data, path = item
+            executor = self.executor
+            try:
+                result = await loop.run_in_executor(executor, parse_source_job, name, data, path, self.columnar)
+            except BrokenProcessPool as e:
+                # 工作进程异常退出：在途的文件记为错误，换一个新的进程池继续处理后面的文件
+                if executor is self.executor:
+                    self.executor = self.create_process_pool()
+                    executor.shutdown(wait=False)
+                result = name, None, None, f"{type(e).__name__}: {e}"
+            await write_queue.put(result)
+            parse_queue.task_done()
+
+    def write_outputs(self, name, ast_text, tokens_text):
+        base = os.path.join(self.output_dir, name)
+        os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+        if self.columnar:
+            with open(base + '.col', 'wb') as file:
+                file.write(ast_text)
+            return
+        with open(base + '.yaml', 'w', encoding='utf-8') as file:
+            file.write(ast_text)
+        with open(base + '.txt', 'w', encoding='utf-8') as file:
+            file.write(tokens_text)
+
+    async def write_worker(self, write_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            result = await write_queue.get()
+            if result is None:
+                write_queue.task_done()
+                return
+            name, ast_text, tokens_text, error = result
+            if error:
+                self.stats.errors.append((name, error))
+            else:
+                await loop.run_in_executor(None, self.write_outputs, name, ast_text, tokens_text)
+                self.stats.files += 1
+            write_queue.task_done()
+
+    async def run(self, sources):
+        parse_queue = asyncio.Queue(self.queue_size)
+        write_queue = asyncio.Queue(self.queue_size)
+        # 解析表只在共享内存中放一份，所有工作进程直接读取
+        with SharedTables.create(load_encoded_tables(self.table_dir)) as shared_tables:
+            self.shared_tables = shared_tables
+            self.executor = self.create_process_pool()
+            try:
+                parsers = [asyncio.create_task(self.parse_worker(parse_queue, write_queue))
+                           for _ in range(self.jobs)]
+                writers = [asyncio.create_task(self.write_worker(write_queue)) for _ in range(self.write_concurrency)]
+                await self.produce(sources, parse_queue)
+                for _ in parsers:
+                    await parse_queue.put(None)
+                await asyncio.gather(*parsers)
+                for _ in writers:
+                    await write_queue.put(None)
+                await asyncio.gather(*writers)
+            finally:
+                self.executor.shutdown()
+        return self.stats
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="异步批量摄取 C 源文件：读取、分析与写回相互重叠")
+    arg_parser.add_argument('sources', nargs='+', help="目录、文件或 http:// 地址")
+    arg_parser.add_argument('-o', '--output-dir', default='ingest_output')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help="分析进程数，缺省为 CPU 核数")
+    arg_parser.add_argument('--read-concurrency', type=int, default=16, help="同时进行的读取数")
+    arg_parser.add_argument('--write-concurrency', type=int, default=4, help="同时进行的写回数")
+    arg_parser.add_argument('--queue-size', type=int, default=64, help="队列容量（背压阈值）")
+    arg_parser.add_argument('--table-dir', default='.')
+    arg_parser.add_argument('--preprocess', action='store_true', help="先经内置预处理器处理，每个进程内头文件只切分一次")
+    arg_parser.add_argument('-I', dest='include_dirs', action='append', default=[], help="头文件搜索目录")
+    arg_parser.add_argument('-D', dest='defines', action='append', default=[], help="预定义宏 NAME[=VALUE]")
+    arg_parser.add_argument('--columnar', action='store_true', help="输出列式二进制 .col 文件，代替 .yaml 与 .txt")
+    args = arg_parser.parse_args(argv)
+
+    preprocess_options = (args.include_dirs, parse_defines(args.defines)) if args.preprocess else None
+    pipeline = IngestPipeline(args.output_dir, args.table_dir, args.jobs, args.read_concurrency,
+                              args.write_concurrency, args.queue_size, preprocess_options,
+                              args.columnar)
+    try:
+        sources = collect_sources(args.sources)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    stats = asyncio.run(pipeline.run(sources))
+    for name, error in stats.errors:
+        print(f"{name}: {error}")
+    print(stats.report())
+    return 1 if stats.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
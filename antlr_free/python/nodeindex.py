@@ -0,0 +1,332 @@
+"""
+语法树结点的种类索引与查询
+
+分析时按归约顺序给结点编号（后序，与 nodestore.py 的结点编号相同），同时记录每个结点的符号、子树大小、首 token 与父结点，
+并把非终结符结点按种类追加到各自的编号数组中。后序下以 n 为根的子树恰好占据编号 [n - sizes[n] + 1, n]，
+各种类的编号数组天然有序，因此子孙查询与 token 区间查询只需二分定位，耗时与结果数成正比，与树的大小无关。
+祖先查询沿父结点上行，耗时不超过树的深度。
+"""
+import argparse
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from builder import EncodedTables
+from dfalexer import DfaLexer
+from nodestore import NodeStore
+from parser import EOF_ID, SemanticActions, load_encoded_tables, lr1_parse_actions
+
+class NodeIndex:
+    """
+    后序编号的结点表：symbols / sizes / first_tokens / parents 以结点编号为下标，根的父结点为 -1
+    token_nodes[i] 为第 i 个 token 的叶子结点编号；by_kind 为非终结符编号 -> 有序的结点编号数组
+    """
+    def __init__(self, names, n_terminals, lexeme, node=None):
+        self.names = names
+        self.symbol_ids = {name: symbol_id for symbol_id, name in enumerate(names)}
+        self.n_terminals = n_terminals
+        self.lexeme = lexeme
+        self.node_value = node
+        self.symbols = array('H')
+        self.sizes = array('I')
+        self.first_tokens = array('I')
+        self.parents = array('i')
+        self.token_nodes = array('I')
+        self.by_kind = {symbol_id: array('I') for symbol_id in range(n_terminals, len(names))}
+        self.values = None
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        由 nodestore.NodeStore 一次线性扫描建立索引；结点值按需从结点库重建
+        """
+        # 名字表即分析表的 symbols，终结符在前，最后一个终结符是 EOF
+        n_terminals = EOF_ID + 1
+        index = cls(store.names, n_terminals, store.lexeme, store.tree)
+        symbols = index.symbols
+        sizes = index.sizes
+        first_tokens = index.first_tokens
+        parents = index.parents
+        token_nodes = index.token_nodes
+        by_kind = index.by_kind
+        symbols.frombytes(store.symbols.tobytes())
+        sizes.frombytes(store.sizes.tobytes())
+        first_tokens.frombytes(store.first_tokens.tobytes())
+        parents.frombytes(array('i', [-1]).tobytes() * len(symbols))
+        open_nodes = []  # 尚未找到父结点的结点
+        for node, size in enumerate(sizes):
+            if size == 1:
+                token_nodes.append(node)
+            else:
+                low = node - size + 1
+                while open_nodes and open_nodes[-1] >= low:
+                    parents[open_nodes.pop()] = node
+                by_kind[symbols[node]].append(node)
+            open_nodes.append(node)
+        return index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def root(self):
+        return len(self.symbols) - 1
+
+    def kind_id(self, kind):
+        symbol_id = self.symbol_ids.get(kind)
+        if symbol_id is None or symbol_id < self.n_terminals:
+            raise ValueError(f"{kind} 不是文法中的非终结符")
+        return symbol_id
+
+    def label(self, node):
+        return self.names[self.symbols[node]]
+
+    def node(self, node):
+        """
+        结点编号对应的 (lhs, children) 子树
+        """
+        if self.values is not None:
+            return self.values[node]
+        return self.node_value(node)
+
+    def parent(self, node):
+        parent = self.parents[node]
+        return None if parent < 0 else parent
+
+    def children(self, node):
+        sizes = self.sizes
+        result = []
+        child = node - 1
+        low = node - sizes[node]
+        while child > low:
+            result.append(child)
+            child -= sizes[child]
+        result.reverse()
+        return result
+
+    def token_range(self, node):
+        """
+        结点覆盖的 token 下标区间 [起点, 终点)
+        """
+        # 后序下结点的最后一个叶子是编号不超过它的最后一个叶子
+        return self.first_tokens[node], bisect_right(self.token_nodes, node)
+
+    def text(self, node):
+        start, end = self.token_range(node)
+        return ' '.join(self.lexeme(index) for index in range(start, end))
+
+    def of_kind(self, kind):
+        """
+        某种非终结符的全部结点编号，按后序（结束位置）排列
+        """
+        return self.by_kind[self.kind_id(kind)].tolist()
+
+    def descendants(self, node, kind):
+        """
+        node 子树中（不含 node 本身）某种非终结符的结点
+        """
+        ids = self.by_kind[self.kind_id(kind)]
+        low = node - self.sizes[node] + 1
+        return ids[bisect_left(ids, low):bisect_left(ids, node)].tolist()
+
+    def ancestors(self, node, kind=None):
+        """
+        由近及远的祖先结点；给出 kind 时只保留该种类
+        """
+        symbol_id = None if kind is None else self.kind_id(kind)
+        parents = self.parents
+        symbols = self.symbols
+        result = []
+        node = parents[node]
+        while node >= 0:
+            if symbol_id is None or symbols[node] == symbol_id:
+                result.append(node)
+            node = parents[node]
+        return result
+
+    def enclosing(self, node, kind):
+        """
+        最近的某种祖先，没有时为 None
+        """
+        symbol_id = self.kind_id(kind)
+        parents = self.parents
+        symbols = self.symbols
+        node = parents[node]
+        while node >= 0 and symbols[node] != symbol_id:
+            node = parents[node]
+        return None if node < 0 else node
+
+    def inside(self, kind, ancestor_kind):
+        """
+        位于某种祖先之内的 kind 结点，如函数体内的 jumpStatement
+        """
+        ids = self.by_kind[self.kind_id(kind)]
+        sizes = self.sizes
+        result = []
+        # 后序中外层结点排在内层之后：从后往前只取最外层的祖先，避免重复
+        outer = []
+        low = None
+        for ancestor in reversed(self.by_kind[self.kind_id(ancestor_kind)]):
+            if low is not None and ancestor >= low:
+                continue
+            low = ancestor - sizes[ancestor] + 1
+            outer.append((low, ancestor))
+        for low, ancestor in reversed(outer):
+            result.extend(ids[bisect_left(ids, low):bisect_left(ids, ancestor)])
+        return result
+
+    def containing(self, kind, descendant_kind):
+        """
+        子树中含有某种结点的 kind 结点，如含 goto 的函数；按后序排列
+        """
+        symbol_id = self.kind_id(kind)
+        parents = self.parents
+        symbols = self.symbols
+        found = set()
+        visited = set()
+        for node in self.by_kind[self.kind_id(descendant_kind)]:
+            node = parents[node]
+            # 上行到已走过的祖先即可停止，每个结点至多经过一次
+            while node >= 0 and node not in visited:
+                visited.add(node)
+                if symbols[node] == symbol_id:
+                    found.add(node)
+                node = parents[node]
+        return sorted(found)
+
+    def within(self, start, end, kind=None):
+        """
+        完全落在 token 区间 [start, end) 内的结点；不给 kind 时包括叶子
+        """
+        token_nodes = self.token_nodes
+        if start >= end or start >= len(token_nodes):
+            return []
+        low = token_nodes[start]
+        # 最后一个 token 之后的结点都在下一个 token 的叶子之前归约
+        high = token_nodes[end] if end < len(token_nodes) else len(self.symbols)
+        sizes = self.sizes
+        if kind is None:
+            candidates = range(low, high)
+        else:
+            ids = self.by_kind[self.kind_id(kind)]
+            candidates = ids[bisect_left(ids, low):bisect_left(ids, high)]
+        # 编号在区间内但从 start 之前开始的只有跨越 start 的祖先，不超过树的深度
+        return [node for node in candidates if node - sizes[node] + 1 >= low]
+
+    def at(self, position, kind=None):
+        """
+        覆盖第 position 个 token 的结点，由内向外，从叶子开始
+        """
+        leaf = self.token_nodes[position]
+        if kind is None:
+            return [leaf] + self.ancestors(leaf)
+        return self.ancestors(leaf, kind)
+
+def index_actions(index: NodeIndex, tables: EncodedTables, pool=None):
+    """
+    建立 index 的语义动作：栈上的值为结点编号，结点的语法树存入 index.values，与 lr1_parse_encoded 的结果相同
+    """
+    leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+    symbol_ids = index.symbol_ids
+    node_symbols = index.symbols
+    node_sizes = index.sizes
+    node_first_tokens = index.first_tokens
+    parents = index.parents
+    token_nodes = index.token_nodes
+    index.values = node_values = []
+    actions = SemanticActions()
+
+    def add_leaf(type_name, text):
+        node = len(node_values)
+        node_values.append(leaf(type_name, text))
+        node_symbols.append(symbol_ids[type_name])
+        node_sizes.append(1)
+        node_first_tokens.append(len(token_nodes))
+        parents.append(-1)
+        token_nodes.append(node)
+        return node
+
+    def add_node(lhs, name):
+        kind = index.by_kind[lhs]
+
+        # 文法中没有空产生式，至少有一个子结点
+        def reduce(*child_ids):
+            node = len(node_values)
+            for child in child_ids:
+                parents[child] = node
+            first = child_ids[0]
+            node_values.append((name, [node_values[child] for child in child_ids]))
+            node_symbols.append(lhs)
+            # 子树从第一个子结点的子树开始
+            node_sizes.append(node - first + node_sizes[first])
+            node_first_tokens.append(node_first_tokens[first])
+            parents.append(-1)
+            kind.append(node)
+            return node
+        return reduce
+
+    actions.token(*tables.symbols[:tables.n_terminals])(add_leaf)
+    for lhs in range(tables.n_terminals, len(tables.symbols)):
+        actions.reduce(tables.symbols[lhs])(add_node(lhs, tables.symbols[lhs]))
+    return actions
+
+def lr1_parse_indexed(tokens, tables: EncodedTables, pool=None):
+    """
+    LR(1) 分析，同时建立 NodeIndex；返回 (语法树, 索引)，语法树与 lr1_parse_encoded 相同
+    """
+    index = NodeIndex(tables.symbols, tables.n_terminals, tokens.lexeme)
+    root = lr1_parse_actions(tokens, tables, index_actions(index, tables, pool))
+    return index.values[root], index
+
+def token_range_arg(text):
+    start, _, end = text.partition(':')
+    try:
+        return int(start), int(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"token 区间应为 START:END，而不是 {text}")
+
+def print_query(file_path, index: NodeIndex, args):
+    if args.inside:
+        nodes = index.inside(args.kind, args.inside)
+    else:
+        nodes = index.of_kind(args.kind)
+    if args.containing:
+        selected = set(index.containing(args.kind, args.containing))
+        nodes = [node for node in nodes if node in selected]
+    if args.range:
+        selected = set(index.within(*args.range, args.kind))
+        nodes = [node for node in nodes if node in selected]
+    for node in nodes:
+        start, end = index.token_range(node)
+        text = index.text(node)
+        print(f"{file_path}: {node} {args.kind} [{start}, {end}) {text[:60] + '…' if len(text) > 60 else text}")
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="按结点种类、祖先/子孙关系与 token 区间查询语法树")
+    arg_parser.add_argument('files', nargs='+', help="C 源文件；--store 时为 nodestore.py 生成的结点库")
+    arg_parser.add_argument('--kind', required=True, help="要查找的非终结符，如 functionDefinition")
+    arg_parser.add_argument('--inside', metavar='KIND', help="只保留位于该种祖先之内的结点")
+    arg_parser.add_argument('--containing', metavar='KIND', help="只保留子树中含有该种结点的结点")
+    arg_parser.add_argument('--range', type=token_range_arg, metavar='START:END', help="只保留落在该 token 区间内的结点")
+    arg_parser.add_argument('--store', action='store_true', help="从结点库读取，不重新分析")
+    arg_parser.add_argument('--table-dir', default='.')
+    args = arg_parser.parse_args(argv)
+
+    tables = None if args.store else load_encoded_tables(args.table_dir)
+    status = 0
+    for file_path in args.files:
+        try:
+            if args.store:
+                with NodeStore.open(file_path) as store:
+                    print_query(file_path, NodeIndex.from_store(store), args)
+            else:
+                with open(file_path, 'r') as file:
+                    _, index = lr1_parse_indexed(DfaLexer(file.read()).tokenize(), tables)
+                print_query(file_path, index, args)
+        except (RuntimeError, SyntaxError, ValueError) as e:
+            print(f"{file_path}: {e}")
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+磁盘上的语法树结点库
+
+分析时每归约出一个结点就把它追加到磁盘上的列中，内存里只保留尚未归约完的状态栈与每层的 (子树大小, 首 token)，
+峰值内存只随嵌套深度增长，与文件长度无关。输入文件经 mmap 按字节流式切分，已分析过的页面随时交还给内核。
+与 columnar.py 由整棵树按先序写出不同，结点在归约时才完整，因此按后序追加。
+
+结点库是一个目录，各列为本机字节序的定长整数数组：
+- symbols（uint16）：按后序排列的结点符号编号，编号即 meta 中名字表的下标（终结符在前）
+- sizes（uint32）：以该结点为根的子树的结点数，叶子为 1；子树占据后序编号 [n - sizes[n] + 1, n]
+- first_tokens（uint32）：子树的第一个 token 的下标；叶子即其 token
+- token_types（uint16）、lexeme_offsets（int64，token 数 + 1 个）与 lexemes（UTF-8 拼接）：token 流
+- meta：int64 的 MAGIC, VERSION, token 数, 结点数, 词素字节数，随后是以换行分隔的名字表；最后写入，存在即表示结点库完整
+"""
+import argparse
+import mmap
+import os
+import sys
+from array import array
+
+from builder import EncodedTables
+from parser import EOF_ID, SemanticActions, SpanLexer, gc_paused, load_encoded_tables, lr1_parse_actions_stream
+
+MAGIC = 0x4e434353  # b'SCCN'
+VERSION = 1
+META_SIZE = 5
+CHUNK = 1 << 16
+RELEASE_BYTES = 16 << 20
+COLUMNS = {'symbols': 'H', 'sizes': 'I', 'first_tokens': 'I', 'token_types': 'H', 'lexeme_offsets': 'q'}
+
+class NodeStoreWriter:
+    """
+    按列追加结点与 token，攒满 CHUNK 个后写入对应文件
+    """
+    def __init__(self, path, names):
+        self.path = path
+        self.names = names
+        os.makedirs(path, exist_ok=True)
+        # 先删去旧的 meta，写到一半失败时不会留下看似完整的结点库
+        if os.path.exists(os.path.join(path, 'meta')):
+            os.remove(os.path.join(path, 'meta'))
+        self.files = {name: open(os.path.join(path, name), 'wb') for name in list(COLUMNS) + ['lexemes']}
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.columns['lexeme_offsets'].append(0)
+        self.lexemes = bytearray()
+        self.lexeme_bytes = 0
+        self.n_tokens = 0
+        self.n_nodes = 0
+
+    def flush(self):
+        for name, column in self.columns.items():
+            column.tofile(self.files[name])
+            del column[:]
+        self.files['lexemes'].write(self.lexemes)
+        self.lexeme_bytes += len(self.lexemes)
+        del self.lexemes[:]
+
+    def close(self):
+        """
+        写出剩余的列与 meta，之后结点库可由 NodeStore 打开
+        """
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        meta = array('q', [MAGIC, VERSION, self.n_tokens, self.n_nodes, self.lexeme_bytes])
+        with open(os.path.join(self.path, 'meta'), 'wb') as file:
+            file.write(meta.tobytes())
+            file.write('\n'.join(self.names).encode('utf-8'))
+
+    def abort(self):
+        """
+        分析失败时删去已写出的列文件
+        """
+        for name, file in self.files.items():
+            file.close()
+            os.remove(os.path.join(self.path, name))
+        if not os.listdir(self.path):
+            os.rmdir(self.path)
+
+def store_actions(writer: NodeStoreWriter, tables: EncodedTables):
+    """
+    把结点写入 writer 的语义动作：栈上的值为 (子树大小, 首 token 下标)，开始符号的值即 (结点数, 0)
+    """
+    symbol_ids = {name: symbol_id for symbol_id, name in enumerate(tables.symbols)}
+    columns = writer.columns
+    node_symbols = columns['symbols']
+    node_sizes = columns['sizes']
+    node_first_tokens = columns['first_tokens']
+    token_types = columns['token_types']
+    lexeme_offsets = columns['lexeme_offsets']
+    lexemes = writer.lexemes
+    offset = 0
+    actions = SemanticActions()
+
+    def add_leaf(type_name, text):
+        nonlocal offset
+        token_id = symbol_ids[type_name]
+        position = writer.n_tokens
+        node_symbols.append(token_id)
+        node_sizes.append(1)
+        node_first_tokens.append(position)
+        token_types.append(token_id)
+        lexeme = text.encode('utf-8', 'surrogateescape')
+        lexemes.extend(lexeme)
+        offset += len(lexeme)
+        lexeme_offsets.append(offset)
+        writer.n_tokens = position + 1
+        if len(node_symbols) >= CHUNK:
+            writer.flush()
+        return 1, position
+
+    def add_node(lhs):
+        def reduce(*children):
+            size = 1
+            for child_size, _ in children:
+                size += child_size
+            first_token = children[0][1]
+            node_symbols.append(lhs)
+            node_sizes.append(size)
+            node_first_tokens.append(first_token)
+            return size, first_token
+        return reduce
+
+    actions.token(*tables.symbols[:tables.n_terminals])(add_leaf)
+    for lhs in range(tables.n_terminals, len(tables.symbols)):
+        actions.reduce(tables.symbols[lhs])(add_node(lhs))
+    return actions
+
+def token_texts(tokens, buffer):
+    """
+    把 (类型编号, 起点, 终点) 转为 (类型编号, 词素)，并把已切分过的页面交还给内核
+    """
+    release = getattr(buffer, 'madvise', None) if hasattr(mmap, 'MADV_DONTNEED') else None
+    released = 0
+    for token_id, start, end in tokens:
+        if token_id == EOF_ID:
+            yield token_id, 'EOF'
+            continue
+        # 非 UTF-8 字节原样写回结点库
+        yield token_id, bytes(buffer[start:end]).decode('utf-8', 'surrogateescape')
+        if release is not None and start - released >= RELEASE_BYTES:
+            boundary = start - start % mmap.PAGESIZE
+            release(mmap.MADV_DONTNEED, released, boundary - released)
+            released = boundary
+
+def build_node_store(tokens, buffer, tables: EncodedTables, path):
+    """
+    分析 tokens（以 EOF 结尾的 (类型编号, 起点, 终点) 可迭代对象，如 SpanLexer.stream()），结点随归约写入 path
+    buffer 为源码字节（可为 mmap），返回 (token 数, 结点数)；出错时抛出与 lr1_parse_encoded 相同的 SyntaxError
+    """
+    writer = NodeStoreWriter(path, tables.symbols)
+    try:
+        writer.n_nodes, _ = lr1_parse_actions_stream(token_texts(tokens, buffer), tables, store_actions(writer, tables))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.n_tokens, writer.n_nodes
+
+def build_node_store_from_file(file_path, tables, path):
+    """
+    以 mmap 映射源文件，边切分边分析，结点写入 path
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return build_node_store(SpanLexer(b'').stream(), b'', tables, path)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return build_node_store(SpanLexer(buffer).stream(), buffer, tables, path)
+
+class NodeStore:
+    """
+    只读打开结点库：各列以 mmap 映射，只按需读取
+    结点以后序编号标识，根为 n_nodes - 1
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta'), 'rb') as file:
+            data = file.read()
+        meta = array('q')
+        meta.frombytes(data[:META_SIZE * 8])
+        magic, version, self.n_tokens, self.n_nodes, lexeme_size = meta.tolist()
+        if magic != MAGIC:
+            raise ValueError("不是结点库，或结点库的字节序与本机不同")
+        if version != VERSION:
+            raise ValueError(f"结点库版本 {version} 与当前版本 {VERSION} 不符")
+        self.names = data[META_SIZE * 8:].decode('utf-8').split('\n')
+        self.maps = []
+        self.symbols = self.map_column('symbols')
+        self.sizes = self.map_column('sizes')
+        self.first_tokens = self.map_column('first_tokens')
+        self.token_types = self.map_column('token_types')
+        self.lexeme_offsets = self.map_column('lexeme_offsets')
+        self.lexemes = self.map_column('lexemes', None)
+        self.root = self.n_nodes - 1
+
+    def map_column(self, name, typecode='B'):
+        with open(os.path.join(self.path, name), 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return memoryview(b'')
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(buffer)
+        view = memoryview(buffer)
+        return view.cast(COLUMNS[name]) if name in COLUMNS else view
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def label(self, node):
+        return self.names[self.symbols[node]]
+
+    def is_leaf(self, node):
+        # 文法中没有空产生式，非终结符结点至少有一个子结点
+        return self.sizes[node] == 1
+
+    def lexeme(self, index):
+        offsets = self.lexeme_offsets
+        return str(self.lexemes[offsets[index]:offsets[index + 1]], 'utf-8', 'surrogateescape')
+
+    def token(self, index):
+        return (self.names[self.token_types[index]], self.lexeme(index))
+
+    def children(self, node):
+        """
+        结点的子结点编号，按从左到右的顺序
+        """
+        sizes = self.sizes
+        result = []
+        child = node - 1
+        low = node - sizes[node]
+        while child > low:
+            result.append(child)
+            child -= sizes[child]
+        result.reverse()
+        return result
+
+    def token_range(self, node):
+        """
+        结点覆盖的 token 下标区间 [起点, 终点)
+        """
+        sizes = self.sizes
+        last = node
+        # 沿最右的子结点下降到最后一个叶子
+        while sizes[last] > 1:
+            last -= 1
+        return self.first_tokens[node], self.first_tokens[last] + 1
+
+    def text(self, node):
+        start, end = self.token_range(node)
+        return ' '.join(self.lexeme(index) for index in range(start, end))
+
+    def tree(self, node=None):
+        """
+        重建以 node（缺省为根）为根的 (lhs, children) 语法树，与 lr1_parse_encoded 的结果相同
+        """
+        if node is None:
+            node = self.root
+        names = self.names
+        symbols = self.symbols
+        sizes = self.sizes
+        first_tokens = self.first_tokens
+        stack = []  # (结点编号, 值)
+        with gc_paused():
+            for current in range(node - sizes[node] + 1, node + 1):
+                size = sizes[current]
+                if size == 1:
+                    stack.append((current, self.token(first_tokens[current])))
+                    continue
+                low = current - size + 1
+                split = len(stack)
+                while split and stack[split - 1][0] >= low:
+                    split -= 1
+                children = [value for _, value in stack[split:]]
+                del stack[split:]
+                stack.append((current, (names[symbols[current]], children)))
+        return stack[-1][1]
+
+    def close(self):
+        for view in (self.symbols, self.sizes, self.first_tokens, self.token_types, self.lexeme_offsets, self.lexemes):
+            view.release()
+        for buffer in self.maps:
+            buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="把语法树写入磁盘上的结点库，或查看已有的结点库")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="分析 C 文件，结点随归约写入结点库")
+    build_parser.add_argument('file')
+    build_parser.add_argument('-o', '--output', default='ast.nodes')
+    build_parser.add_argument('--table-dir', default='.')
+    show_parser = subparsers.add_parser('show', help="查看结点库中的结点")
+    show_parser.add_argument('store')
+    show_parser.add_argument('--node', type=int, default=None, help="结点编号，缺省为根")
+    show_parser.add_argument('--yaml', action='store_true', help="以 ast.yaml 的格式输出该结点的子树")
+    args = arg_parser.parse_args(argv)
+
+    if args.command == 'build':
+        try:
+            n_tokens, n_nodes = build_node_store_from_file(args.file, load_encoded_tables(args.table_dir), args.output)
+        except (RuntimeError, SyntaxError) as e:
+            print(f"{args.file}: {e}")
+            return 1
+        print(f"{n_tokens} 个 token，{n_nodes} 个结点，已写入 {args.output}")
+        return 0
+
+    with NodeStore.open(args.store) as store:
+        node = store.root if args.node is None else args.node
+        if args.yaml:
+            from parser import dump_ast_yaml
+            try:
+                dump_ast_yaml(store.tree(node), sys.stdout)
+            except ValueError as e:
+                print(f"{args.store}: {e}")
+                return 1
+            return 0
+        start, end = store.token_range(node)
+        print(f"{store.n_tokens} 个 token，{store.n_nodes} 个结点")
+        print(f"结点 {node}：{store.label(node)}，token [{start}, {end})")
+        for child in store.children(node):
+            text = store.text(child)
+            print(f"  {child}: {store.label(child)}  {text[:60] + '…' if len(text) > 60 else text}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
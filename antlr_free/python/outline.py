@@ -0,0 +1,317 @@
+"""
+延迟解析函数体与顶层声明提纲
+
+DeferredParser 分析时不展开 functionDefinition 的函数体：在开始函数体的状态上遇到 LeftBrace 时，
+按括号配对直接跳到对应的 RightBrace，并以 compoundStatement 转移，语法树中只留下记录 token 区间的 DeferredBody。
+调用方需要某个函数体时，DeferredBody.tree() 从同一状态开始单独分析这一段并缓存结果，得到的子树与完整分析相同。
+函数体内部的语法错误在展开该函数体时报告；顶层出错时先检查已跳过的函数体，保证报告的是第一个错误。
+"""
+import argparse
+import re
+import sys
+
+from builder import EncodedTables
+from dfalexer import DfaLexer
+from parser import TOKEN_IDS, dump_ast_yaml, gc_paused, load_encoded_tables
+
+LEFT_BRACE = TOKEN_IDS['LeftBrace']
+RIGHT_BRACE = TOKEN_IDS['RightBrace']
+BRACES = re.compile(b'[' + re.escape(bytes([LEFT_BRACE])) + re.escape(bytes([RIGHT_BRACE])) + b']')
+
+def body_states(tables: EncodedTables):
+    """
+    开始函数体的状态：经 compoundStatement 转移到的状态只能按 functionDefinition 的产生式归约
+    """
+    compound = tables.symbol_ids['compoundStatement']
+    function = tables.symbol_ids['functionDefinition']
+    states = set()
+    for state, goto_row in enumerate(tables.goto_rows):
+        target = goto_row.get(compound)
+        if target is None:
+            continue
+        actions = tables.action_rows[target].values()
+        if actions and all(action < 0 and action != EncodedTables.ACCEPT and tables.productions[~action][0] == function
+                           for action in actions):
+            states.add(state)
+    return frozenset(states)
+
+def brace_pairs(types):
+    """
+    LeftBrace 下标 -> 与之配对的 RightBrace 下标；types 为 array('B') 类型编号序列
+    """
+    pairs = {}
+    opened = []
+    for m in BRACES.finditer(bytes(types)):
+        if types[m.start()] == LEFT_BRACE:
+            opened.append(m.start())
+        elif opened:
+            pairs[opened.pop()] = m.start()
+    return pairs
+
+class DeferredBody:
+    """
+    尚未分析的函数体：tokens[start:end + 1]，从状态 state 开始可归约为 compoundStatement
+    """
+    __slots__ = ('parser', 'tokens', 'state', 'start', 'end', '_tree')
+
+    def __init__(self, parser, tokens, state, start, end):
+        self.parser = parser
+        self.tokens = tokens
+        self.state = state
+        self.start = start
+        self.end = end
+        self._tree = None
+
+    @property
+    def parsed(self):
+        return self._tree is not None
+
+    def tree(self):
+        """
+        分析并缓存函数体，返回 ('compoundStatement', children)
+        """
+        if self._tree is None:
+            self._tree = self.parser.parse_body(self)
+        return self._tree
+
+    def __repr__(self):
+        return f"DeferredBody(tokens {self.start}..{self.end})"
+
+class DeferredParser:
+    """
+    跳过函数体的 LR(1) 分析器，其余部分与 lr1_parse_encoded 相同
+    """
+    def __init__(self, tables: EncodedTables, pool=None):
+        self.tables = tables
+        self.pool = pool
+        self.body_states = body_states(tables)
+        self.compound = tables.symbol_ids['compoundStatement']
+
+    def parse(self, tokens):
+        """
+        分析 tokens（TokenIds 或 TokenSpans），函数体以 ('compoundStatement', DeferredBody) 结点代替
+        """
+        tables = self.tables
+        action_rows = tables.action_rows
+        goto_rows = tables.goto_rows
+        productions = tables.productions
+        symbols = tables.symbols
+        body_states = self.body_states
+        compound = self.compound
+        types = tokens.types
+        lexeme = tokens.lexeme
+        leaf = self.pool.leaf if self.pool is not None else lambda type_name, text: (type_name, text)
+        last = len(types) - 1
+        pairs = None
+        bodies = []
+        states = [0]
+        values = []
+        index = 0
+        token_id = types[0]
+        with gc_paused():
+            while True:
+                state = states[-1]
+                action = action_rows[state].get(token_id)
+                if action is None:
+                    self.check_bodies(bodies)
+                    raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+                if action >= 0:
+                    if token_id == LEFT_BRACE and state in body_states:
+                        if pairs is None:
+                            pairs = brace_pairs(types)
+                        end = pairs.get(index)
+                        # 括号不配对时照常分析，错误在原处报告
+                        if end is not None:
+                            body = DeferredBody(self, tokens, state, index, end)
+                            bodies.append(body)
+                            states.append(goto_rows[state][compound])
+                            values.append(('compoundStatement', body))
+                            index = end + 1
+                            token_id = types[index]
+                            continue
+                    states.append(action)
+                    values.append(leaf(symbols[token_id], lexeme(index)))
+                    if index < last:
+                        index += 1
+                        token_id = types[index]
+                elif action == EncodedTables.ACCEPT:
+                    return values[-1]
+                else:
+                    lhs, length = productions[~action]
+                    if length:
+                        children = values[-length:]
+                        del values[-length:]
+                        del states[-length:]
+                    else:
+                        children = []
+                    goto_state = goto_rows[states[-1]].get(lhs)
+                    if goto_state is None:
+                        self.check_bodies(bodies)
+                        raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                    states.append(goto_state)
+                    values.append((symbols[lhs], children))
+
+    @staticmethod
+    def check_bodies(bodies):
+        """
+        顶层出错时按顺序展开已跳过的函数体，其中的错误位置更靠前，先报告
+        """
+        for body in bodies:
+            body.tree()
+
+    def parse_body(self, body: DeferredBody):
+        """
+        从函数体开始的状态分析 tokens[start:end + 1]（end 之后的 token 作为向前看），
+        归约出 compoundStatement 回到起始状态时结束
+        """
+        tables = self.tables
+        action_rows = tables.action_rows
+        goto_rows = tables.goto_rows
+        productions = tables.productions
+        symbols = tables.symbols
+        compound = self.compound
+        types = body.tokens.types
+        lexeme = body.tokens.lexeme
+        leaf = self.pool.leaf if self.pool is not None else lambda type_name, text: (type_name, text)
+        last = len(types) - 1
+        states = [body.state]
+        values = []
+        index = body.start
+        token_id = types[index]
+        with gc_paused():
+            while True:
+                action = action_rows[states[-1]].get(token_id)
+                if action is None:
+                    raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+                if action >= 0:
+                    states.append(action)
+                    values.append(leaf(symbols[token_id], lexeme(index)))
+                    if index < last:
+                        index += 1
+                        token_id = types[index]
+                else:
+                    lhs, length = productions[~action]
+                    if length:
+                        children = values[-length:]
+                        del values[-length:]
+                        del states[-length:]
+                    else:
+                        children = []
+                    if lhs == compound and len(states) == 1:
+                        return (symbols[lhs], children)
+                    goto_state = goto_rows[states[-1]].get(lhs)
+                    if goto_state is None:
+                        raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                    states.append(goto_state)
+                    values.append((symbols[lhs], children))
+
+def expand(tree):
+    """
+    展开全部函数体，返回与 lr1_parse_encoded 相同的语法树
+    """
+    root = []
+    stack = [(tree, root)]
+    with gc_paused():
+        while stack:
+            node, parent = stack.pop()
+            label, value = node
+            if isinstance(value, DeferredBody):
+                value = value.tree()[1]
+            if isinstance(value, list):
+                children = []
+                parent.append((label, children))
+                stack.extend((child, children) for child in reversed(value))
+            else:
+                parent.append(node)
+    return root[0]
+
+def leaves(node):
+    """
+    按顺序产出子树中的叶子；未展开的函数体不进入
+    """
+    stack = [node]
+    while stack:
+        label, value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(reversed(value))
+        elif not isinstance(value, DeferredBody):
+            yield label, value
+
+def external_declarations(tree):
+    """
+    按源码顺序返回顶层的 externalDeclaration 结点
+    """
+    unit = tree[1][0]
+    declarations = []
+    # translationUnit 左递归：沿最左子结点向下
+    while unit[0] == 'translationUnit':
+        children = unit[1]
+        declarations.append(children[-1])
+        unit = children[0] if len(children) == 2 else None
+        if unit is None:
+            break
+    return declarations[::-1]
+
+def outline(tree):
+    """
+    顶层提纲：每个外部声明为 (种类, 名字, 文本)
+    函数的文本为其签名（声明说明符与声明符），函数体不被展开；声明的名字为第一个声明符中的标识符
+    """
+    entries = []
+    for external in external_declarations(tree):
+        node = external[1][0]
+        if node[0] == 'functionDefinition':
+            signature = node[1][:2]
+            name = next((text for label, text in leaves(signature[1]) if label == 'Identifier'), None)
+            text = ' '.join(text for child in signature for _, text in leaves(child))
+            entries.append(('function', name, text))
+        else:
+            tokens = list(leaves(node))
+            init_declarators = [child for child in node[1] if child[0] == 'initDeclaratorList']
+            name = None
+            if init_declarators:
+                name = next((text for label, text in leaves(init_declarators[0]) if label == 'Identifier'), None)
+            entries.append(('declaration', name, ' '.join(text for _, text in tokens)))
+    return entries
+
+def function_bodies(tree):
+    """
+    函数名 -> DeferredBody
+    """
+    bodies = {}
+    for external in external_declarations(tree):
+        node = external[1][0]
+        if node[0] == 'functionDefinition' and isinstance(node[1][-1][1], DeferredBody):
+            name = next((text for label, text in leaves(node[1][1]) if label == 'Identifier'), None)
+            bodies[name] = node[1][-1][1]
+    return bodies
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="不分析函数体，输出 C 文件的顶层声明与函数签名")
+    arg_parser.add_argument('files', nargs='+')
+    arg_parser.add_argument('--body', metavar='NAME', help="展开并以 YAML 输出该函数的函数体")
+    arg_parser.add_argument('--table-dir', default='.')
+    args = arg_parser.parse_args(argv)
+    parser = DeferredParser(load_encoded_tables(args.table_dir))
+    status = 0
+    for file_path in args.files:
+        try:
+            with open(file_path, 'r') as file:
+                tree = parser.parse(DfaLexer(file.read()).tokenize())
+            if args.body:
+                body = function_bodies(tree).get(args.body)
+                if body is None:
+                    print(f"{file_path}: 没有函数 {args.body}")
+                    status = 1
+                    continue
+                dump_ast_yaml(body.tree(), sys.stdout)
+                continue
+            for kind, name, text in outline(tree):
+                print(f"{file_path}: {kind} {name}: {text}")
+        except (RuntimeError, SyntaxError, ValueError) as e:
+            print(f"{file_path}: {e}")
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,24 @@
+import argparse
+import gc
+import json
+import mmap
+import os
 import re
+import sys
+from array import array
+from contextlib import contextmanager
 import pickle  # 用于加载解析表
 from enum import Enum
-from builder import Item
+from builder import Item, EncodedTables, OptimizedTables, encode_tables, grammar_rules, optimize_tables
 import yaml
 
 class ActionTable:
     """
     Action 表
     """
-    def __init__(self, table):
+    def __init__(self, table, conflicts=None):
         self.table = table  # 直接传入已加载的表
+        self.conflicts = conflicts  # 冲突中被舍弃的动作，旧版 builder.py 生成的表中没有
 
     def get(self, state_id, symbol):
         entry = self.table.get(state_id, {}).get(symbol)
@@ -67,9 +76,7 @@ def lr1_parse(tokens, action_table: ActionTable, goto_table: GotoTable):
     while True:
         state = stack.top()
         token = tokens[index] if index < len(tokens) else ('EOF', 'EOF')
-        print(token)
         action = action_table.get(state, token[0])
-        print(action)
         if not action:
             raise SyntaxError(f"Unexpected token {token} at position {index}")
         if action[0] == 'shift':
@@ -88,7 +95,6 @@ def lr1_parse(tokens, action_table: ActionTable, goto_table: GotoTable):
                 pass
             state = stack.top()
             goto_state = goto_table.get(state, lhs)
-            print(goto_state)
             if goto_state is None:
                 raise SyntaxError(f"No transition for non-terminal {lhs} from state {state}")
             stack.push(goto_state)
@@ -96,25 +102,490 @@ def lr1_parse(tokens, action_table: ActionTable, goto_table: GotoTable):
         elif action[0] == 'accept':
             return ast_stack[-1]
 
-def indent(xml_lines):
+@contextmanager
+def gc_paused():
     """
-    格式化 XML 行列表，添加适当的缩进。
+    语法树无环，分析期间暂停循环垃圾回收，避免其反复遍历不断增长的树
     """
-    indent_level = 0
-    indent_space = "    "
-    indented_lines = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def lr1_parse_encoded(tokens, tables: EncodedTables, pool=None):
+    """
+    基于整数编码解析表的 LR(1) 分析，生成与 lr1_parse 相同的语法树
+    tokens 需提供 types（类型编号序列，以 EOF 结尾）与 lexeme(i)，如 TokenIds 或 TokenSpans
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    types = tokens.types
+    lexeme = tokens.lexeme
+    leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+    last = len(types) - 1
+    states = [0]
+    values = []
+    index = 0
+    token_id = types[0]
+    with gc_paused():
+        while True:
+            action = action_rows[states[-1]].get(token_id)
+            if action is None:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if action >= 0:
+                states.append(action)
+                values.append(leaf(symbols[token_id], lexeme(index)))
+                if index < last:
+                    index += 1
+                    token_id = types[index]
+            elif action == EncodedTables.ACCEPT:
+                return values[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    children = values[-length:]
+                    del values[-length:]
+                    del states[-length:]
+                else:
+                    children = []
+                goto_state = goto_rows[states[-1]].get(lhs)
+                if goto_state is None:
+                    raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                states.append(goto_state)
+                values.append((symbols[lhs], children))
+
+def lr1_validate_encoded(tokens, tables: EncodedTables):
+    """
+    只做识别的 LR(1) 分析：只维护状态栈，不构造语法树，内存只随嵌套深度增长
+    tokens 为以 EOF 结尾的 (类型编号, 词素) 可迭代对象，如 IdLexer.stream() 或 zip(TokenIds.types, TokenIds.lexemes)
+    成功时返回 token 数，出错时抛出与 lr1_parse_encoded 相同的 SyntaxError
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    tokens = iter(tokens)
+    states = [0]
+    index = 0
+    token_id, lexeme = next(tokens)
+    while True:
+        action = action_rows[states[-1]].get(token_id)
+        if action is None:
+            raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme)} at position {index}")
+        if action >= 0:
+            states.append(action)
+            # 移进 EOF 之后与 lr1_parse_encoded 一样继续以 EOF 为向前看
+            token = next(tokens, None)
+            if token is not None:
+                index += 1
+                token_id, lexeme = token
+        elif action == EncodedTables.ACCEPT:
+            return index + 1
+        else:
+            lhs, length = productions[~action]
+            if length:
+                del states[-length:]
+            goto_state = goto_rows[states[-1]].get(lhs)
+            if goto_state is None:
+                raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+            states.append(goto_state)
+
+def lr1_parse_flat(tokens, tables, pool=None):
+    """
+    基于扁平整数解析表（tablefile.FlatTables）的 LR(1) 分析，生成与 lr1_parse_encoded 相同的语法树
+    动作与转移直接从指向共享缓冲区的行中读取，不构造任何逐状态的 dict
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    n_terminals = tables.n_terminals
+    productions = tables.productions
+    symbols = tables.symbols
+    error = tables.ERROR
+    types = tokens.types
+    lexeme = tokens.lexeme
+    leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+    last = len(types) - 1
+    states = [0]
+    values = []
+    index = 0
+    token_id = types[0]
+    with gc_paused():
+        while True:
+            action = action_rows[states[-1]][token_id]
+            if action == error:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if action >= 0:
+                states.append(action)
+                values.append(leaf(symbols[token_id], lexeme(index)))
+                if index < last:
+                    index += 1
+                    token_id = types[index]
+            elif action == EncodedTables.ACCEPT:
+                return values[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    children = values[-length:]
+                    del values[-length:]
+                    del states[-length:]
+                else:
+                    children = []
+                goto_state = goto_rows[states[-1]][lhs - n_terminals]
+                if goto_state < 0:
+                    raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                states.append(goto_state)
+                values.append((symbols[lhs], children))
+
+def lr1_validate_flat(tokens, tables):
+    """
+    基于扁平整数解析表（tablefile.FlatTables）的 lr1_validate_encoded
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    n_terminals = tables.n_terminals
+    productions = tables.productions
+    symbols = tables.symbols
+    error = tables.ERROR
+    tokens = iter(tokens)
+    states = [0]
+    index = 0
+    token_id, lexeme = next(tokens)
+    while True:
+        action = action_rows[states[-1]][token_id]
+        if action == error:
+            raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme)} at position {index}")
+        if action >= 0:
+            states.append(action)
+            # 移进 EOF 之后与 lr1_parse_encoded 一样继续以 EOF 为向前看
+            token = next(tokens, None)
+            if token is not None:
+                index += 1
+                token_id, lexeme = token
+        elif action == EncodedTables.ACCEPT:
+            return index + 1
+        else:
+            lhs, length = productions[~action]
+            if length:
+                del states[-length:]
+            goto_state = goto_rows[states[-1]][lhs - n_terminals]
+            if goto_state < 0:
+                raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+            states.append(goto_state)
+
+def lr1_parse_optimized(tokens, tables: OptimizedTables, pool=None):
+    """
+    基于 optimize_tables 优化表的 LR(1) 分析：单元归约链一步完成，查不到向前看时执行默认归约
+    生成的语法树与报错的 token 均与 lr1_parse 相同
+    """
+    action_rows = tables.action_rows
+    default_actions = tables.default_actions
+    unit_chains = tables.unit_chains
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    n_terminals = tables.n_terminals
+    types = tokens.types
+    lexeme = tokens.lexeme
+    leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+    last = len(types) - 1
+    states = [0]
+    values = []
+    index = 0
+    token_id = types[0]
+    with gc_paused():
+        while True:
+            state = states[-1]
+            action = action_rows[state].get(token_id, default_actions[state])
+            if action is None:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if action >= 0:
+                states.append(action)
+                values.append(leaf(symbols[token_id], lexeme(index)))
+                if index < last:
+                    index += 1
+                    token_id = types[index]
+            elif action == EncodedTables.ACCEPT:
+                return values[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    children = values[-length:]
+                    del values[-length:]
+                    del states[-length:]
+                else:
+                    children = []
+                node = (symbols[lhs], children)
+                chain = unit_chains[states[-1]].get(lhs * n_terminals + token_id)
+                if chain is None:
+                    states.append(goto_rows[states[-1]][lhs])
+                else:
+                    goto_state, wrappers = chain
+                    for name in wrappers:
+                        node = (name, [node])
+                    states.append(goto_state)
+                values.append(node)
+
+def lr1_parse_tracked(tokens, tables: EncodedTables, watched, on_reduce, pool=None):
+    """
+    记录每个结点起始 token 下标的 LR(1) 分析
+    归约出 watched（非终结符编号集合）中的结点时调用 on_reduce(lhs, node, start)，start 为结点首个 token 的下标
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    types = tokens.types
+    lexeme = tokens.lexeme
+    leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+    last = len(types) - 1
+    states = [0]
+    values = []
+    starts = []
+    index = 0
+    token_id = types[0]
+    with gc_paused():
+        while True:
+            action = action_rows[states[-1]].get(token_id)
+            if action is None:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if action >= 0:
+                states.append(action)
+                values.append(leaf(symbols[token_id], lexeme(index)))
+                starts.append(index)
+                if index < last:
+                    index += 1
+                    token_id = types[index]
+            elif action == EncodedTables.ACCEPT:
+                return values[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    children = values[-length:]
+                    start = starts[-length]
+                    del values[-length:]
+                    del states[-length:]
+                    del starts[-length:]
+                else:
+                    children = []
+                    start = index
+                goto_state = goto_rows[states[-1]].get(lhs)
+                if goto_state is None:
+                    raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                node = (symbols[lhs], children)
+                states.append(goto_state)
+                values.append(node)
+                starts.append(start)
+                if lhs in watched:
+                    on_reduce(symbols[lhs], node, start)
+
+class SemanticActions:
+    """
+    归约时执行的语义动作，用于不经过通用语法树、直接构造自定义的中间表示
+    - reduce(lhs, rhs)：注册某个产生式的处理函数，以右部各符号的值为位置参数调用，返回值作为该非终结符的值入栈；
+      rhs 省略时用于 lhs 的所有未单独注册的产生式
+    - token(*names)：注册 token 的处理函数 handler(类型名, 词素)，返回值作为叶子的值
+    未注册的产生式与 token 仍得到 (lhs, children) / (类型名, 词素)，全部未注册时与 lr1_parse_encoded 的结果相同
+    """
+    def __init__(self):
+        self.rule_handlers = {}  # (lhs, rhs 元组) -> 处理函数
+        self.lhs_handlers = {}  # lhs -> 处理函数
+        self.token_handlers = {}  # token 类型名 -> 处理函数
+        self.bound = None
+
+    def reduce(self, lhs, rhs=None):
+        def decorator(handler):
+            if rhs is None:
+                self.lhs_handlers[lhs] = handler
+            else:
+                self.rule_handlers[(lhs, tuple(rhs))] = handler
+            self.bound = None
+            return handler
+        return decorator
+
+    def token(self, *names):
+        def decorator(handler):
+            for name in names:
+                self.token_handlers[name] = handler
+            self.bound = None
+            return handler
+        return decorator
+
+    def bind(self, tables: EncodedTables, pool=None):
+        """
+        按产生式编号与终结符编号展开为两个分派数组 (reducers, leaves)，结果按 tables 缓存
+        """
+        if self.bound is not None and self.bound[0] is tables and self.bound[1] is pool:
+            return self.bound[2]
+        for rule in self.rule_handlers:
+            if rule not in tables.production_ids:
+                raise ValueError(f"文法中没有产生式 {rule[0]} -> {' '.join(rule[1])}")
+        for lhs in self.lhs_handlers:
+            if lhs not in tables.symbol_ids or tables.symbol_ids[lhs] < tables.n_terminals:
+                raise ValueError(f"文法中没有非终结符 {lhs}")
+        for name in self.token_handlers:
+            if name not in tables.symbol_ids or tables.symbol_ids[name] >= tables.n_terminals:
+                raise ValueError(f"文法中没有终结符 {name}")
+        reducers = []
+        for lhs, rhs in tables.production_rules:
+            handler = self.rule_handlers.get((lhs, rhs)) or self.lhs_handlers.get(lhs)
+            if handler is None:
+                handler = lambda *children, lhs=lhs: (lhs, list(children))
+            reducers.append(handler)
+        leaf = pool.leaf if pool is not None else lambda type_name, text: (type_name, text)
+        leaves = [self.token_handlers.get(symbol, leaf) for symbol in tables.symbols[:tables.n_terminals]]
+        self.bound = (tables, pool, (reducers, leaves))
+        return reducers, leaves
 
+def lr1_parse_actions(tokens, tables: EncodedTables, actions: SemanticActions, pool=None):
+    """
+    归约时按产生式编号从分派数组中取处理函数，以其返回值代替 (lhs, children) 入栈，返回开始符号的值
+    """
+    lexemes = map(tokens.lexeme, range(len(tokens.types)))
+    return lr1_parse_actions_stream(zip(tokens.types, lexemes), tables, actions, pool)
+
+def lr1_parse_actions_stream(tokens, tables: EncodedTables, actions: SemanticActions, pool=None):
+    """
+    与 lr1_parse_actions 相同，tokens 为以 EOF 结尾的 (类型编号, 词素) 可迭代对象，如 IdLexer.stream()
+    token 在移进时才从 tokens 中取出，叶子处理函数按 token 的先后顺序调用
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    reducers, leaves = actions.bind(tables, pool)
+    tokens = iter(tokens)
+    states = [0]
+    values = []
+    index = 0
+    token_id, lexeme = next(tokens)
+    with gc_paused():
+        while True:
+            action = action_rows[states[-1]].get(token_id)
+            if action is None:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme)} at position {index}")
+            if action >= 0:
+                states.append(action)
+                values.append(leaves[token_id](symbols[token_id], lexeme))
+                # 移进 EOF 之后与 lr1_parse_encoded 一样继续以 EOF 为向前看
+                token = next(tokens, None)
+                if token is not None:
+                    index += 1
+                    token_id, lexeme = token
+            elif action == EncodedTables.ACCEPT:
+                return values[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    value = reducers[~action](*values[-length:])
+                    del values[-length:]
+                    del states[-length:]
+                else:
+                    value = reducers[~action]()
+                goto_state = goto_rows[states[-1]].get(lhs)
+                if goto_state is None:
+                    raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                states.append(goto_state)
+                values.append(value)
+
+def lr1_parse_hashconsed(tokens, tables: EncodedTables, nodes):
+    """
+    hash-consing 模式的 LR(1) 分析：归约时以 (产生式编号, 子结点编号) 查结点池，结构相同的子树共用同一个结点
+    返回根结点编号，nodes.nodes[编号] 即与 lr1_parse 相等的语法树；nodes 为 NodePool，可在一批文件间共享
+    """
+    action_rows = tables.action_rows
+    goto_rows = tables.goto_rows
+    productions = tables.productions
+    symbols = tables.symbols
+    types = tokens.types
+    lexeme = tokens.lexeme
+    leaf = nodes.leaf
+    reduce = nodes.reduce
+    last = len(types) - 1
+    states = [0]
+    node_ids = []
+    index = 0
+    token_id = types[0]
+    with gc_paused():
+        while True:
+            action = action_rows[states[-1]].get(token_id)
+            if action is None:
+                raise SyntaxError(f"Unexpected token {(symbols[token_id], lexeme(index))} at position {index}")
+            if action >= 0:
+                states.append(action)
+                node_ids.append(leaf(symbols[token_id], lexeme(index)))
+                if index < last:
+                    index += 1
+                    token_id = types[index]
+            elif action == EncodedTables.ACCEPT:
+                return node_ids[-1]
+            else:
+                lhs, length = productions[~action]
+                if length:
+                    key = (~action, *node_ids[-length:])
+                    del node_ids[-length:]
+                    del states[-length:]
+                else:
+                    key = (~action,)
+                goto_state = goto_rows[states[-1]].get(lhs)
+                if goto_state is None:
+                    raise SyntaxError(f"No transition for non-terminal {symbols[lhs]} from state {states[-1]}")
+                states.append(goto_state)
+                node_ids.append(reduce(key, symbols[lhs]))
+
+def indent_lines(xml_lines, indent_space="    "):
+    """
+    逐行格式化 (XML 行, IndentType) 序列，边读入边产出带缩进的行，不保留已处理的行
+    """
+    indent_level = 0
     for line, indent_type in xml_lines:
         if indent_type == IndentType.MINUS:
             indent_level = max(indent_level - 1, 0)
 
-        indented_line = f"{indent_space * indent_level}{line}"
-        indented_lines.append(indented_line)
+        yield f"{indent_space * indent_level}{line}"
 
         if indent_type == IndentType.ADD:
             indent_level += 1
 
-    return indented_lines
+def indent(xml_lines):
+    """
+    格式化 XML 行列表，添加适当的缩进。
+    """
+    return list(indent_lines(xml_lines))
+
+# 与 XMLGeneratorListener 相同的转义：& < > ' "
+XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', "'": '&apos;', '"': '&quot;'})
+
+def ast_to_xml_lines(ast):
+    """
+    迭代先序遍历 AST，逐个产出 (XML 行, IndentType)，格式与 C++ 的 XMLGeneratorListener 一致：
+    非终结符为单独成行的开始与结束标签，终结符为一行 <类型>词素</类型>
+    """
+    stack = [(NodeType.MIDDLE if isinstance(ast[1], list) else NodeType.LEAF, ast)]
+    while stack:
+        node_type, (label, value) = stack.pop()
+        if node_type == NodeType.END:
+            yield f"</{label}>", IndentType.MINUS
+        elif node_type == NodeType.MIDDLE:
+            yield f"<{label}>", IndentType.ADD
+            stack.append((NodeType.END, (label, value)))
+            stack.extend((NodeType.MIDDLE if isinstance(child[1], list) else NodeType.LEAF, child)
+                         for child in reversed(value))
+        else:
+            # ANTLR 中 EOF 的文本为 <EOF>
+            text = '<EOF>' if label == 'EOF' else value
+            yield f"<{label}>{text.translate(XML_ESCAPES)}</{label}>", IndentType.KEEP
+
+def save_ast_to_xml(ast, output_path):
+    """
+    将 AST 以流式方式保存为 XML 文件，除遍历栈外不随树的大小占用额外内存
+    """
+    with open(output_path, 'w', encoding='utf-8', buffering=1 << 16) as file:
+        file.writelines(f"{line}\n" for line in indent_lines(ast_to_xml_lines(ast), "  "))
 
 def ast_to_yaml(node):
     """
@@ -128,13 +599,189 @@ def ast_to_yaml(node):
             return {lhs: children}
     return node
 
+def ast_to_json(ast):
+    """
+    迭代遍历 AST，返回与 json.dumps(ast_to_yaml(ast), ensure_ascii=False) 相同的文本
+    不使用递归，语法树再深也不会耗尽调用栈
+    """
+    parts = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            parts.append(node)
+            continue
+        lhs, children = node
+        if isinstance(children, list):
+            parts.append(f"{{{json.dumps(lhs, ensure_ascii=False)}: [")
+            stack.append(']}')
+            for i in range(len(children) - 1, -1, -1):
+                stack.append(children[i])
+                if i:
+                    stack.append(', ')
+        else:
+            parts.append(f"{{{json.dumps(lhs, ensure_ascii=False)}: {json.dumps(children, ensure_ascii=False)}}}")
+    return ''.join(parts)
+
+# YAML 文本的缩进随深度增长，深度 2000 时约 150 MB；to_yaml 与 yaml.dump 每层语法树约占 6 层 Python 调用
+# 更深的树只能输出为列式文件或结点库
+MAX_YAML_DEPTH = 2000
+YAML_FRAMES_PER_LEVEL = 8
+
+JSON_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+JSON_LITERALS = {'true': True, 'false': False, 'null': None}
+JSON_SPACE = re.compile(r'[ \t\n\r]*')
+
+def load_json(text):
+    """
+    不使用递归解析 JSON 文本，结果与 json.loads 相同，嵌套再深也不会耗尽调用栈
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    scanstring = json.decoder.scanstring
+    space = JSON_SPACE.match
+    stack = []  # 尚未闭合的 [list, None] 或 [dict, 当前键]
+
+    def read_key(pos):
+        if text[pos:pos + 1] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+        key, pos = scanstring(text, pos + 1)
+        pos = space(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+        return key, space(text, pos + 1).end()
+
+    pos = space(text, 0).end()
+    while True:
+        # 读一个值；遇到非空的 { 或 [ 时入栈，接着读其第一个元素
+        char = text[pos:pos + 1]
+        if char == '{':
+            pos = space(text, pos + 1).end()
+            if text[pos:pos + 1] == '}':
+                value, pos = {}, pos + 1
+            else:
+                key, pos = read_key(pos)
+                stack.append([{}, key])
+                continue
+        elif char == '[':
+            pos = space(text, pos + 1).end()
+            if text[pos:pos + 1] == ']':
+                value, pos = [], pos + 1
+            else:
+                stack.append([[], None])
+                continue
+        elif char == '"':
+            value, pos = scanstring(text, pos + 1)
+        else:
+            match = JSON_NUMBER.match(text, pos)
+            if match and match.end() > pos:
+                number = match.group()
+                value = float(number) if match.group(1) or match.group(2) else int(number)
+                pos = match.end()
+            else:
+                for literal, literal_value in JSON_LITERALS.items():
+                    if text.startswith(literal, pos):
+                        value, pos = literal_value, pos + len(literal)
+                        break
+                else:
+                    raise json.JSONDecodeError("Expecting value", text, pos)
+        # 把值放入外层容器；容器闭合后它本身成为外层的值
+        while True:
+            pos = space(text, pos).end()
+            if not stack:
+                if pos != len(text):
+                    raise json.JSONDecodeError("Extra data", text, pos)
+                return value
+            container, key = stack[-1]
+            if key is None:
+                container.append(value)
+            else:
+                container[key] = value
+            char = text[pos:pos + 1]
+            if char == ',':
+                pos = space(text, pos + 1).end()
+                if key is not None:
+                    stack[-1][1], pos = read_key(pos)
+                break
+            if char != ('}' if key is not None else ']'):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+            value = container
+            pos += 1
+            stack.pop()
+
+def dump_json(value, indent=None):
+    """
+    不使用递归序列化，结果与 json.dumps(value, ensure_ascii=False, indent=indent) 相同
+    """
+    parts = []
+    stack = [(value, 0)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        value, level = item
+        if isinstance(value, dict) and value:
+            entries = [(json.dumps(str(key), ensure_ascii=False) + ': ', child) for key, child in value.items()]
+            brackets = '{}'
+        elif isinstance(value, (list, tuple)) and value:
+            entries = [('', child) for child in value]
+            brackets = '[]'
+        else:
+            parts.append(json.dumps(value, ensure_ascii=False))
+            continue
+        if indent is None:
+            opening, separator, closing = brackets[0], ', ', brackets[1]
+        else:
+            inner = '\n' + ' ' * (indent * (level + 1))
+            opening, separator, closing = brackets[0] + inner, ',' + inner, '\n' + ' ' * (indent * level) + brackets[1]
+        parts.append(opening)
+        stack.append(closing)
+        for i in range(len(entries) - 1, -1, -1):
+            prefix, child = entries[i]
+            stack.append((child, level + 1))
+            if i:
+                stack.append(separator + prefix)
+            elif prefix:
+                stack.append(prefix)
+    return ''.join(parts)
+
+def ast_depth(ast):
+    """
+    迭代计算 AST 的深度，根结点为第 1 层
+    """
+    depth = 0
+    stack = [(ast, 1)]
+    while stack:
+        (_, children), level = stack.pop()
+        depth = max(depth, level)
+        if isinstance(children, list):
+            stack.extend((child, level + 1) for child in children)
+    return depth
+
+def dump_ast_yaml(ast, stream=None, depth=None, to_yaml=ast_to_yaml):
+    """
+    以 ast.yaml 的格式输出 to_yaml(ast)，stream 为 None 时返回文本
+    to_yaml 与 yaml.dump 都是递归实现：先迭代求出深度（缺省为 ast_depth），超过 MAX_YAML_DEPTH 时抛出 ValueError，
+    否则只在输出期间把递归上限提高到该深度所需的值
+    """
+    if depth is None:
+        depth = ast_depth(ast)
+    if depth > MAX_YAML_DEPTH:
+        raise ValueError(f"语法树深度 {depth} 超过 YAML 输出的上限 {MAX_YAML_DEPTH}")
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, YAML_FRAMES_PER_LEVEL * depth + 200))
+    try:
+        return yaml.dump(to_yaml(ast), stream, allow_unicode=True, sort_keys=False)
+    finally:
+        sys.setrecursionlimit(limit)
+
 def save_ast_to_yaml(ast, output_path):
     """
     将 AST 保存为 YAML 格式文件
     """
-    yaml_ast = ast_to_yaml(ast)
     with open(output_path, 'w', encoding='utf-8') as file:
-        yaml.dump(yaml_ast, file, allow_unicode=True, sort_keys=False)
+        dump_ast_yaml(ast, file)
 
 def generate_ast(file_path, action_table, goto_table):
     tokens = parse_file(file_path)
@@ -149,8 +796,8 @@ def save_tokens_to_txt(tokens, output_path):
         for token in tokens:
             file.write(f"{token}\n")
 
-def generate_ast_and_tokens(file_path, action_table, goto_table):
-    tokens = parse_file(file_path)
+def generate_ast_and_tokens(file_path, action_table, goto_table, use_mmap=False):
+    tokens = parse_file(file_path, use_mmap)
     ast = lr1_parse(tokens, action_table, goto_table)
     return ast, tokens
 
@@ -327,7 +974,318 @@ class Lexer:
                 raise RuntimeError(f'Unexpected character: {self.code[self.current_position]} at position {self.current_position}')
         return self.tokens
 
-def parse_file(file_path):
+# token 类型编号即其在 TOKEN_TYPES 中的下标，EOF 编号紧随其后
+TOKEN_NAMES = [token_name for token_name, _ in TOKEN_TYPES]
+TOKEN_IDS = {token_name: token_id for token_id, token_name in enumerate(TOKEN_NAMES)}
+EOF_ID = len(TOKEN_NAMES)
+SKIPPED_TOKEN_IDS = frozenset(TOKEN_IDS[name] for name in ('Whitespace', 'BlockComment', 'LineComment', 'Directive'))
+INVALID_ID = TOKEN_IDS['Invalid']
+
+def combined_token_pattern(as_bytes=False):
+    """
+    把 TOKEN_TYPES 按优先级合并为一个正则，每种 token 对应一个外层命名分组
+    分支从左到右尝试，与 Lexer 逐个尝试的语义一致
+    """
+    source = '|'.join(f'(?P<{token_name}>{pattern})' for token_name, pattern in TOKEN_TYPES)
+    return re.compile(source.encode() if as_bytes else source, re.VERBOSE)
+
+class SymbolPool:
+    """
+    批次内共享的符号池：相同的词素与 (类型, 词素) 叶子在整个批次中只保存一份
+    """
+    def __init__(self):
+        self.lexemes = {}
+        self.leaves = {}
+
+    def intern(self, lexeme):
+        return self.lexemes.setdefault(lexeme, lexeme)
+
+    def leaf(self, type_name, lexeme):
+        key = (type_name, lexeme)
+        return self.leaves.setdefault(key, key)
+
+    def __len__(self):
+        return len(self.lexemes)
+
+class NodePool:
+    """
+    hash-consing 结点池：叶子按 (类型, 词素)、内部结点按 (产生式编号, 子结点编号...) 驻留，结构相同的子树只保存一份
+    同一个池内结构相等当且仅当结点编号相同，子树比较与重复代码检测都是 O(1)
+    - nodes[i]: 结点本身，仍是 (类型, 词素) 或 (lhs, children) 的形式
+    - keys[i]: 驻留键，内部结点的键去掉首项即子结点编号
+    - hashes[i]: 结构哈希；sizes[i]: 子树结点数；uses[i]: 该结构出现的次数
+    """
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+        self.nodes = []
+        self.hashes = array('q')
+        self.sizes = array('q')
+        self.uses = array('q')
+
+    def add(self, key, node, structural_hash, size):
+        node_id = len(self.nodes)
+        self.ids[key] = node_id
+        self.keys.append(key)
+        self.nodes.append(node)
+        self.hashes.append(structural_hash)
+        self.sizes.append(size)
+        self.uses.append(1)
+        return node_id
+
+    def leaf(self, type_name, lexeme):
+        key = (type_name, lexeme)
+        node_id = self.ids.get(key)
+        if node_id is None:
+            return self.add(key, key, hash(key), 1)
+        self.uses[node_id] += 1
+        return node_id
+
+    def reduce(self, key, lhs):
+        """
+        key 为 (产生式编号, 子结点编号...)
+        """
+        node_id = self.ids.get(key)
+        if node_id is None:
+            nodes = self.nodes
+            hashes = self.hashes
+            sizes = self.sizes
+            child_ids = key[1:]
+            node = (lhs, [nodes[child_id] for child_id in child_ids])
+            structural_hash = hash((key[0],) + tuple([hashes[child_id] for child_id in child_ids]))
+            return self.add(key, node, structural_hash, 1 + sum([sizes[child_id] for child_id in child_ids]))
+        self.uses[node_id] += 1
+        return node_id
+
+    def child_ids(self, node_id):
+        key = self.keys[node_id]
+        return key[1:] if isinstance(key[0], int) else ()
+
+    def duplicates(self, min_size=8):
+        """
+        重复出现的子树，返回 [(结点编号, 出现次数)]，按可节省的结点数从多到少排列
+        只报告最大的重复：父结点同样重复时不再单独列出其子结点
+        """
+        covered = set()
+        result = []
+        candidates = [node_id for node_id, uses in enumerate(self.uses) if uses > 1 and self.sizes[node_id] >= min_size]
+        for node_id in sorted(candidates, key=lambda node_id: -self.sizes[node_id] * (self.uses[node_id] - 1)):
+            if node_id in covered:
+                continue
+            result.append((node_id, self.uses[node_id]))
+            stack = list(self.child_ids(node_id))
+            while stack:
+                child_id = stack.pop()
+                if child_id not in covered:
+                    covered.add(child_id)
+                    stack.extend(self.child_ids(child_id))
+        return result
+
+    def __len__(self):
+        return len(self.nodes)
+
+class TokenIds:
+    """
+    以类型编号数组与词素列表存储的 token 序列
+    """
+    def __init__(self, types, lexemes):
+        self.types = types
+        self.lexemes = lexemes
+
+    def __len__(self):
+        return len(self.types)
+
+    def type_name(self, index):
+        token_id = self.types[index]
+        return 'EOF' if token_id == EOF_ID else TOKEN_NAMES[token_id]
+
+    def lexeme(self, index):
+        return self.lexemes[index]
+
+    def __getitem__(self, index):
+        return (self.type_name(index), self.lexemes[index])
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+def encode_tokens(tokens, pool=None):
+    """
+    将 (类型, 词素) 列表转换为 TokenIds
+    """
+    intern = pool.intern if pool is not None else lambda lexeme: lexeme
+    types = array('B', [EOF_ID if token_type == 'EOF' else TOKEN_IDS[token_type] for token_type, _ in tokens])
+    return TokenIds(types, [intern(lexeme) for _, lexeme in tokens])
+
+ID_PATTERN = combined_token_pattern()
+ID_GROUP_IDS = {ID_PATTERN.groupindex[token_name]: token_id for token_id, token_name in enumerate(TOKEN_NAMES)}
+
+class IdLexer:
+    """
+    输出整数类型编号的词法分析器，编号与 load_encoded_tables 得到的解析表中终结符编号一致
+    给定 pool 时，词素在批次内驻留
+    """
+    def __init__(self, input_code, pool=None):
+        self.code = input_code
+        self.pool = pool
+
+    def tokenize(self):
+        code = self.code
+        match = ID_PATTERN.match
+        group_ids = ID_GROUP_IDS
+        intern = self.pool.intern if self.pool is not None else lambda lexeme: lexeme
+        types = array('B')
+        lexemes = []
+        position = 0
+        length = len(code)
+        while position < length:
+            m = match(code, position)
+            if m is None:
+                raise RuntimeError(f'Unexpected character: {code[position]} at position {position}')
+            token_id = group_ids[m.lastindex]
+            if token_id not in SKIPPED_TOKEN_IDS:
+                if token_id == INVALID_ID:
+                    raise RuntimeError(f'Unexpected character: {m.group()} at position {position}')
+                types.append(token_id)
+                lexemes.append(intern(m.group()))
+            position = m.end()
+        types.append(EOF_ID)
+        lexemes.append('EOF')
+        return TokenIds(types, lexemes)
+
+    def stream(self):
+        """
+        逐个产出 (类型编号, 词素)，以 EOF 结尾，不保存 token 序列；供 lr1_validate_encoded 使用
+        """
+        code = self.code
+        match = ID_PATTERN.match
+        group_ids = ID_GROUP_IDS
+        position = 0
+        length = len(code)
+        while position < length:
+            m = match(code, position)
+            if m is None:
+                raise RuntimeError(f'Unexpected character: {code[position]} at position {position}')
+            token_id = group_ids[m.lastindex]
+            if token_id not in SKIPPED_TOKEN_IDS:
+                if token_id == INVALID_ID:
+                    raise RuntimeError(f'Unexpected character: {m.group()} at position {position}')
+                yield token_id, m.group()
+            position = m.end()
+        yield EOF_ID, 'EOF'
+
+class TokenSpans:
+    """
+    以 (类型编号, 起点, 终点) 存储的 token 序列，词素只在访问时才从缓冲区解码
+    """
+    def __init__(self, buffer, types, starts, ends):
+        self.buffer = buffer
+        self.types = types
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.types)
+
+    def type_name(self, index):
+        token_id = self.types[index]
+        return 'EOF' if token_id == EOF_ID else TOKEN_NAMES[token_id]
+
+    def lexeme(self, index):
+        if self.types[index] == EOF_ID:
+            return 'EOF'
+        return self.buffer[self.starts[index]:self.ends[index]].decode('utf-8')
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.types)
+        return (self.type_name(index), self.lexeme(index))
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+SPAN_PATTERN = combined_token_pattern(as_bytes=True)
+# 外层命名分组的编号 -> token 类型编号
+SPAN_GROUP_IDS = {SPAN_PATTERN.groupindex[token_name]: token_id for token_id, token_name in enumerate(TOKEN_NAMES)}
+
+class SpanLexer:
+    """
+    字节级词法分析器：每个 token 只做一次匹配，只记录位置而不切出子串
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def tokenize(self):
+        buffer = self.buffer
+        match = SPAN_PATTERN.match
+        group_ids = SPAN_GROUP_IDS
+        types = array('B')
+        starts = array('q')
+        ends = array('q')
+        position = 0
+        length = len(buffer)
+        while position < length:
+            m = match(buffer, position)
+            if m is None:
+                raise RuntimeError(f'Unexpected character: {buffer[position:position + 1]!r} at position {position}')
+            token_id = group_ids[m.lastindex]
+            end = m.end()
+            if token_id not in SKIPPED_TOKEN_IDS:
+                if token_id == INVALID_ID:
+                    raise RuntimeError(f'Unexpected character: {buffer[position:end].decode("utf-8", "replace")} at position {position}')
+                types.append(token_id)
+                starts.append(position)
+                ends.append(end)
+            position = end
+        # 结束符
+        types.append(EOF_ID)
+        starts.append(length)
+        ends.append(length)
+        return TokenSpans(buffer, types, starts, ends)
+
+    def stream(self):
+        """
+        逐个产出 (类型编号, 起点, 终点)，以 (EOF_ID, 长度, 长度) 结尾，不保存 token 序列
+        """
+        buffer = self.buffer
+        match = SPAN_PATTERN.match
+        group_ids = SPAN_GROUP_IDS
+        position = 0
+        length = len(buffer)
+        while position < length:
+            m = match(buffer, position)
+            if m is None:
+                raise RuntimeError(f'Unexpected character: {buffer[position:position + 1]!r} at position {position}')
+            token_id = group_ids[m.lastindex]
+            end = m.end()
+            if token_id not in SKIPPED_TOKEN_IDS:
+                if token_id == INVALID_ID:
+                    raise RuntimeError(f'Unexpected character: {buffer[position:end].decode("utf-8", "replace")} at position {position}')
+                yield token_id, position, end
+            position = end
+        yield EOF_ID, length, length
+
+def lex_file_mmap(file_path):
+    """
+    以只读 mmap 映射源文件并进行字节级词法分析
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            buffer = b''
+        else:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return SpanLexer(buffer).tokenize()
+
+def parse_file(file_path, use_mmap=False):
+    if use_mmap:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File '{file_path}' not found.")
+        return lex_file_mmap(file_path)
     try:
         with open(file_path, 'r') as file:
             input_code = file.read()
@@ -342,30 +1300,198 @@ def parse_file(file_path):
     token_list.append(('EOF', 'EOF'))  # 结束符，根据需要保留
     return token_list
 
-def parse():
+def error_position(error):
+    """
+    从词法/语法错误信息中取出出错位置（字符偏移或 token 下标）
+    """
+    match = re.search(r'at position (\d+)', str(error))
+    return int(match.group(1)) if match else None
+
+class TableUnpickler(pickle.Unpickler):
+    """
+    builder.py 以脚本方式运行时，表中的类被记录在 __main__ 下，这里统一映射到 builder 模块
+    """
+    def find_class(self, module, name):
+        if module == '__main__':
+            module = 'builder'
+        return super().find_class(module, name)
+
+def load_parsing_tables(table_dir='.'):
+    """
+    从 builder.py 生成的 pkl 文件中加载解析表
+    """
+    with open(os.path.join(table_dir, 'action_table.pkl'), 'rb') as f:
+        action_table_data = TableUnpickler(f).load()
+    with open(os.path.join(table_dir, 'goto_table.pkl'), 'rb') as f:
+        goto_table_data = TableUnpickler(f).load()
+    return (ActionTable(action_table_data.table, getattr(action_table_data, 'conflicts', None)),
+            GotoTable(goto_table_data.table))
+
+def load_encoded_tables(table_dir='.'):
+    """
+    加载解析表并编码为整数形式，终结符编号与词法分析器的 token 编号一致
+    """
+    action_table, goto_table = load_parsing_tables(table_dir)
+    return encode_tables(action_table, goto_table, grammar_rules, TOKEN_NAMES + ['EOF'])
+
+def load_optimized_tables(table_dir='.'):
+    """
+    加载整数编码的解析表并做单元产生式消除与默认归约优化
+    """
+    return optimize_tables(load_encoded_tables(table_dir))
+
+def lex_file_ids(file_path, use_mmap=False, pool=None):
+    """
+    把文件切分为整数编号的 token 序列（TokenSpans 或 TokenIds）
+    """
+    if use_mmap:
+        return parse_file(file_path, use_mmap=True)
+    with open(file_path, 'r') as file:
+        return IdLexer(file.read(), pool).tokenize()
+
+def generate_ast_and_tokens_encoded(file_path, tables, use_mmap=False, pool=None):
+    """
+    tables 为 EncodedTables 或 OptimizedTables，按类型选择对应的分析函数
+    """
+    tokens = lex_file_ids(file_path, use_mmap, pool)
+    parse_tokens = lr1_parse_optimized if isinstance(tables, OptimizedTables) else lr1_parse_encoded
+    return parse_tokens(tokens, tables, pool), tokens
+
+def generate_ast_batch(file_paths, tables: EncodedTables, pool=None):
+    """
+    批量分析多个文件，所有文件共享同一个符号池，返回 [(ast, tokens), ...]
+    """
+    pool = pool if pool is not None else SymbolPool()
+    return [generate_ast_and_tokens_encoded(file_path, tables, pool=pool) for file_path in file_paths]
+
+def parse(argv=None):
+    arg_parser = argparse.ArgumentParser(description="C11 语法分析器")
+    arg_parser.add_argument('file', nargs='?', help="C 源文件，缺省时交互输入")
+    arg_parser.add_argument('--mmap', action='store_true', help="mmap 映射输入文件并按字节进行词法分析")
+    arg_parser.add_argument('--encoded', action='store_true', help="使用整数编码的 token 类型与解析表")
+    arg_parser.add_argument('--optimized', action='store_true', help="使用单元产生式消除与默认归约优化后的解析表")
+    arg_parser.add_argument('--generated', metavar='MODULE', help="使用 codegen.py 生成的分析器模块")
+    arg_parser.add_argument('--hashcons', action='store_true', help="hash-consing 模式：结构相同的子树共用结点，并报告重复子树")
+    arg_parser.add_argument('--lazy', action='store_true', help="从 parse_tables.bin 按状态懒加载解析表，并报告访问过的状态数")
+    arg_parser.add_argument('--validate', action='store_true', help="只检查能否通过语法分析，不构造语法树，也不写任何输出文件")
+    output_format = arg_parser.add_mutually_exclusive_group()
+    output_format.add_argument('--xml', action='store_true', help="把语法树以 XMLGeneratorListener 的格式写为 output.xml，代替 ast.yaml")
+    output_format.add_argument('--columnar', action='store_true', help="把 token 流与语法树写为列式二进制文件 ast.col，代替 ast.yaml 与 tokens.txt")
+    arg_parser.add_argument('--dfa', action='store_true', help="用线性时间的 DFA 词法分析器（dfalexer.py）切分 token，适合不可信的输入")
+    arg_parser.add_argument('--work-budget', type=int, default=None, help="--dfa 时整个文件允许的 DFA 步数")
+    arg_parser.add_argument('--preprocess', action='store_true', help="先经内置预处理器处理 #include、宏与条件编译")
+    arg_parser.add_argument('-I', dest='include_dirs', action='append', default=[], help="头文件搜索目录（--preprocess）")
+    arg_parser.add_argument('-D', dest='defines', action='append', default=[], help="预定义宏 NAME[=VALUE]（--preprocess）")
+    args = arg_parser.parse_args(argv)
+    if args.lazy and (args.optimized or args.generated):
+        arg_parser.error("--lazy 不能与 --optimized / --generated 同时使用")
+    if args.dfa and (args.mmap or args.preprocess):
+        arg_parser.error("--dfa 不能与 --mmap / --preprocess 同时使用")
+    if args.validate and (args.mmap or args.preprocess or args.optimized or args.generated or args.hashcons
+                          or args.xml or args.columnar):
+        arg_parser.error("--validate 只能与 --dfa / --lazy / --work-budget 同时使用")
+
     # 从文件中加载解析表
-    with open('action_table.pkl', 'rb') as f:
-        action_table_data = pickle.load(f)
-    with open('goto_table.pkl', 'rb') as f:
-        goto_table_data = pickle.load(f)
+    if args.lazy:
+        from tablefile import load_lazy_tables
+        tables = load_lazy_tables()
+    elif args.generated:
+        from codegen import load_parser_module
+        generated_parser = load_parser_module(args.generated)
+    elif args.optimized:
+        tables = load_optimized_tables()
+    elif args.encoded or args.hashcons or args.dfa or args.validate:
+        tables = load_encoded_tables()
+    else:
+        action_table, goto_table = load_parsing_tables()
+    nodes = NodePool()
 
-    action_table = ActionTable(action_table_data.table)
-    goto_table = GotoTable(goto_table_data.table)
+    file_path = args.file or input("Enter the file path: ")
+    if args.validate:
+        try:
+            if args.dfa:
+                from dfalexer import lex_file_dfa
+                tokens = lex_file_dfa(file_path, work_budget=args.work_budget)
+                count = lr1_validate_encoded(zip(tokens.types, tokens.lexemes), tables)
+            else:
+                with open(file_path, 'r') as file:
+                    count = lr1_validate_encoded(IdLexer(file.read()).stream(), tables)
+            print(f"语法正确（{count} 个 token）")
+        except (RuntimeError, SyntaxError) as e:
+            print(f"语法错误：{e}")
+        except (OSError, ValueError) as e:
+            # 文件不存在、不是 UTF-8 等，与完整分析时的报告方式相同
+            print(f"解析过程中发生错误：{e}")
+        return
 
-    file_path = input("Enter the file path: ")
     try:
         # 生成 AST 和 token 流
-        ast, tokens = generate_ast_and_tokens(file_path, action_table, goto_table)
-        
-        # 保存 AST 为 YAML 文件
-        ast_output_path = 'ast.yaml'
-        save_ast_to_yaml(ast, ast_output_path)
-        print(f"抽象语法树已保存到 {ast_output_path}")
+        if args.preprocess:
+            from preprocessor import Preprocessor, parse_defines
+            tokens = Preprocessor(args.include_dirs, parse_defines(args.defines)).preprocess_file(file_path)
+            tokens.append(('EOF', 'EOF'))
+            if args.generated:
+                ast = generated_parser.parse_tokens(encode_tokens(tokens))
+            elif args.hashcons:
+                root = lr1_parse_hashconsed(encode_tokens(tokens), tables, nodes)
+                ast = nodes.nodes[root]
+            elif args.optimized:
+                ast = lr1_parse_optimized(encode_tokens(tokens), tables)
+            elif args.encoded or args.lazy:
+                ast = lr1_parse_encoded(encode_tokens(tokens), tables)
+            else:
+                ast = lr1_parse(tokens, action_table, goto_table)
+        elif args.dfa:
+            from dfalexer import lex_file_dfa
+            tokens = lex_file_dfa(file_path, work_budget=args.work_budget)
+            if args.generated:
+                ast = generated_parser.parse_tokens(tokens)
+            elif args.hashcons:
+                root = lr1_parse_hashconsed(tokens, tables, nodes)
+                ast = nodes.nodes[root]
+            elif args.optimized:
+                ast = lr1_parse_optimized(tokens, tables)
+            else:
+                ast = lr1_parse_encoded(tokens, tables)
+        elif args.generated:
+            tokens = lex_file_ids(file_path, args.mmap)
+            ast = generated_parser.parse_tokens(tokens)
+        elif args.hashcons:
+            tokens = lex_file_ids(file_path, args.mmap)
+            root = lr1_parse_hashconsed(tokens, tables, nodes)
+            ast = nodes.nodes[root]
+        elif args.optimized or args.encoded or args.lazy:
+            ast, tokens = generate_ast_and_tokens_encoded(file_path, tables, args.mmap)
+        else:
+            ast, tokens = generate_ast_and_tokens(file_path, action_table, goto_table, args.mmap)
         
-        # 保存 token 流为 TXT 文件
-        tokens_output_path = 'tokens.txt'
-        save_tokens_to_txt(tokens, tokens_output_path)
-        print(f"Token 流已保存到 {tokens_output_path}")
+        if args.columnar:
+            from columnar import write_columnar
+            columnar_output_path = 'ast.col'
+            write_columnar(columnar_output_path, tokens, ast)
+            print(f"抽象语法树与 Token 流已保存到 {columnar_output_path}")
+        else:
+            if args.xml:
+                # 以流式方式保存 AST 为 XML 文件
+                ast_output_path = 'output.xml'
+                save_ast_to_xml(ast, ast_output_path)
+            else:
+                # 保存 AST 为 YAML 文件
+                ast_output_path = 'ast.yaml'
+                save_ast_to_yaml(ast, ast_output_path)
+            print(f"抽象语法树已保存到 {ast_output_path}")
+
+            # 保存 token 流为 TXT 文件
+            tokens_output_path = 'tokens.txt'
+            save_tokens_to_txt(tokens, tokens_output_path)
+            print(f"Token 流已保存到 {tokens_output_path}")
+
+        if args.lazy:
+            print(f"访问了 {tables.touched_states} / {tables.n_states} 个状态")
+        if args.hashcons:
+            print(f"语法树共 {nodes.sizes[root]} 个结点，其中结构不同的 {len(nodes)} 个")
+            for node_id, uses in nodes.duplicates()[:10]:
+                print(f"  重复子树 {nodes.nodes[node_id][0]}（{nodes.sizes[node_id]} 个结点）出现 {uses} 次")
     except Exception as e:
         print(f"解析过程中发生错误：{e}")
 
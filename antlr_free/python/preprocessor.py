@@ -0,0 +1,815 @@
+import argparse
+import os
+import re
+import sys
+
+from parser import ID_GROUP_IDS, ID_PATTERN, SKIPPED_TOKEN_IDS, INVALID_ID, TOKEN_NAMES, TOKEN_TYPES
+
+# 逻辑行切分：续行、注释与字符串需要一起识别，避免把字符串里的 // 或 /* 当作注释
+LINE_PART_PATTERN = re.compile(r'''
+    (?P<string>(?:u8|u|U|L)?"(?:[^"\\\n]|\\.)*"?)
+  | (?P<char>'(?:[^'\\\n]|\\.)*'?)
+  | (?P<block>/\*.*?(?:\*/|\Z))
+  | (?P<line>//(?:[^\n\\]|\\.)*)
+  | (?P<splice>\\\n)
+  | (?P<newline>\n)
+  | (?P<other>[^"'/\\\n]+|.)
+''', re.S | re.X)
+
+DIRECTIVE_PATTERN = re.compile(r'\s*(?:\#|%:)\s*([A-Za-z_]\w*)?(.*)', re.S)
+FUNCTION_MACRO_PATTERN = re.compile(r'[A-Za-z_]\w*\(')
+
+# 关键字也可以被定义为宏
+NAME_TYPES = frozenset(['Identifier'] + [token_name for token_name, pattern in TOKEN_TYPES if pattern.startswith(r'\b')])
+EMPTY_HIDESET = frozenset()
+# 拼接 ## 时占位的空实参
+PLACEMARKER = (None, '', EMPTY_HIDESET)
+
+MAX_INCLUDE_DEPTH = 200
+# #if 表达式按 intmax_t / uintmax_t 求值
+UINTMAX_MAX = (1 << 64) - 1
+INTMAX_MAX = (1 << 63) - 1
+
+class PreprocessError(RuntimeError):
+    """
+    预处理错误；继承 RuntimeError，与词法错误走同一条处理路径
+    """
+    def __init__(self, path, line, message):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+
+def logical_lines(code):
+    """
+    把源码切分为逻辑行：拼接续行，注释替换为一个空格，返回 [(起始物理行号, 文本), ...]
+    """
+    lines = []
+    parts = []
+    line_no = 1
+    start = 1
+    for m in LINE_PART_PATTERN.finditer(code):
+        kind = m.lastgroup
+        text = m.group()
+        if kind == 'newline':
+            lines.append((start, ''.join(parts)))
+            parts = []
+            line_no += 1
+            start = line_no
+        elif kind == 'splice':
+            line_no += 1
+        elif kind == 'block':
+            parts.append(' ')
+            line_no += text.count('\n')
+        elif kind == 'line':
+            line_no += text.count('\\\n')
+        elif kind in ('string', 'char') and '\\\n' in text:
+            parts.append(text.replace('\\\n', ''))
+            line_no += text.count('\\\n')
+        else:
+            parts.append(text)
+    if parts:
+        lines.append((start, ''.join(parts)))
+    return lines
+
+def spaced(token_type, lexeme, space):
+    """
+    前面有空白的 token 记为 (类型, 词素, 隐藏集, True)，供 # 运算符还原实参中的空白
+    """
+    return (token_type, lexeme, EMPTY_HIDESET, True) if space else (token_type, lexeme)
+
+def space_before(token):
+    return len(token) > 3 and token[3]
+
+def with_space(token, space):
+    return (token[0], token[1], hideset_of(token), space)
+
+def pp_tokenize_lines(text, path='<input>', line=1, in_directive=False):
+    """
+    用与 IdLexer 相同的合并正则切分 token，返回 ([(类型, 词素), ...], 每个 token 所在的行号)
+    指令行内的 # 与 ## 是字符串化与拼接运算符，不能被 Directive 规则吞掉整行
+    """
+    tokens = []
+    lines = []
+    position = 0
+    length = len(text)
+    space = False
+    while position < length:
+        m = ID_PATTERN.match(text, position)
+        token_id = ID_GROUP_IDS[m.lastindex] if m else INVALID_ID
+        token_type = TOKEN_NAMES[token_id]
+        if token_type == 'Directive' and in_directive:
+            if text.startswith('##', position):
+                tokens.append(spaced('DoublePound', '##', space))
+                position += 2
+            else:
+                tokens.append(spaced('Pound', '#', space))
+                position += 1
+            lines.append(line)
+            space = False
+            continue
+        if token_id == INVALID_ID:
+            raise PreprocessError(path, line, f"Unexpected character: {text[position]}")
+        if token_id in SKIPPED_TOKEN_IDS:
+            line += m.group().count('\n')
+            space = True
+        else:
+            tokens.append(spaced(token_type, m.group(), space))
+            lines.append(line)
+            space = False
+        position = m.end()
+    return tokens, lines
+
+def pp_tokenize(text, path='<input>', line=1, in_directive=False):
+    """
+    只返回 pp_tokenize_lines 切分出的 token
+    """
+    return pp_tokenize_lines(text, path, line, in_directive)[0]
+
+def lexed(tokens):
+    """
+    SourceFile 中的 tokens；切分时出错的行在这里才抛出错误
+    """
+    if isinstance(tokens, PreprocessError):
+        raise tokens.with_traceback(None)
+    return tokens
+
+class SourceFile:
+    """
+    切分好的源文件：items 为 ('text', 行号, tokens, 每个 token 的行号) 与 ('directive', 行号, 指令名, 参数文本, 参数 tokens)
+    切分出错时 tokens 为 PreprocessError，由 lexed 在该行真正被使用时抛出，#if 0 中的文字因而不会报错
+    只保存未展开的 token，与宏状态无关，因此可以在多个翻译单元之间复用
+    guard 为检测到的头文件保护宏，pragma_once 表示文件含有 #pragma once
+    """
+    def __init__(self, path, items):
+        self.path = path
+        self.items = items
+        self.pragma_once = any(item[0] == 'directive' and item[2] == 'pragma' and item[3].split() == ['once']
+                               for item in items)
+        self.guard = self.detect_guard()
+
+    @classmethod
+    def from_source(cls, code, path='<input>'):
+        items = []
+        text_lines = []
+        text_start = 1
+        for line_no, text in logical_lines(code) + [(None, None)]:
+            directive = DIRECTIVE_PATTERN.match(text) if text is not None else None
+            if text is not None and directive is None:
+                if not text_lines:
+                    text_start = line_no
+                text_lines.append(text)
+                continue
+            # 相邻的普通行合并后一次切分
+            if text_lines:
+                try:
+                    tokens, token_lines = pp_tokenize_lines('\n'.join(text_lines), path, text_start)
+                except PreprocessError as e:
+                    tokens, token_lines = e, None
+                if tokens:
+                    items.append(('text', text_start, tokens, token_lines))
+                text_lines = []
+            if directive is not None:
+                name = directive.group(1) or ''
+                rest = directive.group(2)
+                try:
+                    tokens = pp_tokenize(rest, path, line_no, True)
+                except PreprocessError as e:
+                    tokens = e
+                items.append(('directive', line_no, name, rest.strip(), tokens))
+        return cls(path, items)
+
+    def detect_guard(self):
+        """
+        识别 #ifndef X / #define X ... #endif 形式的保护宏，整个文件都必须位于该条件块内
+        """
+        items = self.items
+        if len(items) < 3 or items[0][0] != 'directive' or items[1][0] != 'directive':
+            return None
+        first, second = items[0], items[1]
+        if isinstance(first[4], PreprocessError) or isinstance(second[4], PreprocessError):
+            return None
+        if first[2] == 'ifndef' and len(first[4]) == 1:
+            guard = first[4][0][1]
+        elif first[2] == 'if' and [token[1] for token in first[4]][:2] == ['!', 'defined']:
+            names = [token[1] for token in first[4][2:] if token[1] not in '()']
+            if len(names) != 1:
+                return None
+            guard = names[0]
+        else:
+            return None
+        if second[2] != 'define' or not second[4] or second[4][0][1] != guard:
+            return None
+        depth = 0
+        for index, item in enumerate(items):
+            if item[0] != 'directive':
+                continue
+            if item[2] in ('if', 'ifdef', 'ifndef'):
+                depth += 1
+            elif item[2] == 'endif':
+                depth -= 1
+                if depth == 0:
+                    return guard if index == len(items) - 1 else None
+        return None
+
+class HeaderCache:
+    """
+    一次运行内共享的头文件缓存，键为 (真实路径, 修改时间)；同一头文件在整个批次中只切分一次
+    """
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        real_path = os.path.realpath(path)
+        key = (real_path, os.stat(real_path).st_mtime_ns)
+        source_file = self.entries.get(key)
+        if source_file is not None:
+            self.hits += 1
+            return source_file
+        self.misses += 1
+        with open(real_path, 'r', encoding='utf-8', errors='replace') as file:
+            source_file = SourceFile.from_source(file.read(), path)
+        self.entries[key] = source_file
+        return source_file
+
+    def summary(self):
+        return f"头文件缓存：{len(self.entries)} 个文件，命中 {self.hits} 次，切分 {self.misses} 次"
+
+class Macro:
+    """
+    params 为 None 表示对象式宏；variadic 时最后一个形参为 __VA_ARGS__
+    """
+    def __init__(self, name, params, variadic, body):
+        self.name = name
+        self.params = params
+        self.variadic = variadic
+        self.body = body
+        self.param_index = {param: index for index, param in enumerate(params or ())}
+
+class TokenStream:
+    """
+    宏展开的输入：先取回填的展开结果，再顺序读取原始 token
+    path 与 line 为最近读取的原始 token 的位置，用于报告宏调用中的错误；lines 为每个原始 token 的行号
+    """
+    def __init__(self, tokens, path='<input>', line=0, lines=None):
+        self.tokens = tokens
+        self.index = 0
+        self.pending = []
+        self.path = path
+        self.line = line
+        self.lines = lines
+
+    @property
+    def location(self):
+        return self.path, self.line
+
+    def next(self):
+        if self.pending:
+            return self.pending.pop()
+        if self.index < len(self.tokens):
+            token = self.tokens[self.index]
+            if self.lines is not None:
+                self.line = self.lines[self.index]
+            self.index += 1
+            return token
+        return None
+
+    def peek(self):
+        if self.pending:
+            return self.pending[-1]
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return None
+
+    def push_front(self, tokens):
+        self.pending.extend(reversed(tokens))
+
+def hideset_of(token):
+    return token[2] if len(token) > 2 else EMPTY_HIDESET
+
+def stringize(tokens, space=False):
+    """
+    # 运算符：原文中 token 之间有空白处以单个空格分隔，否则直接相连（C11 6.10.3.2）
+    字符串与字符常量中的 \\ 和 " 需要转义
+    """
+    parts = []
+    for index, token in enumerate(tokens):
+        token_type, lexeme = token[0], token[1]
+        if token_type in ('StringLiteral', 'Constant') and lexeme[-1:] in ('"', "'"):
+            lexeme = lexeme.replace('\\', '\\\\').replace('"', '\\"')
+        if index and space_before(token):
+            parts.append(' ')
+        parts.append(lexeme)
+    return ('StringLiteral', '"' + ''.join(parts) + '"', EMPTY_HIDESET, space)
+
+class ExpressionEvaluator:
+    """
+    #if 常量表达式求值（优先级爬升）：值为 (整数, 是否无符号)，按 intmax_t / uintmax_t 运算
+    &&、|| 与 ?: 未被选中的一侧只解析、不求值
+    """
+    BINARY_PRECEDENCE = {
+        'OrOr': 1, 'AndAnd': 2, 'VerticalBar': 3, 'Caret': 4, 'Ampersand': 5,
+        'EqualEqual': 6, 'NotEqual': 6,
+        'LessThan': 7, 'GreaterThan': 7, 'LessThanOrEqual': 7, 'GreaterThanOrEqual': 7,
+        'LeftShift': 8, 'RightShift': 8, 'Plus': 9, 'Minus': 9, 'Asterisk': 10, 'Slash': 10, 'Percent': 10,
+    }
+    COMPARISONS = {
+        'EqualEqual': lambda left, right: left == right,
+        'NotEqual': lambda left, right: left != right,
+        'LessThan': lambda left, right: left < right,
+        'GreaterThan': lambda left, right: left > right,
+        'LessThanOrEqual': lambda left, right: left <= right,
+        'GreaterThanOrEqual': lambda left, right: left >= right,
+    }
+    CHAR_ESCAPES = {'n': 10, 't': 9, 'r': 13, '0': 0, 'a': 7, 'b': 8, 'f': 12, 'v': 11,
+                    '\\': 92, "'": 39, '"': 34, '?': 63}
+
+    def __init__(self, tokens, path, line):
+        self.tokens = tokens
+        self.index = 0
+        self.skipping = 0
+        self.path = path
+        self.line = line
+
+    def error(self, message):
+        raise PreprocessError(self.path, self.line, f"#if: {message}")
+
+    def peek_type(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self):
+        if self.index >= len(self.tokens):
+            self.error("表达式不完整")
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def evaluate(self):
+        value, _ = self.conditional()
+        if self.index != len(self.tokens):
+            self.error(f"多余的 token {self.tokens[self.index][1]}")
+        return value
+
+    @staticmethod
+    def convert(value, unsigned):
+        """
+        按 uintmax_t / intmax_t 回绕
+        """
+        value &= UINTMAX_MAX
+        if not unsigned and value > INTMAX_MAX:
+            value -= UINTMAX_MAX + 1
+        return value, unsigned
+
+    def skipped(self, parse, skip):
+        """
+        skip 为真时解析未被选中的一侧：只确定类型，不报告除数为零等求值错误
+        """
+        self.skipping += skip
+        try:
+            return parse()
+        finally:
+            self.skipping -= skip
+
+    def conditional(self):
+        condition = self.binary(1)
+        if self.peek_type() != 'Question':
+            return condition
+        self.take()
+        if_true = self.skipped(self.conditional, not condition[0])
+        if self.take()[0] != 'Colon':
+            self.error("缺少 :")
+        if_false = self.skipped(self.conditional, bool(condition[0]))
+        # 结果类型由两侧共同决定：(0 ? 1u : -1) 为无符号数
+        value = if_true[0] if condition[0] else if_false[0]
+        return self.convert(value, if_true[1] or if_false[1])
+
+    def binary(self, min_precedence):
+        left = self.unary()
+        while True:
+            operator = self.peek_type()
+            precedence = self.BINARY_PRECEDENCE.get(operator)
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.take()
+            skip = (operator == 'AndAnd' and not left[0]) or (operator == 'OrOr' and left[0])
+            right = self.skipped(lambda: self.binary(precedence + 1), skip)
+            left = self.apply(operator, left, right)
+
+    def apply(self, operator, left, right):
+        if operator == 'OrOr':
+            return int(bool(left[0]) or bool(right[0])), False
+        if operator == 'AndAnd':
+            return int(bool(left[0]) and bool(right[0])), False
+        if operator in ('LeftShift', 'RightShift'):
+            # 移位的结果类型只由左操作数决定
+            value, unsigned = left
+            amount = right[0]
+            if amount < 0:
+                if self.skipping:
+                    return 0, unsigned
+                self.error("移位位数为负")
+            if operator == 'LeftShift':
+                return self.convert(value << min(amount, 64), unsigned)
+            return self.convert(value >> min(amount, 64), unsigned)
+        # 一般算术转换：有一侧为无符号数时两侧都按无符号数计算
+        unsigned = left[1] or right[1]
+        left = self.convert(left[0], unsigned)[0]
+        right = self.convert(right[0], unsigned)[0]
+        if operator in ('Slash', 'Percent'):
+            if right == 0:
+                if self.skipping:
+                    return 0, unsigned
+                self.error("除数为零")
+            quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+            return self.convert(quotient if operator == 'Slash' else left - quotient * right, unsigned)
+        if operator in self.COMPARISONS:
+            return int(self.COMPARISONS[operator](left, right)), False
+        return self.convert({
+            'VerticalBar': lambda: left | right,
+            'Caret': lambda: left ^ right,
+            'Ampersand': lambda: left & right,
+            'Plus': lambda: left + right,
+            'Minus': lambda: left - right,
+            'Asterisk': lambda: left * right,
+        }[operator](), unsigned)
+
+    def unary(self):
+        token_type, lexeme, *_ = self.take()
+        if token_type == 'Plus':
+            return self.unary()
+        if token_type == 'Minus':
+            value, unsigned = self.unary()
+            return self.convert(-value, unsigned)
+        if token_type == 'Tilde':
+            value, unsigned = self.unary()
+            return self.convert(~value, unsigned)
+        if token_type == 'Exclamation':
+            return int(not self.unary()[0]), False
+        if token_type == 'LeftParen':
+            value = self.conditional()
+            if self.take()[0] != 'RightParen':
+                self.error("缺少 )")
+            return value
+        if token_type == 'Constant':
+            return self.constant(lexeme)
+        if token_type in NAME_TYPES:
+            # 展开后仍剩下的标识符按 0 处理
+            return 0, False
+        self.error(f"意外的 token {lexeme}")
+
+    def constant(self, lexeme):
+        """
+        整数常量与字符常量的 (值, 是否无符号)；带 u 后缀或超出 intmax_t 的常量为无符号数
+        """
+        if lexeme[-1] == "'":
+            body = lexeme[lexeme.index("'") + 1:-1]
+            if body.startswith('\\'):
+                if body[1] == 'x':
+                    return int(body[2:], 16), False
+                if body[1].isdigit():
+                    return int(body[1:], 8), False
+                return self.CHAR_ESCAPES.get(body[1], ord(body[1])), False
+            return ord(body), False
+        digits = lexeme.rstrip('uUlL')
+        unsigned = 'u' in lexeme[len(digits):].lower()
+        try:
+            if digits[:2] in ('0x', '0X'):
+                value = int(digits, 16)
+            elif digits.startswith('0') and len(digits) > 1:
+                value = int(digits, 8)
+            else:
+                value = int(digits)
+        except ValueError:
+            self.error(f"不是整数常量：{lexeme}")
+        if value > UINTMAX_MAX:
+            self.error(f"整数常量超出范围：{lexeme}")
+        return value, unsigned or value > INTMAX_MAX
+
+class Preprocessor:
+    """
+    轻量级 C 预处理器，位于词法分析之后、语法分析之前，输出与 Lexer.tokenize 相同的 (类型, 词素) 列表
+    支持 #include、对象式与函数式宏（#、##、__VA_ARGS__）、#if/#ifdef/#ifndef/#elif/#else/#endif、
+    #undef、#error 与 #pragma once；宏展开按 Prosser 的隐藏集算法进行
+    多个翻译单元共用同一个 HeaderCache 时，头文件只切分一次，保护宏生效的重复包含直接跳过
+    """
+    PREDEFINED = {'__STDC__': '1', '__STDC_VERSION__': '201112L', '__STDC_HOSTED__': '1'}
+
+    def __init__(self, include_dirs=(), defines=None, cache=None):
+        self.include_dirs = list(include_dirs)
+        self.defines = dict(self.PREDEFINED)
+        self.defines.update(defines or {})
+        self.cache = cache if cache is not None else HeaderCache()
+        self.macros = {}
+        self.once = set()
+        self.output = []
+
+    def reset(self):
+        """
+        开始新的翻译单元：宏与 #pragma once 记录只在单元内有效
+        """
+        self.macros = {}
+        self.once = set()
+        self.output = []
+        for name, value in self.defines.items():
+            self.macros[name] = Macro(name, None, False, pp_tokenize(value))
+
+    def preprocess_file(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return self.preprocess_source(file.read(), path)
+
+    def preprocess_source(self, code, path='<input>'):
+        self.reset()
+        self.process(SourceFile.from_source(code, path), 0)
+        output = self.output
+        self.output = []
+        return output
+
+    def process(self, source_file: SourceFile, depth):
+        # 条件栈：每层为 (外层是否有效, 本层是否已有分支被选中, 是否已遇到 #else)
+        conditions = []
+        active = True
+        path = source_file.path
+        for item in source_file.items:
+            if item[0] == 'text':
+                if active:
+                    self.expand_into(TokenStream(lexed(item[2]), path, item[1], item[3]), self.output)
+                continue
+            _, line, name, rest, tokens = item
+            if name in ('if', 'ifdef', 'ifndef'):
+                taken = active and self.condition(name, tokens, path, line)
+                conditions.append((active, taken, False))
+                active = taken
+            elif name in ('elif', 'else'):
+                if not conditions or conditions[-1][2]:
+                    raise PreprocessError(path, line, f"#{name} 没有对应的 #if")
+                outer, taken, _ = conditions[-1]
+                selected = outer and not taken and (name == 'else' or self.condition('if', tokens, path, line))
+                conditions[-1] = (outer, taken or selected, name == 'else')
+                active = selected
+            elif name == 'endif':
+                if not conditions:
+                    raise PreprocessError(path, line, "#endif 没有对应的 #if")
+                active = conditions.pop()[0]
+            elif not active:
+                continue
+            elif name == 'define':
+                self.define(rest, tokens, path, line)
+            elif name == 'undef':
+                if lexed(tokens):
+                    self.macros.pop(tokens[0][1], None)
+            elif name == 'include':
+                self.include(rest, tokens, source_file, depth, line)
+            elif name == 'error':
+                raise PreprocessError(path, line, f"#error {rest}")
+            elif name in ('pragma', 'line', 'warning', ''):
+                # #pragma once 已在 SourceFile 中识别，其余 #pragma 与 #line 忽略
+                continue
+            else:
+                raise PreprocessError(path, line, f"未知的预处理指令 #{name}")
+        if conditions:
+            raise PreprocessError(path, len(source_file.items) and source_file.items[-1][1], "#if 没有对应的 #endif")
+
+    def define(self, rest, tokens, path, line):
+        tokens = lexed(tokens)
+        if not tokens or tokens[0][0] not in NAME_TYPES:
+            raise PreprocessError(path, line, "#define 缺少宏名")
+        name = tokens[0][1]
+        params = None
+        variadic = False
+        body = tokens[1:]
+        # 函数式宏的左括号必须紧跟宏名，token 中没有空白信息，需看指令原文
+        if body and body[0][0] == 'LeftParen' and FUNCTION_MACRO_PATTERN.match(rest):
+            params = []
+            index = 1
+            while True:
+                index += 1
+                if index >= len(tokens):
+                    raise PreprocessError(path, line, f"宏 {name} 的形参列表不完整")
+                token_type, lexeme = tokens[index][:2]
+                if token_type == 'RightParen' and not params:
+                    break
+                if token_type == 'Ellipsis':
+                    variadic = True
+                    params.append('__VA_ARGS__')
+                    index += 1
+                elif token_type in NAME_TYPES:
+                    params.append(lexeme)
+                    index += 1
+                else:
+                    raise PreprocessError(path, line, f"宏 {name} 的形参 {lexeme} 无效")
+                if index < len(tokens) and tokens[index][0] == 'RightParen':
+                    break
+                if variadic or index >= len(tokens) or tokens[index][0] != 'Comma':
+                    raise PreprocessError(path, line, f"宏 {name} 的形参列表无效")
+            body = tokens[index + 1:]
+        # 与 gcc 一致，重定义时以后一次为准
+        self.macros[name] = Macro(name, params, variadic, body)
+
+    def condition(self, name, tokens, path, line):
+        tokens = lexed(tokens)
+        if name in ('ifdef', 'ifndef'):
+            if not tokens:
+                raise PreprocessError(path, line, f"#{name} 缺少宏名")
+            defined = tokens[0][1] in self.macros
+            return defined if name == 'ifdef' else not defined
+        # 先替换 defined X / defined(X)，再展开宏
+        replaced = []
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token[1] == 'defined':
+                if index + 1 < len(tokens) and tokens[index + 1][0] == 'LeftParen':
+                    operand = tokens[index + 2] if index + 2 < len(tokens) else None
+                    index += 4
+                else:
+                    operand = tokens[index + 1] if index + 1 < len(tokens) else None
+                    index += 2
+                if operand is None:
+                    raise PreprocessError(path, line, "defined 缺少宏名")
+                replaced.append(('Constant', '1' if operand[1] in self.macros else '0'))
+                continue
+            replaced.append(token)
+            index += 1
+        expanded = []
+        self.expand_into(TokenStream(replaced, path, line), expanded)
+        return bool(ExpressionEvaluator(expanded, path, line).evaluate())
+
+    def include(self, rest, tokens, source_file, depth, line):
+        path = source_file.path
+        if not rest.startswith(('"', '<')):
+            # 计算得到的 #include：先展开宏再解析
+            expanded = []
+            self.expand_into(TokenStream(lexed(tokens), path, line), expanded)
+            rest = ''.join(lexeme for _, lexeme in expanded)
+        if rest.startswith('"') and '"' in rest[1:]:
+            name = rest[1:rest.index('"', 1)]
+            search = [os.path.dirname(path)] + self.include_dirs
+        elif rest.startswith('<') and '>' in rest:
+            name = rest[1:rest.index('>')]
+            search = self.include_dirs
+        else:
+            raise PreprocessError(path, line, f"无效的 #include {rest}")
+        if depth >= MAX_INCLUDE_DEPTH:
+            raise PreprocessError(path, line, f"#include 嵌套超过 {MAX_INCLUDE_DEPTH} 层")
+        for directory in search:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                break
+        else:
+            raise PreprocessError(path, line, f"找不到头文件 {name}")
+        header = self.cache.load(candidate)
+        if header.path in self.once or (header.guard is not None and header.guard in self.macros):
+            return
+        if header.pragma_once:
+            self.once.add(header.path)
+        self.process(header, depth + 1)
+
+    def expand_into(self, stream: TokenStream, output, keep_space=False):
+        """
+        宏展开（Prosser 算法）：token 带有隐藏集，宏名在自身隐藏集中时不再展开，避免无限递归
+        输出 (类型, 词素)；keep_space 为真时保留 token 前的空白标记，供之后的 # 运算符使用
+        """
+        macros = self.macros
+        while True:
+            token = stream.next()
+            if token is None:
+                return
+            macro = macros.get(token[1])
+            if macro is None or token[0] not in NAME_TYPES or macro.name in hideset_of(token):
+                output.append(spaced(token[0], token[1], space_before(token)) if keep_space else (token[0], token[1]))
+                continue
+            hideset = hideset_of(token)
+            location = stream.location
+            if macro.params is None:
+                replacement = self.substitute(macro, None, hideset | {macro.name}, location)
+            else:
+                following = stream.peek()
+                if following is None or following[0] != 'LeftParen':
+                    output.append(spaced(token[0], token[1], space_before(token)) if keep_space else (token[0], token[1]))
+                    continue
+                stream.next()
+                args, closing = self.collect_arguments(stream, macro, location)
+                replacement = self.substitute(macro, args, (hideset & hideset_of(closing)) | {macro.name}, location)
+            # 展开结果沿用宏名前的空白
+            if replacement:
+                replacement[0] = with_space(replacement[0], space_before(token))
+            stream.push_front(replacement)
+
+    def collect_arguments(self, stream: TokenStream, macro: Macro, location):
+        """
+        location 为宏调用所在的 (文件, 行号)
+        """
+        args = [[]]
+        depth = 0
+        while True:
+            token = stream.next()
+            if token is None:
+                raise PreprocessError(*location, f"宏 {macro.name} 的实参列表不完整")
+            token_type = token[0]
+            if token_type == 'RightParen' and depth == 0:
+                break
+            if token_type == 'Comma' and depth == 0 and not (macro.variadic and len(args) == len(macro.params)):
+                args.append([])
+                continue
+            if token_type == 'LeftParen':
+                depth += 1
+            elif token_type == 'RightParen':
+                depth -= 1
+            args[-1].append(token)
+        if args == [[]] and not macro.params:
+            args = []
+        if macro.variadic and len(args) == len(macro.params) - 1:
+            args.append([])
+        if len(args) != len(macro.params):
+            raise PreprocessError(*location, f"宏 {macro.name} 需要 {len(macro.params)} 个实参，实际为 {len(args)} 个")
+        return args, token
+
+    def paste(self, left, right, location):
+        """
+        ## 运算符：拼接后必须恰好是一个 token，结果沿用左操作数前的空白
+        """
+        if left[0] is None:
+            return right
+        if right[0] is None:
+            return left
+        tokens = pp_tokenize(left[1] + right[1])
+        if len(tokens) != 1:
+            raise PreprocessError(*location, f"拼接 {left[1]} 与 {right[1]} 得不到合法的 token")
+        return (tokens[0][0], tokens[0][1], EMPTY_HIDESET, space_before(left))
+
+    def substitute(self, macro: Macro, args, hideset, location):
+        body = macro.body
+        param_index = macro.param_index
+        result = []
+        index = 0
+        while index < len(body):
+            token = body[index]
+            token_type, lexeme = token[0], token[1]
+            following = body[index + 1] if index + 1 < len(body) else None
+            if args is not None and token_type == 'Pound' and following is not None and following[1] in param_index:
+                result.append(stringize(args[param_index[following[1]]], space_before(token)))
+                index += 2
+                continue
+            if token_type == 'DoublePound' and following is not None and result:
+                if args is not None and following[1] in param_index:
+                    right = list(args[param_index[following[1]]]) or [PLACEMARKER]
+                else:
+                    right = [(following[0], following[1], EMPTY_HIDESET)]
+                result[-1] = self.paste(result[-1], right[0], location)
+                result.extend(right[1:])
+                index += 2
+                continue
+            if args is not None and lexeme in param_index and token_type in NAME_TYPES:
+                arg = args[param_index[lexeme]]
+                if following is not None and following[0] == 'DoublePound':
+                    inserted = list(arg) or [PLACEMARKER]
+                else:
+                    inserted = []
+                    self.expand_into(TokenStream(arg, *location), inserted, keep_space=True)
+                # 实参的第一个 token 沿用形参前的空白
+                if inserted:
+                    inserted[0] = with_space(inserted[0], space_before(token))
+                result.extend(inserted)
+                index += 1
+                continue
+            result.append(token)
+            index += 1
+        return [(token[0], token[1], hideset_of(token) | hideset, space_before(token))
+                for token in result if token[0] is not None]
+
+def parse_defines(definitions):
+    """
+    把 -D NAME[=VALUE] 转换为字典，缺省值为 1
+    """
+    defines = {}
+    for definition in definitions:
+        name, _, value = definition.partition('=')
+        defines[name] = value or '1'
+    return defines
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="C 预处理：输出展开后的 token 流")
+    arg_parser.add_argument('files', nargs='+')
+    arg_parser.add_argument('-I', dest='include_dirs', action='append', default=[], help="头文件搜索目录")
+    arg_parser.add_argument('-D', dest='defines', action='append', default=[], help="预定义宏 NAME[=VALUE]")
+    arg_parser.add_argument('-o', '--output', help="token 输出文件，缺省打印到标准输出")
+    args = arg_parser.parse_args(argv)
+
+    preprocessor = Preprocessor(args.include_dirs, parse_defines(args.defines))
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for path in args.files:
+            for token in preprocessor.preprocess_file(path):
+                output.write(f"{token}\n")
+    except PreprocessError as e:
+        print(f"预处理错误：{e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.output:
+            output.close()
+    print(preprocessor.cache.summary(), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
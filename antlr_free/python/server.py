@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dfalexer import DfaLexer
+from parser import (SymbolPool, ast_to_json, dump_json, error_position, load_encoded_tables, load_json,
+                    lr1_parse_encoded, lr1_parse_flat, lr1_validate_encoded, lr1_validate_flat)
+from tablefile import FlatTables, SharedTables
+
+DEFAULT_SOCKET = '/tmp/cparse.sock'
+# 单条请求（一行 JSON）的最大长度
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+# 工作进程内常驻的解析表，由 init_worker 加载或映射
+_worker_tables = None
+_worker_shared_tables = None
+
+def init_worker(table_dir, shared_name=None):
+    """
+    工作进程初始化：给出 shared_name 时映射主进程放在共享内存中的扁平解析表，否则在本进程内加载一份
+    """
+    global _worker_tables, _worker_shared_tables
+    if shared_name is not None:
+        _worker_shared_tables = SharedTables.attach(shared_name)
+        _worker_tables = _worker_shared_tables.tables
+    else:
+        _worker_tables = load_encoded_tables(table_dir)
+
+def run_request(method, source):
+    """
+    在工作进程中处理一次请求，返回 (result 的 JSON 文本, 词法+语法分析耗时)
+    结果在工作进程内序列化，主进程只做转发
+    输入不可信，用线性时间且有步数上限的 DfaLexer 切分 token，语法树用不递归的 ast_to_json 序列化
+    """
+    start = time.perf_counter()
+    try:
+        tokens = DfaLexer(source, SymbolPool()).tokenize()
+    except RuntimeError as e:
+        result = {'ok': False, 'kind': 'lex_error', 'message': str(e), 'position': error_position(e)}
+        return json.dumps(result, ensure_ascii=False), time.perf_counter() - start
+    if method == 'tokenize':
+        elapsed = time.perf_counter() - start
+        return json.dumps({'ok': True, 'tokens': list(tokens)}, ensure_ascii=False), elapsed
+    flat = isinstance(_worker_tables, FlatTables)
+    try:
+        if method == 'check':
+            # 只识别，不构造语法树
+            validate = lr1_validate_flat if flat else lr1_validate_encoded
+            validate(zip(tokens.types, tokens.lexemes), _worker_tables)
+        else:
+            parse_tokens = lr1_parse_flat if flat else lr1_parse_encoded
+            ast = parse_tokens(tokens, _worker_tables)
+    except SyntaxError as e:
+        result = {'ok': False, 'kind': 'parse_error', 'message': str(e), 'position': error_position(e)}
+        return json.dumps(result, ensure_ascii=False), time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    if method == 'check':
+        return json.dumps({'ok': True}), elapsed
+    return f'{{"ok": true, "ast": {ast_to_json(ast)}}}', elapsed
+
+class LatencyStats:
+    """
+    按方法统计最近若干次请求的延迟
+    """
+    def __init__(self, window=10000):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+
+    def record(self, method, total, work):
+        self.samples.setdefault(method, deque(maxlen=self.window)).append((total, work))
+        self.counts[method] = self.counts.get(method, 0) + 1
+
+    @staticmethod
+    def percentile(sorted_values, fraction):
+        index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+        return sorted_values[index]
+
+    def summary(self):
+        result = {}
+        for method, samples in self.samples.items():
+            totals = sorted(total for total, _ in samples)
+            works = sorted(work for _, work in samples)
+            result[method] = {
+                'count': self.counts[method],
+                'mean_ms': sum(totals) / len(totals) * 1000,
+                'p50_ms': self.percentile(totals, 0.5) * 1000,
+                'p95_ms': self.percentile(totals, 0.95) * 1000,
+                'p99_ms': self.percentile(totals, 0.99) * 1000,
+                'max_ms': totals[-1] * 1000,
+                # 纯词法+语法分析耗时，与总延迟之差即排队与传输开销
+                'parse_p50_ms': self.percentile(works, 0.5) * 1000,
+            }
+        return result
+
+class ParseServer:
+    """
+    常驻分析服务：解析表与工作进程池常驻内存，通过 Unix 套接字或本机 TCP 接收按行分隔的 JSON-RPC 请求
+    方法：tokenize / parse / check（参数 source 或 path）、stats、shutdown
+    - path 只在配置了 root 时接受，且必须解析到 root 之内
+    - shutdown 只能经 Unix 套接字发送；套接字只有属主可以连接，TCP 端口上任何本机用户都能连接
+    """
+    WORK_METHODS = ('tokenize', 'parse', 'check')
+
+    def __init__(self, table_dir='.', jobs=None, root=None):
+        self.table_dir = table_dir
+        self.jobs = jobs
+        self.root = os.path.realpath(root) if root is not None else None
+        self.tcp = False
+        self.stats = LatencyStats()
+        self.executor = None
+        self.shared_tables = None
+        self.stopping = None
+        self.started = time.time()
+
+    def start_executor(self):
+        if self.jobs == 0:
+            # 单进程模式：在线程中分析，省去进程间传输，适合极小的输入
+            init_worker(self.table_dir)
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            jobs = self.jobs or os.cpu_count()
+            # 解析表只在共享内存中放一份，增加工作进程只增加每次分析自身的内存
+            self.shared_tables = SharedTables.create(load_encoded_tables(self.table_dir))
+            self.executor = self.create_process_pool()
+            # 预热：让工作进程在第一个请求到来前完成启动并加载好解析表
+            list(self.executor.map(run_request, ['check'] * jobs, [''] * jobs))
+
+    def create_process_pool(self):
+        return ProcessPoolExecutor(self.jobs or os.cpu_count(), initializer=init_worker,
+                                   initargs=(self.table_dir, self.shared_tables.name))
+
+    async def run_work(self, method, source):
+        """
+        交给工作进程分析；某个工作进程异常退出使进程池损坏时，换一个新的进程池，
+        当时在途的请求返回错误，之后的请求不受影响
+        """
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, run_request, method, source)
+        except BrokenProcessPool:
+            if executor is self.executor:
+                self.executor = self.create_process_pool()
+                executor.shutdown(wait=False)
+            raise
+
+    async def dispatch(self, request):
+        method = request.get('method')
+        params = request.get('params') or {}
+        if method in self.WORK_METHODS:
+            source = params.get('source')
+            if source is None:
+                path = params.get('path')
+                if path is None:
+                    raise ValueError("需要参数 source 或 path")
+                loop = asyncio.get_running_loop()
+                source = await loop.run_in_executor(None, self.read_source, self.resolve_path(path))
+            return await self.run_work(method, source)
+        if method == 'stats':
+            result = {'uptime_s': time.time() - self.started, 'latency': self.stats.summary()}
+            return json.dumps(result), 0.0
+        if method == 'shutdown':
+            if self.tcp:
+                raise ValueError("TCP 端口上不接受 shutdown，请经 Unix 套接字发送或直接结束进程")
+            self.stopping.set()
+            return json.dumps({'ok': True}), 0.0
+        raise ValueError(f"未知方法 {method}")
+
+    def resolve_path(self, path):
+        """
+        把请求中的 path 解析为 root 之内的真实路径，符号链接与 .. 均不能越出 root
+        """
+        if self.root is None:
+            raise ValueError("服务未配置 --root，不接受参数 path")
+        resolved = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([self.root, resolved]) != self.root:
+            raise ValueError(f"路径不在 {self.root} 之内：{path}")
+        return resolved
+
+    @staticmethod
+    def read_source(path):
+        with open(path, 'r') as file:
+            return file.read()
+
+    async def handle_request(self, line, writer, lock):
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            result_text, work = await self.dispatch(request)
+            response = f'{{"jsonrpc": "2.0", "id": {json.dumps(request_id)}, "result": {result_text}}}\n'
+            self.stats.record(request.get('method'), time.perf_counter() - start, work)
+        except Exception as e:
+            error = {'code': -32000, 'message': f"{type(e).__name__}: {e}"}
+            response = json.dumps({'jsonrpc': '2.0', 'id': request_id, 'error': error}, ensure_ascii=False) + '\n'
+        async with lock:
+            writer.write(response.encode('utf-8'))
+            await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """
+        同一连接上的请求并发处理，响应按完成顺序返回，由 id 对应
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.handle_request(line, writer, lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            # 服务关闭时仍打开的连接
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, unix_path=None, host='127.0.0.1', port=None):
+        self.start_executor()
+        self.stopping = asyncio.Event()
+        if port is not None:
+            self.tcp = True
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_BYTES)
+            address = f"{host}:{port}"
+        else:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            # 在 bind 时就只给属主读写权限，bind 与 chmod 之间不会有别的用户连进来
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(self.handle_connection, unix_path, limit=MAX_REQUEST_BYTES)
+            finally:
+                os.umask(umask)
+            address = unix_path
+        print(f"分析服务已启动：{address}", flush=True)
+        try:
+            async with server:
+                await self.stopping.wait()
+        finally:
+            self.executor.shutdown()
+            if self.shared_tables is not None:
+                self.shared_tables.close()
+            if port is None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+class ParseClient:
+    """
+    同步客户端，一个连接上可发送多次请求
+    """
+    def __init__(self, unix_path=DEFAULT_SOCKET, host='127.0.0.1', port=None):
+        if port is not None:
+            self.socket = socket.create_connection((host, port))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(unix_path)
+        self.file = self.socket.makefile('rb')
+        self.next_id = 0
+
+    def call(self, method, **params):
+        self.next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+        self.socket.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        # 语法树可能很深，json.loads 会耗尽调用栈
+        response = load_json(self.file.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error']['message'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="常驻 C11 语法分析服务")
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+    serve_parser = sub_parsers.add_parser('serve', help="启动服务")
+    serve_parser.add_argument('-j', '--jobs', type=int, default=None, help="工作进程数，0 表示在服务进程内分析")
+    serve_parser.add_argument('--table-dir', default='.')
+    serve_parser.add_argument('--root', default=None, help="允许请求以参数 path 读取的目录，缺省时不接受 path")
+    call_parser = sub_parsers.add_parser('call', help="向服务发送一次请求")
+    call_parser.add_argument('method', choices=['tokenize', 'parse', 'check', 'stats', 'shutdown'])
+    call_parser.add_argument('file', nargs='?', help="C 源文件（由客户端读取后发送）")
+    for sub_parser in (serve_parser, call_parser):
+        sub_parser.add_argument('--unix', default=DEFAULT_SOCKET, help="Unix 套接字路径")
+        sub_parser.add_argument('--port', type=int, default=None, help="改为监听/连接 127.0.0.1 的该端口")
+    args = arg_parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = ParseServer(args.table_dir, args.jobs, args.root)
+        try:
+            asyncio.run(server.serve(args.unix, port=args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    client = ParseClient(args.unix, port=args.port)
+    params = {}
+    if args.file:
+        with open(args.file, 'r') as file:
+            params['source'] = file.read()
+    result = client.call(args.method, **params)
+    client.close()
+    print(dump_json(result, indent=2))
+    return 0 if result.get('ok', True) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
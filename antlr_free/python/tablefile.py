@@ -0,0 +1,249 @@
+"""
+解析表的二进制格式
+
+一、按状态懒加载的表文件（parse_tables.bin，LazyTables），由本机字节序的 int32 组成：
+- 文件头：MAGIC, VERSION, 状态数, 终结符数, 符号数, 产生式数, 符号名字节数
+- 符号名：UTF-8，以换行分隔，补齐到 4 字节
+- 产生式：依次为 左部编号, 右部长度, 右部符号编号...
+- 状态索引：状态数 + 1 个偏移（以 int32 为单位），第 i 个状态的行位于 [偏移 i, 偏移 i+1)
+- 状态行：动作数, 转移数, (终结符编号, 动作) * 动作数, (非终结符编号, 目标状态) * 转移数
+动作与转移的编码同 EncodedTables；终结符编号与词法分析器的 token 编号一致
+
+二、扁平表（FlatTables），供多个工作进程通过共享内存零拷贝读取（SharedTables）：
+- 文件头：FLAT_MAGIC, VERSION, 状态数, 终结符数, 符号数, 产生式数, 符号名字节数
+- 符号名：同上
+- 产生式：依次为 (左部编号, 右部长度)
+- 动作矩阵：状态数 * 终结符数，空项为 FlatTables.ERROR
+- 转移矩阵：状态数 * 非终结符数，列为 非终结符编号 - 终结符数，空项为 -1
+"""
+import argparse
+import mmap
+import os
+import sys
+from array import array
+from multiprocessing import shared_memory
+
+from builder import EncodedTables
+
+MAGIC = 0x54434353  # b'SCCT'
+FLAT_MAGIC = 0x46434353  # b'SCCF'
+VERSION = 1
+HEADER_SIZE = 7
+TABLE_FILE = 'parse_tables.bin'
+
+def encode_names(symbols):
+    names = '\n'.join(symbols).encode('utf-8')
+    return names + b'\0' * (-len(names) % 4)
+
+def decode_header(ints, buffer, magic):
+    """
+    检查文件头并解码符号名，返回 (文件头各项, 符号名列表, 符号名之后的 int32 下标)
+    """
+    header = ints[:HEADER_SIZE].tolist()
+    if header[0] != magic:
+        raise ValueError("不是解析表文件，或文件的字节序与本机不同")
+    if header[1] != VERSION:
+        raise ValueError(f"解析表文件版本 {header[1]} 与当前版本 {VERSION} 不符")
+    names_size = header[6]
+    position = HEADER_SIZE * 4
+    symbols = bytes(buffer[position:position + names_size]).rstrip(b'\0').decode('utf-8').split('\n')
+    return header, symbols, (position + names_size) // 4
+
+def write_table_file(tables: EncodedTables, path):
+    """
+    把 EncodedTables 写为二进制表文件
+    """
+    names = encode_names(tables.symbols)
+    body = array('i')
+    for (lhs, length), (_, rhs) in zip(tables.productions, tables.production_rules):
+        body.extend((lhs, length))
+        body.extend(tables.symbol_ids[symbol] for symbol in rhs)
+
+    n_states = len(tables.action_rows)
+    base = HEADER_SIZE + len(names) // 4 + len(body) + n_states + 1
+    index = array('i')
+    rows = array('i')
+    for action_row, goto_row in zip(tables.action_rows, tables.goto_rows):
+        index.append(base + len(rows))
+        rows.extend((len(action_row), len(goto_row)))
+        for row in (action_row, goto_row):
+            for key in sorted(row):
+                rows.extend((key, row[key]))
+    index.append(base + len(rows))
+
+    header = array('i', [MAGIC, VERSION, n_states, tables.n_terminals, len(tables.symbols),
+                         len(tables.productions), len(names)])
+    with open(path, 'wb') as f:
+        header.tofile(f)
+        f.write(names)
+        body.tofile(f)
+        index.tofile(f)
+        rows.tofile(f)
+
+class LazyRows(dict):
+    """
+    按状态编号取行的表，行在第一次被访问时由 load_state 解码
+    已解码的行留在 dict 中，之后的访问与普通 dict 一样快
+    """
+    def __init__(self, load_state):
+        super().__init__()
+        self.load_state = load_state
+
+    def __missing__(self, state):
+        self.load_state(state)
+        return self[state]
+
+class LazyTables(EncodedTables):
+    """
+    从表文件懒加载的解析表，可直接用于 lr1_parse_encoded / lr1_parse_tracked / lr1_parse_hashconsed
+    启动时只解码符号与产生式；某个状态的动作行与转移行在第一次被访问时一起解码
+    """
+    def __init__(self, buffer):
+        ints = memoryview(buffer).cast('i')
+        header, symbols, position = decode_header(ints, buffer, MAGIC)
+        _, _, n_states, n_terminals, _, n_productions, _ = header
+
+        productions = []
+        production_rules = []
+        for _ in range(n_productions):
+            lhs, length = ints[position], ints[position + 1]
+            rhs = ints[position + 2:position + 2 + length].tolist()
+            productions.append((lhs, length))
+            production_rules.append((symbols[lhs], tuple(symbols[symbol] for symbol in rhs)))
+            position += 2 + length
+
+        self.buffer = buffer
+        self.ints = ints
+        self.index = ints[position:position + n_states + 1]
+        self.n_states = n_states
+        super().__init__(symbols, n_terminals, productions, production_rules,
+                         LazyRows(self.load_state), LazyRows(self.load_state))
+
+    def load_state(self, state):
+        if not 0 <= state < self.n_states:
+            raise IndexError(f"state {state} out of range")
+        values = self.ints[self.index[state]:self.index[state + 1]].tolist()
+        split = 2 + 2 * values[0]
+        self.action_rows[state] = dict(zip(values[2:split:2], values[3:split:2]))
+        self.goto_rows[state] = dict(zip(values[split::2], values[split + 1::2]))
+
+    @property
+    def touched_states(self):
+        """
+        已解码的状态数
+        """
+        return len(self.action_rows)
+
+def load_lazy_tables(path=TABLE_FILE):
+    """
+    以只读 mmap 映射表文件并返回 LazyTables
+    """
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return LazyTables(buffer)
+
+def flat_table_bytes(tables: EncodedTables):
+    """
+    把 EncodedTables 编码为扁平表的字节串
+    """
+    names = encode_names(tables.symbols)
+    n_states = len(tables.action_rows)
+    n_terminals = tables.n_terminals
+    n_non_terminals = len(tables.symbols) - n_terminals
+    productions = array('i')
+    for lhs, length in tables.productions:
+        productions.extend((lhs, length))
+    action = array('i', [FlatTables.ERROR]) * (n_states * n_terminals)
+    goto = array('i', [-1]) * (n_states * n_non_terminals)
+    for state, (action_row, goto_row) in enumerate(zip(tables.action_rows, tables.goto_rows)):
+        for token_id, entry in action_row.items():
+            action[state * n_terminals + token_id] = entry
+        for symbol_id, target in goto_row.items():
+            goto[state * n_non_terminals + symbol_id - n_terminals] = target
+    header = array('i', [FLAT_MAGIC, VERSION, n_states, n_terminals, len(tables.symbols),
+                         len(tables.productions), len(names)])
+    return b''.join((header.tobytes(), names, productions.tobytes(), action.tobytes(), goto.tobytes()))
+
+class FlatTables:
+    """
+    扁平整数解析表，action_rows 与 goto_rows 的每一行都是直接指向 buffer 的 memoryview，供 parser.lr1_parse_flat 使用
+    buffer 可以是共享内存或 mmap，多个进程读取同一份数据时不产生拷贝，也不会因引用计数写入而触发写时复制
+    """
+    ERROR = -0x80000000
+
+    def __init__(self, buffer):
+        ints = memoryview(buffer).cast('i')
+        header, self.symbols, position = decode_header(ints, buffer, FLAT_MAGIC)
+        _, _, self.n_states, self.n_terminals, n_symbols, n_productions, _ = header
+        self.n_non_terminals = n_symbols - self.n_terminals
+        values = ints[position:position + 2 * n_productions].tolist()
+        self.productions = list(zip(values[::2], values[1::2]))
+        position += 2 * n_productions
+        # 每个状态一行，行是指向 buffer 的切片，不复制数据
+        self.action_rows = [ints[start:start + self.n_terminals]
+                            for start in range(position, position + self.n_states * self.n_terminals, self.n_terminals)]
+        position += self.n_states * self.n_terminals
+        self.goto_rows = [ints[start:start + self.n_non_terminals]
+                          for start in range(position, position + self.n_states * self.n_non_terminals, self.n_non_terminals)]
+        self.ints = ints
+
+    def release(self):
+        """
+        释放指向 buffer 的 memoryview，之后才能关闭共享内存
+        """
+        for view in self.action_rows + self.goto_rows + [self.ints]:
+            view.release()
+
+class SharedTables:
+    """
+    放在 multiprocessing.shared_memory 中的扁平解析表
+    主进程用 create 放置一次，工作进程用 attach 按名字映射同一段内存
+    """
+    def __init__(self, segment, owner):
+        self.segment = segment
+        self.owner = owner
+        self.tables = FlatTables(segment.buf)
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    @classmethod
+    def create(cls, tables: EncodedTables):
+        data = flat_table_bytes(tables)
+        segment = shared_memory.SharedMemory(create=True, size=len(data))
+        segment.buf[:len(data)] = data
+        return cls(segment, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def close(self):
+        """
+        解除映射；创建者同时删除共享内存段
+        """
+        self.tables.release()
+        self.segment.close()
+        if self.owner:
+            self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    from parser import load_encoded_tables
+
+    arg_parser = argparse.ArgumentParser(description="把 pkl 解析表转换为可按状态懒加载的二进制表文件")
+    arg_parser.add_argument('-o', '--output', default=TABLE_FILE)
+    arg_parser.add_argument('--table-dir', default='.')
+    args = arg_parser.parse_args(argv)
+    write_table_file(load_encoded_tables(args.table_dir), args.output)
+    print(f"表文件已生成：{args.output}（{os.path.getsize(args.output)} 字节）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
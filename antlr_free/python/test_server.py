@@ -0,0 +1,75 @@
+"""
+分析服务的端到端测试：启动 server.py serve，经 ParseClient 与 call 子命令发送请求
+需要先用 builder.py 在本目录生成解析表；运行：python -m unittest test_server
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+
+import server
+from parser import load_json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+@unittest.skipUnless(os.path.exists(os.path.join(HERE, 'action_table.pkl')), "需要先运行 builder.py 生成解析表")
+class DeepNestingTest(unittest.TestCase):
+    DEPTH = 400
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.unix_path = os.path.join(self.directory.name, 'cparse.sock')
+        self.process = subprocess.Popen(
+            [sys.executable, 'server.py', 'serve', '-j', '0', '--unix', self.unix_path],
+            cwd=HERE, stdout=subprocess.DEVNULL)
+        deadline = time.time() + 30
+        while not os.path.exists(self.unix_path):
+            if self.process.poll() is not None or time.time() > deadline:
+                self.fail("分析服务没有启动")
+            time.sleep(0.05)
+        self.source = f"int f(void) {{ return {'(' * self.DEPTH}1{')' * self.DEPTH}; }}"
+
+    def tearDown(self):
+        client = server.ParseClient(self.unix_path)
+        client.call('shutdown')
+        client.close()
+        self.process.wait(timeout=30)
+        self.directory.cleanup()
+
+    def test_client_decodes_deep_tree(self):
+        client = server.ParseClient(self.unix_path)
+        try:
+            result = client.call('parse', source=self.source)
+        finally:
+            client.close()
+        self.assertTrue(result['ok'])
+        self.assertGreater(ast_max_depth(result['ast']), self.DEPTH)
+
+    def test_call_command_prints_deep_tree(self):
+        source_path = os.path.join(self.directory.name, 'deep.c')
+        with open(source_path, 'w') as file:
+            file.write(self.source)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = server.main(['call', 'parse', source_path, '--unix', self.unix_path])
+        self.assertEqual(status, 0)
+        self.assertTrue(load_json(output.getvalue())['ok'])
+
+def ast_max_depth(tree):
+    depth = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        if isinstance(node, dict):
+            for children in node.values():
+                if isinstance(children, list):
+                    stack.extend((child, level + 1) for child in children)
+    return depth
+
+if __name__ == '__main__':
+    unittest.main()